@@ -0,0 +1,142 @@
+"""Agent context cache with a prefetch stage ahead of scheduled runs.
+
+An agent run needs the user's business profile, today's tasks (GraphQL backend
+first), leads and sales. A few minutes before each slot, the scheduler prefetches
+this context for the users due in that slot, so the run itself mostly does LLM
+work. Recent agent runs are always read live since they change between prefetch
+and run (ex: the user replied in the chat).
+
+The cache is per process, so a context is prefetched by the process that will
+run it: without the job queue, the leader's prefetch job warms the slot it then
+fans out; with it, each process's queue consumers claim the jobs due within the
+lead and prefetch those. Only scheduled runs read it; entries expire after
+CONTEXT_CACHE_TTL_SECONDS.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal
+from app.db import crud
+from app.agent.fanout import fan_out, JobSummary
+
+
+CONTEXT_CACHE_MAX_SIZE = 50000
+
+
+class AgentContext:
+    """Data an agent run is built from."""
+    
+    def __init__(self, profile, tasks: List[Any], leads: List[Any], sales: List[Any]):
+        self.profile = profile
+        self.tasks = tasks
+        self.leads = leads
+        self.sales = sales
+        self.loaded_at = time.monotonic()
+
+
+async def load_context(db: AsyncSession, user_id: int) -> AgentContext:
+    """Read a user's agent context from the database and backend."""
+    profile = await crud.get_business_profile(db, user_id)
+    tasks = await crud.get_today_tasks(db, user_id)
+    leads = await crud.get_leads(db, user_id)
+    sales = await crud.get_sales_updates(db, user_id)
+    return AgentContext(profile, tasks, leads, sales)
+
+
+class ContextCache:
+    """LRU cache of prefetched agent contexts with a TTL and hit rate counters."""
+    
+    def __init__(self, ttl_seconds: Optional[float] = None, max_size: int = CONTEXT_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds or settings.CONTEXT_CACHE_TTL_SECONDS
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._entries: "OrderedDict[int, AgentContext]" = OrderedDict()
+    
+    def get(self, user_id: int) -> Optional[AgentContext]:
+        """Fresh cached context for a user, or None."""
+        context = self._entries.get(user_id)
+        if context is None:
+            return None
+        if time.monotonic() - context.loaded_at > self.ttl_seconds:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return context
+    
+    def put(self, user_id: int, context: AgentContext) -> None:
+        """Store a context, evicting the least recently used entry when full."""
+        self._entries[user_id] = context
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's cached context."""
+        self._entries.pop(user_id, None)
+    
+    def clear(self) -> None:
+        """Drop all contexts and reset counters."""
+        self._entries.clear()
+        self.hits = self.misses = self.prefetched = 0
+    
+    async def get_or_load(self, db: AsyncSession, user_id: int) -> AgentContext:
+        """
+        Context for an agent run: prefetched or loaded now.
+        A prefetched entry is consumed by the run it was prefetched for.
+        """
+        context = self.get(user_id)
+        if context is not None:
+            self.hits += 1
+            self.invalidate(user_id)
+            return context
+        self.misses += 1
+        return await load_context(db, user_id)
+    
+    async def prefetch(self, user_id: int) -> None:
+        """Load a user's context into the cache ahead of a run."""
+        async with AsyncSessionLocal() as db:
+            context = await load_context(db, user_id)
+        self.put(user_id, context)
+        self.prefetched += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache size, share of runs served from the cache and share of prefetched contexts used by a run."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "prefetched": self.prefetched,
+            "prefetch_used_rate": self.hits / self.prefetched if self.prefetched else 0.0,
+        }
+
+
+context_cache = ContextCache()
+
+
+async def prefetch_contexts(user_ids: AsyncIterator[int], concurrency: int) -> JobSummary:
+    """
+    Warm the context cache for the given users with bounded concurrency.
+    
+    Args:
+        user_ids: Async iterator of user IDs due in the coming slot
+        concurrency: Number of concurrent loads
+    
+    Returns:
+        JobSummary of the prefetch
+    """
+    return await fan_out(
+        "prefetch",
+        user_ids,
+        context_cache.prefetch,
+        concurrency=concurrency,
+        user_timeout=settings.SCHEDULER_USER_TIMEOUT_SECONDS
+    )
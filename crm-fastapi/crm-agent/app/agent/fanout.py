@@ -0,0 +1,100 @@
+"""Bounded worker pool for fanning scheduled jobs out over many users."""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+
+MAX_FAILED_USER_IDS = 100
+
+
+class JobSummary:
+    """Outcome of one fan-out: users processed, failures and wall time."""
+    
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started_at = datetime.now(timezone.utc)
+        self.users_processed = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.wall_time_seconds = 0.0
+        self.failed_user_ids: List[int] = []
+    
+    def record_failure(self, user_id: int, timed_out: bool = False) -> None:
+        """Count a failed user, keeping a bounded sample of their IDs."""
+        self.failures += 1
+        if timed_out:
+            self.timeouts += 1
+        if len(self.failed_user_ids) < MAX_FAILED_USER_IDS:
+            self.failed_user_ids.append(user_id)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable summary."""
+        return {
+            "job_id": self.job_id,
+            "started_at": self.started_at.isoformat(),
+            "users_processed": self.users_processed,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "wall_time_seconds": round(self.wall_time_seconds, 3),
+            "failed_user_ids": self.failed_user_ids,
+        }
+
+
+async def fan_out(
+    job_id: str,
+    user_ids: AsyncIterator[int],
+    handler: Callable[[int], Awaitable[Any]],
+    concurrency: int,
+    user_timeout: float
+) -> JobSummary:
+    """
+    Run `handler(user_id)` for every streamed user ID with bounded concurrency.
+    
+    User IDs are pulled through a small bounded queue, so memory stays constant
+    regardless of the number of users. A failure or timeout for one user is
+    counted and does not stop the others.
+    
+    Args:
+        job_id: Job identifier for the summary
+        user_ids: Async iterator of user IDs
+        handler: Coroutine function run once per user
+        concurrency: Number of concurrent workers
+        user_timeout: Per-user time budget in seconds
+    
+    Returns:
+        JobSummary for the run
+    """
+    summary = JobSummary(job_id)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    started = time.perf_counter()
+    
+    async def worker():
+        while True:
+            user_id = await queue.get()
+            try:
+                if user_id is None:
+                    return
+                summary.users_processed += 1
+                try:
+                    await asyncio.wait_for(handler(user_id), timeout=user_timeout)
+                except asyncio.TimeoutError:
+                    print(f"Job {job_id}: user {user_id} timed out after {user_timeout}s")
+                    summary.record_failure(user_id, timed_out=True)
+                except Exception as e:
+                    print(f"Job {job_id}: user {user_id} failed: {e}")
+                    summary.record_failure(user_id)
+            finally:
+                queue.task_done()
+    
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        async for user_id in user_ids:
+            await queue.put(user_id)
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        summary.wall_time_seconds = time.perf_counter() - started
+    
+    return summary
@@ -0,0 +1,304 @@
+"""Durable Postgres-backed job queue for agent runs.
+
+A scheduled run no longer executes in the APScheduler callback. The callback
+enqueues one `agent_jobs` row per active user, idempotent per
+(user, agent_type, slot). Queue workers in any number of processes then claim
+the rows with SELECT ... FOR UPDATE SKIP LOCKED and run them.
+
+A claimed job stays hidden from other workers until its visibility timeout. If
+the worker dies, another worker picks the job up once the timeout expires. A
+failed attempt is retried with exponential backoff. After JOB_MAX_ATTEMPTS it is
+dead-lettered for inspection, and can be requeued manually.
+
+With a prefetch hook, each process also claims the jobs due within the prefetch
+lead, warms their contexts and holds them until they are due, so the process
+that prefetched a context is the one that runs it.
+"""
+import asyncio
+import heapq
+import random
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import AgentJob
+from app.db import crud
+from app.agent.leader import make_holder_id
+from app.agent.smoothing import load_curve
+
+
+MAX_ERROR_LENGTH = 2000
+
+
+def make_slot(job_id: str, fire_time: Optional[datetime] = None) -> str:
+    """
+    Identify one firing of a scheduled job, truncated to the minute.
+    A second firing of the same job in the same minute (ex: after a leader
+    failover) yields the same slot and is deduplicated.
+    """
+    fire_time = fire_time or datetime.now(timezone.utc)
+    return f"{job_id}@{fire_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M')}"
+
+
+def make_idempotency_key(user_id: int, agent_type: str, slot: str) -> str:
+    """Idempotency key of a job: one run per (user, agent_type, slot)."""
+    return f"{user_id}:{agent_type}:{slot}"
+
+
+def backoff_seconds(attempt: int) -> float:
+    """
+    Delay before retrying after the given failed attempt: exponential with jitter.
+    
+    Args:
+        attempt: Number of the attempt that failed (1-based)
+    
+    Returns:
+        Seconds to wait, between half and all of min(base * 2^(attempt-1), max)
+    """
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1), settings.JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def enqueue_for_users(
+    user_ids: AsyncIterator[int],
+    agent_type: str,
+    slot: str,
+    batch_size: int = 1000,
+    run_after: Optional[Callable[[int, int], datetime]] = None
+) -> int:
+    """
+    Enqueue one job per streamed user, one insert per batch.
+    Safe to repeat: users that already have a job for the slot are skipped.
+    
+    Args:
+        user_ids: Async iterator of user IDs
+        agent_type: Agent (or handler) type to run
+        slot: Slot identifier from make_slot
+        batch_size: Jobs per insert
+        run_after: Due time of a job given (user_id, enqueue index); jobs are due now if omitted
+    
+    Returns:
+        Number of newly enqueued jobs
+    """
+    enqueued = 0
+    batch: List[Dict[str, Any]] = []
+    
+    async def flush():
+        nonlocal enqueued
+        async with AsyncSessionLocal() as db:
+            enqueued += await crud.enqueue_agent_jobs(db, batch)
+        batch.clear()
+    
+    index = 0
+    async for user_id in user_ids:
+        job = {
+            "user_id": user_id,
+            "agent_type": agent_type,
+            "slot": slot,
+            "idempotency_key": make_idempotency_key(user_id, agent_type, slot),
+            "max_attempts": settings.JOB_MAX_ATTEMPTS,
+        }
+        if run_after is not None:
+            job["run_after"] = run_after(user_id, index)
+        batch.append(job)
+        index += 1
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return enqueued
+
+
+class JobQueueWorker:
+    """Runs N consumers that claim and execute agent jobs until stopped."""
+    
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[int], Awaitable[Any]]],
+        concurrency: Optional[int] = None,
+        worker_id: Optional[str] = None,
+        poll_seconds: Optional[float] = None,
+        visibility_timeout_seconds: Optional[float] = None,
+        job_timeout_seconds: Optional[float] = None,
+        prefetch: Optional[Callable[[List[AgentJob]], Awaitable[Any]]] = None,
+        prefetch_lead_seconds: float = 0,
+        max_held: Optional[int] = None
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency or settings.JOB_QUEUE_CONCURRENCY
+        self.worker_id = worker_id or make_holder_id()
+        self.poll_seconds = poll_seconds or settings.JOB_QUEUE_POLL_SECONDS
+        self.visibility_timeout_seconds = visibility_timeout_seconds or settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+        self.job_timeout_seconds = job_timeout_seconds or settings.SCHEDULER_USER_TIMEOUT_SECONDS
+        self.claimed = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.in_flight = 0
+        self.prefetch = prefetch
+        self.prefetch_lead_seconds = prefetch_lead_seconds
+        self.max_held = max_held or settings.JOB_PREFETCH_MAX_HELD
+        self.claimed_ahead = 0
+        # Jobs claimed ahead and prefetched, by (due time, job ID)
+        self._held: List[Tuple[datetime, int, AgentJob]] = []
+        self._tasks: List[asyncio.Task] = []
+    
+    async def claim(self) -> Optional[AgentJob]:
+        """Take a held job that is due, else claim one runnable job; None if the queue is empty."""
+        if self._held and self._held[0][0] <= datetime.now(timezone.utc):
+            return heapq.heappop(self._held)[2]
+        async with AsyncSessionLocal() as db:
+            jobs = await crud.claim_agent_jobs(db, self.worker_id, 1, self.visibility_timeout_seconds)
+        return jobs[0] if jobs else None
+    
+    async def claim_ahead(self) -> int:
+        """
+        Claim the jobs due within the prefetch lead (up to max_held held jobs),
+        prefetch them and hold them until they are due. Their visibility timeout
+        starts at the due time.
+        
+        Returns:
+            Number of jobs claimed
+        """
+        limit = self.max_held - len(self._held)
+        if limit <= 0:
+            return 0
+        async with AsyncSessionLocal() as db:
+            jobs = await crud.claim_agent_jobs(
+                db, self.worker_id, limit, self.visibility_timeout_seconds, ahead_seconds=self.prefetch_lead_seconds
+            )
+        if not jobs:
+            return 0
+        try:
+            await self.prefetch(jobs)
+        except Exception as e:
+            # The runs load their context themselves on a cache miss
+            print(f"Job queue prefetch failed ({self.worker_id}): {e}")
+        for job in jobs:
+            heapq.heappush(self._held, (job.run_after, job.id, job))
+        self.claimed_ahead += len(jobs)
+        return len(jobs)
+    
+    async def release_held(self) -> None:
+        """Hand the held jobs back to the queue."""
+        held, self._held = self._held, []
+        if not held:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.release_agent_jobs(db, [job.id for _, _, job in held], self.worker_id)
+        except Exception as e:
+            print(f"Held jobs not released, they run once their claim expires ({self.worker_id}): {e}")
+    
+    async def complete(self, job: AgentJob) -> bool:
+        """Mark a job as succeeded."""
+        async with AsyncSessionLocal() as db:
+            return await crud.complete_agent_job(db, job.id, self.worker_id)
+    
+    async def fail(self, job: AgentJob, error: str, retry_in_seconds: Optional[float]) -> bool:
+        """Reschedule or dead-letter a job."""
+        async with AsyncSessionLocal() as db:
+            return await crud.fail_agent_job(db, job.id, self.worker_id, error[:MAX_ERROR_LENGTH], retry_in_seconds)
+    
+    async def execute(self, job: AgentJob) -> None:
+        """Run a claimed job and record the outcome."""
+        handler = self.handlers.get(job.agent_type)
+        if handler is None:
+            await self.fail(job, f"No handler for agent type {job.agent_type}", None)
+            self.dead_lettered += 1
+            return
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its visibility timeout more often than allowed (ex: it keeps crashing workers)
+            await self.fail(job, job.last_error or "Visibility timeout expired on every attempt", None)
+            self.dead_lettered += 1
+            return
+        
+        try:
+            async with load_curve.track():
+                await asyncio.wait_for(handler(job.user_id), timeout=self.job_timeout_seconds)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if isinstance(e, asyncio.TimeoutError):
+                error = f"Timed out after {self.job_timeout_seconds}s"
+            if job.attempts >= job.max_attempts:
+                print(f"Job {job.id} ({job.agent_type}, user {job.user_id}) dead-lettered: {error}")
+                await self.fail(job, error, None)
+                self.dead_lettered += 1
+            else:
+                delay = backoff_seconds(job.attempts)
+                print(f"Job {job.id} ({job.agent_type}, user {job.user_id}) failed, retrying in {delay:.0f}s: {error}")
+                await self.fail(job, error, delay)
+                self.retried += 1
+            return
+        
+        if await self.complete(job):
+            self.succeeded += 1
+        else:
+            print(f"Job {job.id} finished after its claim expired; another worker may run it again")
+    
+    async def consume(self) -> None:
+        """Claim and execute jobs one at a time until cancelled; sleep while the queue is empty."""
+        while True:
+            try:
+                job = await self.claim()
+            except Exception as e:
+                print(f"Job queue claim failed ({self.worker_id}): {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            
+            self.claimed += 1
+            self.in_flight += 1
+            try:
+                await self.execute(job)
+            except Exception as e:
+                # Outcome could not be recorded; the visibility timeout hands the job to another worker
+                print(f"Job {job.id} outcome not recorded: {e}")
+            finally:
+                self.in_flight -= 1
+    
+    async def prefetch_ahead(self) -> None:
+        """Claim and prefetch jobs ahead of their due time until cancelled."""
+        while True:
+            try:
+                claimed = await self.claim_ahead()
+            except Exception as e:
+                print(f"Job queue claim ahead failed ({self.worker_id}): {e}")
+                claimed = 0
+            if not claimed:
+                await asyncio.sleep(self.poll_seconds)
+    
+    def start(self) -> List[asyncio.Task]:
+        """Start the consumers (and the prefetch stage, with a prefetch hook) on the running event loop."""
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self.consume()) for _ in range(max(1, self.concurrency))]
+        if self.prefetch is not None and self.prefetch_lead_seconds > 0:
+            self._tasks.append(loop.create_task(self.prefetch_ahead()))
+        return self._tasks
+    
+    async def stop(self) -> None:
+        """
+        Stop the consumers. Jobs interrupted mid-run stay claimed and are picked
+        up again once their visibility timeout expires.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.release_held()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process's consumers."""
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "held": len(self._held),
+            "claimed": self.claimed,
+            "claimed_ahead": self.claimed_ahead,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
@@ -0,0 +1,147 @@
+"""Leader election so only one process runs scheduled jobs.
+
+Every API/worker process runs a LeaderElector. The elector keeps trying to
+acquire (or, once held, renew) a lease row in `scheduler_leases`; the holder
+of the unexpired lease is the leader. If the leader dies, its lease expires
+after LEADER_LEASE_TTL_SECONDS and another process takes over on its next
+heartbeat. A leader that cannot renew its lease steps down immediately.
+
+To try it locally, run `python -m app.agent.leader` in several terminals and
+stop the one that reports itself as leader.
+"""
+import asyncio
+import inspect
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal
+from app.db import crud
+
+
+SCHEDULER_LEASE_NAME = "scheduler"
+
+
+def make_holder_id() -> str:
+    """Unique ID for this process: host, PID and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderElector:
+    """Maintains a lease-based leadership and reports transitions through callbacks."""
+    
+    def __init__(
+        self,
+        name: str = SCHEDULER_LEASE_NAME,
+        holder_id: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        heartbeat_seconds: Optional[float] = None,
+        on_elected: Optional[Callable[[], Any]] = None,
+        on_demoted: Optional[Callable[[], Any]] = None
+    ):
+        self.name = name
+        self.holder_id = holder_id or make_holder_id()
+        self.ttl_seconds = ttl_seconds or settings.LEADER_LEASE_TTL_SECONDS
+        self.heartbeat_seconds = heartbeat_seconds or settings.LEADER_HEARTBEAT_SECONDS
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self.elected_at: Optional[datetime] = None
+        self.last_heartbeat_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def try_acquire(self) -> bool:
+        """Acquire or renew the lease; True if this process holds it."""
+        async with AsyncSessionLocal() as db:
+            return await crud.acquire_lease(db, self.name, self.holder_id, self.ttl_seconds)
+    
+    async def release(self) -> None:
+        """Give up the lease so another process can take over without waiting for expiry."""
+        async with AsyncSessionLocal() as db:
+            await crud.release_lease(db, self.name, self.holder_id)
+    
+    async def heartbeat(self) -> bool:
+        """Run one election round and fire callbacks on a leadership change."""
+        try:
+            holds_lease = await self.try_acquire()
+        except Exception as e:
+            print(f"Leader election heartbeat failed ({self.holder_id}): {e}")
+            holds_lease = False
+        self.last_heartbeat_at = datetime.now(timezone.utc)
+        
+        if holds_lease and not self.is_leader:
+            self.is_leader = True
+            self.elected_at = self.last_heartbeat_at
+            print(f"Elected scheduler leader: {self.holder_id}")
+            await _maybe_await(self.on_elected)
+        elif not holds_lease and self.is_leader:
+            self.is_leader = False
+            self.elected_at = None
+            print(f"Lost scheduler leadership: {self.holder_id}")
+            await _maybe_await(self.on_demoted)
+        return self.is_leader
+    
+    async def run(self) -> None:
+        """Heartbeat until cancelled."""
+        while True:
+            await self.heartbeat()
+            await asyncio.sleep(self.heartbeat_seconds)
+    
+    def start(self) -> asyncio.Task:
+        """Start the heartbeat loop on the running event loop."""
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+    
+    async def stop(self) -> None:
+        """Stop heartbeating and release the lease if held."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await _maybe_await(self.on_demoted)
+            try:
+                await self.release()
+            except Exception as e:
+                print(f"Failed to release scheduler lease: {e}")
+    
+    def status(self) -> Dict[str, Any]:
+        """Current leadership state of this process."""
+        return {
+            "lease": self.name,
+            "holder_id": self.holder_id,
+            "is_leader": self.is_leader,
+            "elected_at": self.elected_at.isoformat() if self.elected_at else None,
+            "last_heartbeat_at": self.last_heartbeat_at.isoformat() if self.last_heartbeat_at else None,
+        }
+
+
+async def _maybe_await(callback: Optional[Callable[[], Any]]) -> None:
+    """Call a sync or async callback."""
+    if callback is None:
+        return
+    result = callback()
+    if inspect.isawaitable(result):
+        await result
+
+
+if __name__ == "__main__":
+    async def _demo():
+        elector = LeaderElector()
+        print(f"Started elector {elector.holder_id}")
+        try:
+            await elector.run()
+        finally:
+            await elector.stop()
+    
+    try:
+        asyncio.run(_demo())
+    except KeyboardInterrupt:
+        pass
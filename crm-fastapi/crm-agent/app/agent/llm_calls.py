@@ -0,0 +1,192 @@
+"""Deadline-bounded and hedged LLM calls."""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.core.exceptions import LLMTimeoutError
+from app.agent.router import ModelRoute, ModelRouter, percentile
+
+
+# Absolute deadline (time.monotonic()) of the request currently being served
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """
+    Bound every LLM call made inside the block by a shared deadline.
+    An enclosing, earlier deadline is kept.
+    
+    Args:
+        seconds: Time budget for the block
+    """
+    deadline = time.monotonic() + seconds
+    current = request_deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = request_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        request_deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left before the current request deadline, or None if no deadline is set."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class HedgeStats:
+    """Counters for hedged requests and which attempt won."""
+    
+    def __init__(self, window_size: int = 200):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self._hedged_latencies: List[float] = []
+        self._window_size = window_size
+    
+    def record(self, hedged: bool, hedge_won: bool, latency_ms: float) -> None:
+        """Record a completed call."""
+        self.calls += 1
+        if hedged:
+            self.hedged += 1
+            self._hedged_latencies.append(latency_ms)
+            del self._hedged_latencies[:-self._window_size]
+        if hedge_won:
+            self.hedge_wins += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Hedge rate, hedge win rate and latency of hedged calls."""
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+            "hedged_p50_ms": percentile(self._hedged_latencies, 50),
+            "hedged_p95_ms": percentile(self._hedged_latencies, 95),
+            "deadline_exceeded": self.deadline_exceeded,
+        }
+
+
+hedge_stats = HedgeStats()
+
+
+def hedge_delay_seconds(route: Optional[ModelRoute], router: Optional[ModelRouter]) -> Optional[float]:
+    """Delay after which a hedged request is sent: the route's observed p95, if known."""
+    if not settings.LLM_HEDGING_ENABLED or route is None or router is None:
+        return None
+    if router.sample_count(route.name) < router.min_samples:
+        return None
+    p95_ms = router.latency_percentile(route.name, 95)
+    return max(p95_ms, settings.LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+
+async def race_attempts(
+    start_attempt: Callable[[], Awaitable[Any]],
+    timeout: float,
+    hedge_delay: Optional[float] = None
+) -> Tuple[Any, int, bool]:
+    """
+    Run an attempt, optionally hedged with a second one, until the first success.
+    
+    Args:
+        start_attempt: Callable returning a new attempt coroutine
+        timeout: Overall time budget in seconds
+        hedge_delay: Seconds after which a second attempt is started (None disables hedging)
+    
+    Returns:
+        Tuple of (result, index of the winning attempt: 0 primary / 1 hedge,
+        whether the hedge was sent)
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    hedge_at = started + hedge_delay if hedge_delay is not None and hedge_delay < timeout else None
+    pending = {asyncio.ensure_future(start_attempt()): 0}
+    hedged = False
+    
+    try:
+        while True:
+            now = loop.time()
+            if now >= deadline:
+                raise LLMTimeoutError(timeout)
+            wait_for = deadline - now
+            if hedge_at is not None:
+                wait_for = min(wait_for, max(0.0, hedge_at - now))
+            
+            done, _ = await asyncio.wait(set(pending), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            last_error = None
+            for task in done:
+                index = pending.pop(task)
+                if task.exception() is None:
+                    return task.result(), index, hedged
+                last_error = task.exception()
+            if not pending:
+                raise last_error
+            
+            if hedge_at is not None and loop.time() >= hedge_at:
+                pending[asyncio.ensure_future(start_attempt())] = 1
+                hedged = True
+                hedge_at = None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def create_chat_completion(
+    client,
+    route: Optional[ModelRoute] = None,
+    router: Optional[ModelRouter] = None,
+    **params
+):
+    """
+    Call `chat.completions.create` bounded by the request deadline, hedging slow calls.
+    
+    Args:
+        client: AsyncOpenAI client
+        route: Route the call was routed to (enables latency recording and hedging)
+        router: ModelRouter owning the route
+        **params: Arguments for `chat.completions.create`
+    
+    Returns:
+        Chat completion response
+    """
+    timeout = remaining_seconds()
+    if timeout is None:
+        timeout = settings.LLM_TIMEOUT_SECONDS
+    if timeout <= 0:
+        hedge_stats.deadline_exceeded += 1
+        raise LLMTimeoutError(0)
+    
+    hedge_delay = hedge_delay_seconds(route, router)
+    started = time.perf_counter()
+    try:
+        response, winner, hedged = await race_attempts(
+            lambda: client.chat.completions.create(timeout=timeout, **params),
+            timeout=timeout,
+            hedge_delay=hedge_delay
+        )
+    except LLMTimeoutError:
+        hedge_stats.deadline_exceeded += 1
+        if route is not None and router is not None:
+            router.record(route.name, (time.perf_counter() - started) * 1000)
+        raise
+    
+    latency_ms = (time.perf_counter() - started) * 1000
+    if route is not None and router is not None:
+        router.record(route.name, latency_ms)
+    hedge_stats.record(
+        hedged=hedged,
+        hedge_won=winner == 1,
+        latency_ms=latency_ms
+    )
+    return response
@@ -1,11 +1,20 @@
 """LLM orchestrator for CRM agent operations."""
-from typing import Optional, Dict, Any
+import asyncio
+import json
+import re
+from typing import Optional, Dict, Any, List, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from openai import AsyncOpenAI
+from pydantic import ValidationError
 
 from app.config.settings import settings
 from app.db import crud
 from app.db.models import BusinessProfile
+from app.modules.agent.dto.agent_dto import AgentRecommendation, TaskRecommendation
+from app.agent.router import model_router
+from app.agent.llm_calls import create_chat_completion
+from app.agent.context import context_cache, load_context
+from app.core.exceptions import LLMTimeoutError
 from app.agent.prompts import (
     AgentType,
     build_reminder_prompt,
@@ -16,18 +25,75 @@ from app.agent.prompts import (
     get_system_prompt,
     get_message_prompt,
     get_task_analysis_prompt,
+    get_batch_task_analysis_prompt,
     get_sales_prompt,
     get_morning_message_prompt,
     get_followup_prompt
 )
 
 
+TASK_ANALYSIS_FALLBACK = "Unable to analyze task at this time."
+STRUCTURED_MAX_TOKENS = 200
+BATCH_ANALYSIS_TOKENS_PER_TASK = 150
+BATCH_ANALYSIS_MAX_TOKENS = 4096
+# Tasks per batched request, so each response fits BATCH_ANALYSIS_MAX_TOKENS
+BATCH_ANALYSIS_MAX_TASKS = BATCH_ANALYSIS_MAX_TOKENS // BATCH_ANALYSIS_TOKENS_PER_TASK
+
+# Models that reject response_format={"type": "json_object"}: gpt-4 and the
+# gpt-3.5-turbo snapshots released before JSON mode
+JSON_MODE_UNSUPPORTED = re.compile(r"gpt-4(-0314|-0613|-32k.*)?|gpt-3\.5-turbo-(0301|0613|16k(-0613)?)")
+CODE_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+
+def json_mode(model: str) -> Dict[str, Any]:
+    """
+    Completion arguments asking a model for JSON output.
+    Models without JSON mode get none and rely on the prompt's JSON instructions.
+    """
+    if JSON_MODE_UNSUPPORTED.fullmatch(model):
+        return {}
+    return {"response_format": {"type": "json_object"}}
+
+
+def json_content(content: str) -> str:
+    """Response content without the Markdown code fence a model outside JSON mode may add."""
+    content = content.strip()
+    match = CODE_FENCE.match(content)
+    return match.group(1) if match else content
+
+
+def parse_batch_recommendations(content: str) -> Dict[str, TaskRecommendation]:
+    """
+    Parse and validate a batched task analysis response.
+    Entries that fail schema validation are dropped.
+    
+    Args:
+        content: Raw JSON response content
+        
+    Returns:
+        Dict mapping task id (as string) to TaskRecommendation
+    """
+    data = json.loads(json_content(content))
+    items = data.get("recommendations", []) if isinstance(data, dict) else data
+    
+    recommendations = {}
+    for item in items:
+        try:
+            recommendation = TaskRecommendation.model_validate(item)
+        except ValidationError as e:
+            print(f"Skipping invalid task recommendation: {e}")
+            continue
+        recommendations[recommendation.task_id] = recommendation
+    return recommendations
+
+
 class AgentOrchestrator:
     """Orchestrates LLM-powered agent operations."""
     
     def __init__(self):
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.OPENAI_MODEL
+        self.router = model_router
     
     async def generate_response(
         self,
@@ -90,19 +156,28 @@ class AgentOrchestrator:
         system_prompt = get_system_prompt(business_profile)
         user_prompt = get_message_prompt(user_message, full_context)
         
+        # Pick model tier and token budget from the request's complexity
+        route = self.router.route(message=user_message)
+        
         # Call OpenAI API with higher temperature for more dynamic responses
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            response = await create_chat_completion(
+                self.client,
+                route=route,
+                router=self.router,
+                model=route.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.8,  # Increased from 0.7 for more dynamic responses
-                max_tokens=500
+                max_tokens=route.max_tokens
             )
             
             return response.choices[0].message.content.strip()
+        except LLMTimeoutError as e:
+            print(f"LLM response timed out: {e.detail}")
+            return "I'm taking longer than expected to respond. Please try again in a moment."
         except Exception as e:
             error_msg = str(e)
             print(f"Error generating LLM response: {error_msg}")
@@ -147,8 +222,9 @@ class AgentOrchestrator:
         db: AsyncSession,
         user_id: int,
         task_title: str,
-        task_details: str = ""
-    ) -> str:
+        task_details: str = "",
+        structured: bool = False
+    ) -> Union[str, Optional[AgentRecommendation]]:
         """
         Analyze a task and generate action recommendation.
         
@@ -157,16 +233,26 @@ class AgentOrchestrator:
             user_id: User ID
             task_title: Task title
             task_details: Additional task details
+            structured: Return a validated AgentRecommendation instead of text
             
         Returns:
-            Analysis and recommendation
+            Analysis and recommendation; in structured mode an AgentRecommendation,
+            or None if the LLM call or validation fails
         """
         business_profile = await crud.get_business_profile(db, user_id)
         system_prompt = get_system_prompt(business_profile)
-        user_prompt = get_task_analysis_prompt(task_title, task_details)
+        user_prompt = get_task_analysis_prompt(task_title, task_details, structured=structured)
+        
+        if structured:
+            try:
+                return await self._complete_structured(system_prompt, user_prompt, temperature=0.5)
+            except Exception as e:
+                print(f"Error analyzing task: {e}")
+                return None
         
         try:
-            response = await self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -179,7 +265,104 @@ class AgentOrchestrator:
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error analyzing task: {e}")
-            return "Unable to analyze task at this time."
+            return TASK_ANALYSIS_FALLBACK
+    
+    async def analyze_tasks_batch(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        tasks: List[Any]
+    ) -> Dict[str, str]:
+        """
+        Analyze a user's tasks with structured-output LLM requests of up to
+        BATCH_ANALYSIS_MAX_TASKS tasks each, sent concurrently.
+        
+        Args:
+            db: Database session
+            user_id: User ID
+            tasks: List of Task model instances
+            
+        Returns:
+            Dict mapping task id (as string) to TaskRecommendation; tasks the
+            model skipped or returned invalid output for map to None
+        """
+        if not tasks:
+            return {}
+        
+        business_profile = await crud.get_business_profile(db, user_id)
+        system_prompt = get_system_prompt(business_profile)
+        
+        chunks = [
+            tasks[start:start + BATCH_ANALYSIS_MAX_TASKS]
+            for start in range(0, len(tasks), BATCH_ANALYSIS_MAX_TASKS)
+        ]
+        recommendations: Dict[str, TaskRecommendation] = {}
+        for chunk_recommendations in await asyncio.gather(
+            *(self._analyze_task_chunk(system_prompt, chunk) for chunk in chunks)
+        ):
+            recommendations.update(chunk_recommendations)
+        
+        return {str(task.id): recommendations.get(str(task.id)) for task in tasks}
+    
+    async def _analyze_task_chunk(self, system_prompt: str, tasks: List[Any]) -> Dict[str, TaskRecommendation]:
+        """
+        Analyze up to BATCH_ANALYSIS_MAX_TASKS tasks in one request.
+        
+        Args:
+            system_prompt: System prompt for the user
+            tasks: List of Task model instances
+            
+        Returns:
+            Dict mapping task id (as string) to TaskRecommendation; empty if the
+            LLM call or parsing fails
+        """
+        try:
+            response = await create_chat_completion(
+                self.client,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": get_batch_task_analysis_prompt(tasks)}
+                ],
+                temperature=0.5,
+                max_tokens=BATCH_ANALYSIS_TOKENS_PER_TASK * len(tasks),
+                **json_mode(self.model)
+            )
+            
+            return parse_batch_recommendations(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error analyzing tasks batch: {e}")
+            return {}
+    
+    async def _complete_structured(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float
+    ) -> AgentRecommendation:
+        """
+        Request a JSON completion and validate it against AgentRecommendation.
+        
+        Args:
+            system_prompt: System prompt
+            user_prompt: User prompt asking for the structured format
+            temperature: Sampling temperature
+            
+        Returns:
+            Validated AgentRecommendation
+        """
+        response = await create_chat_completion(
+            self.client,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=temperature,
+            max_tokens=STRUCTURED_MAX_TOKENS,
+            **json_mode(self.model)
+        )
+        return AgentRecommendation.model_validate_json(json_content(response.choices[0].message.content))
     
     async def generate_sales_followup(
         self,
@@ -187,8 +370,9 @@ class AgentOrchestrator:
         user_id: int,
         customer: str,
         product: str,
-        sales_status: str
-    ) -> str:
+        sales_status: str,
+        structured: bool = False
+    ) -> Union[str, Optional[AgentRecommendation]]:
         """
         Generate a sales follow-up message.
         
@@ -198,16 +382,26 @@ class AgentOrchestrator:
             customer: Customer name
             product: Product name
             sales_status: Current sales status
+            structured: Return a validated AgentRecommendation instead of text
             
         Returns:
-            Generated follow-up message
+            Generated follow-up message; in structured mode an AgentRecommendation,
+            or None if the LLM call or validation fails
         """
         business_profile = await crud.get_business_profile(db, user_id)
         system_prompt = get_system_prompt(business_profile)
-        user_prompt = get_sales_prompt(customer, product, sales_status)
+        user_prompt = get_sales_prompt(customer, product, sales_status, structured=structured)
+        
+        if structured:
+            try:
+                return await self._complete_structured(system_prompt, user_prompt, temperature=0.7)
+            except Exception as e:
+                print(f"Error generating sales follow-up: {e}")
+                return None
         
         try:
-            response = await self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -226,6 +420,74 @@ class AgentOrchestrator:
 client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 
+async def execute_agent_run(
+    db: AsyncSession,
+    user_id: int,
+    agent_type: AgentType,
+    prefetched: bool = False
+) -> str:
+    """
+    Run any agent type, raising on failure.
+    
+    Args:
+        db: Database session
+        user_id: User ID to run agent for
+        agent_type: Type of agent to run (REMINDER, FOLLOW_UP, CLOSURE, NURTURE, UPSELL)
+        prefetched: Use the context prefetched for this run's slot (scheduled runs only)
+        
+    Returns:
+        Generated message string
+    """
+    # Load data; other runs (ex: POST /agents/run) always read live data
+    if prefetched:
+        context = await context_cache.get_or_load(db, user_id)
+    else:
+        context = await load_context(db, user_id)
+    profile, tasks, leads, sales = context.profile, context.tasks, context.leads, context.sales
+    
+    # Get recent agent runs for context
+    recent_runs = await crud.get_recent_agent_runs(db, user_id, limit=5)
+    
+    # Choose prompt builder based on agent type
+    if agent_type == "REMINDER":
+        prompt = build_reminder_prompt(profile, tasks, leads, sales=None, recent_runs=recent_runs)
+    elif agent_type == "FOLLOW_UP":
+        prompt = build_follow_up_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
+    elif agent_type == "CLOSURE":
+        prompt = build_closure_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
+    elif agent_type == "NURTURE":
+        prompt = build_nurture_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
+    elif agent_type == "UPSELL":
+        prompt = build_upsell_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
+    else:
+        raise ValueError(f"Unknown agent type: {agent_type}")
+    
+    # Call OpenAI on the tier routed for this agent type
+    route = model_router.route(agent_type=agent_type)
+    result = await create_chat_completion(
+        client,
+        route=route,
+        router=model_router,
+        model=route.model,
+        messages=[{"role": "system", "content": prompt}],
+        max_tokens=route.max_tokens
+    )
+    
+    # Extract message
+    message = result.choices[0].message.content
+    
+    # Log agent run
+    await crud.log_agent_run(
+        db=db,
+        user_id=user_id,
+        agent_type=agent_type if isinstance(agent_type, str) else str(agent_type),
+        message=message,
+        buffered=True
+    )
+    
+    return message
+
+
 async def run_agent(db: AsyncSession, user_id: int, agent_type: AgentType) -> str:
     """
     Generic function to run any agent type.
@@ -239,47 +501,7 @@ async def run_agent(db: AsyncSession, user_id: int, agent_type: AgentType) -> st
         Generated message string
     """
     try:
-        # Load data
-        profile = await crud.get_business_profile(db, user_id)
-        tasks = await crud.get_today_tasks(db, user_id)
-        leads = await crud.get_leads(db, user_id)
-        sales = await crud.get_sales_updates(db, user_id)
-        
-        # Get recent agent runs for context
-        recent_runs = await crud.get_recent_agent_runs(db, user_id, limit=5)
-        
-        # Choose prompt builder based on agent type
-        if agent_type == "REMINDER":
-            prompt = build_reminder_prompt(profile, tasks, leads, sales=None, recent_runs=recent_runs)
-        elif agent_type == "FOLLOW_UP":
-            prompt = build_follow_up_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
-        elif agent_type == "CLOSURE":
-            prompt = build_closure_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
-        elif agent_type == "NURTURE":
-            prompt = build_nurture_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
-        elif agent_type == "UPSELL":
-            prompt = build_upsell_prompt(profile, tasks, leads, sales, recent_runs=recent_runs)
-        else:
-            raise ValueError(f"Unknown agent type: {agent_type}")
-        
-        # Call OpenAI
-        result = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": prompt}]
-        )
-        
-        # Extract message
-        message = result.choices[0].message.content
-        
-        # Log agent run
-        await crud.log_agent_run(
-            db=db,
-            user_id=user_id,
-            agent_type=agent_type if isinstance(agent_type, str) else str(agent_type),
-            message=message
-        )
-        
-        return message
+        return await execute_agent_run(db, user_id, agent_type)
     except Exception as e:
         print(f"Error running {agent_type} agent: {e}")
         return f"Error: {str(e)}"
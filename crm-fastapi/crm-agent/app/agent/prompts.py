@@ -1,9 +1,81 @@
 """Prompt templates for LLM agent interactions with multiple agent types."""
-from typing import Literal
+from collections import OrderedDict
+from typing import Callable, Literal, Optional, Tuple
 
 # Agent Type Definitions
 AgentType = Literal["REMINDER", "FOLLOW_UP", "CLOSURE", "NURTURE", "UPSELL"]
 
+# Compiled fragment cache: rendered business-profile and instruction blocks keyed by
+# (user_id, profile_version, agent_type, block). Shared by chat and scheduled runs.
+FRAGMENT_CACHE_MAX_SIZE = 4096
+_fragment_cache: "OrderedDict[Tuple[int, int, str, str], str]" = OrderedDict()
+
+
+def _fragment_key(business_profile, agent_type: str, block: str) -> Optional[Tuple[int, int, str, str]]:
+    """Build the cache key for a profile fragment, or None if it cannot be cached."""
+    if business_profile is None:
+        return None
+    user_id = getattr(business_profile, "user_id", None)
+    if user_id is None:
+        return None
+    version = getattr(business_profile, "version", None) or 0
+    return (user_id, version, agent_type, block)
+
+
+def get_cached_fragment(
+    business_profile,
+    agent_type: str,
+    block: str,
+    render: Callable[[], str]
+) -> str:
+    """
+    Return a rendered prompt fragment, rendering it only on a cache miss.
+    
+    Args:
+        business_profile: BusinessProfile model instance the fragment depends on
+        agent_type: Agent type (or "CHAT") the fragment belongs to
+        block: Name of the fragment within the prompt (ex: "profile", "system")
+        render: Callable producing the fragment text
+        
+    Returns:
+        Rendered fragment string
+    """
+    key = _fragment_key(business_profile, agent_type, block)
+    if key is None:
+        return render()
+    
+    fragment = _fragment_cache.get(key)
+    if fragment is not None:
+        _fragment_cache.move_to_end(key)
+        return fragment
+    
+    fragment = render()
+    _fragment_cache[key] = fragment
+    if len(_fragment_cache) > FRAGMENT_CACHE_MAX_SIZE:
+        _fragment_cache.popitem(last=False)
+    return fragment
+
+
+def invalidate_profile_fragments(user_id: int) -> int:
+    """
+    Drop all cached fragments for a user (called when the business profile is written).
+    
+    Args:
+        user_id: User ID whose fragments should be dropped
+        
+    Returns:
+        Number of fragments removed
+    """
+    stale_keys = [key for key in _fragment_cache if key[0] == user_id]
+    for key in stale_keys:
+        del _fragment_cache[key]
+    return len(stale_keys)
+
+
+def clear_fragment_cache() -> None:
+    """Drop every cached fragment."""
+    _fragment_cache.clear()
+
 
 def format_business_profile(business_profile) -> str:
     """
@@ -30,6 +102,37 @@ def format_business_profile(business_profile) -> str:
 """
 
 
+def format_profile_fields(business_profile) -> str:
+    """
+    Format business profile fields with per-field defaults (used inline in prompts).
+    
+    Args:
+        business_profile: BusinessProfile model instance or None
+        
+    Returns:
+        Formatted profile fields string
+    """
+    business_type = business_profile.business_type if business_profile else "Not specified"
+    products = ", ".join(business_profile.products) if business_profile and business_profile.products else "Not specified"
+    tone = business_profile.tone if business_profile and business_profile.tone else "Professional"
+    daily_goal = business_profile.daily_goal if business_profile and business_profile.daily_goal else "Not specified"
+    keywords = ", ".join(business_profile.keywords) if business_profile and business_profile.keywords else "Not specified"
+    
+    return f"""- Business Type: {business_type}
+- Products: {products}
+- Tone: {tone}
+- Daily Goal: {daily_goal}
+- Keywords: {keywords}"""
+
+
+def _profile_block(business_profile, agent_type: str) -> str:
+    """Cached `format_business_profile` output for an agent prompt."""
+    return get_cached_fragment(
+        business_profile, agent_type, "profile",
+        lambda: format_business_profile(business_profile)
+    )
+
+
 def format_tasks(tasks) -> str:
     """
     Format tasks list for prompts.
@@ -148,12 +251,10 @@ def build_reminder_prompt(
     Returns:
         Reminder prompt string
     """
-    business_type = business_profile.business_type if business_profile else "Not specified"
-    products = ", ".join(business_profile.products) if business_profile and business_profile.products else "Not specified"
-    tone = business_profile.tone if business_profile and business_profile.tone else "Professional"
-    daily_goal = business_profile.daily_goal if business_profile and business_profile.daily_goal else "Not specified"
-    keywords = ", ".join(business_profile.keywords) if business_profile and business_profile.keywords else "Not specified"
-    
+    profile_fields = get_cached_fragment(
+        business_profile, "REMINDER", "profile",
+        lambda: format_profile_fields(business_profile)
+    )
     tasks_str = format_tasks(tasks)
     leads_str = format_leads(leads)
     recent_runs_str = format_recent_runs(recent_runs) if recent_runs else "No previous messages"
@@ -162,11 +263,7 @@ def build_reminder_prompt(
 Do not mention that you are a language model.
 
 BUSINESS PROFILE:
-- Business Type: {business_type}
-- Products: {products}
-- Tone: {tone}
-- Daily Goal: {daily_goal}
-- Keywords: {keywords}
+{profile_fields}
 
 DATA:
 - Tasks today: {tasks_str}
@@ -208,7 +305,7 @@ def build_follow_up_prompt(
     Returns:
         Follow-up prompt string
     """
-    business_profile_str = format_business_profile(business_profile)
+    business_profile_str = _profile_block(business_profile, "FOLLOW_UP")
     tasks_str = format_tasks(tasks)
     leads_str = format_leads(leads)
     sales_str = format_sales(sales) if sales else "No sales"
@@ -264,7 +361,7 @@ def build_closure_prompt(
     Returns:
         Closure prompt string
     """
-    business_profile_str = format_business_profile(business_profile)
+    business_profile_str = _profile_block(business_profile, "CLOSURE")
     leads_str = format_leads(leads)
     sales_str = format_sales(sales) if sales else "No sales"
     recent_runs_str = format_recent_runs(recent_runs) if recent_runs else "No previous messages"
@@ -286,9 +383,9 @@ TASK:
 Focus on closing deals.
 
 Ask for specific actions:
-- "Call customer {customer_name}"
-- "Visit {customer_name}"
-- "Send a quote to {customer_name}"
+- "Call customer {{customer_name}}"
+- "Visit {{customer_name}}"
+- "Send a quote to {{customer_name}}"
 
 Encourage the salesperson to move from "thinking" to "closing".
 Be respectful and realistic.
@@ -319,7 +416,7 @@ def build_nurture_prompt(
     Returns:
         Nurture prompt string
     """
-    business_profile_str = format_business_profile(business_profile)
+    business_profile_str = _profile_block(business_profile, "NURTURE")
     leads_str = format_leads(leads)
     recent_runs_str = format_recent_runs(recent_runs) if recent_runs else "No previous messages"
     
@@ -372,8 +469,11 @@ def build_upsell_prompt(
     Returns:
         Upsell prompt string
     """
-    business_profile_str = format_business_profile(business_profile)
-    products = ", ".join(business_profile.products) if business_profile and business_profile.products else "Not specified"
+    business_profile_str = _profile_block(business_profile, "UPSELL")
+    products = get_cached_fragment(
+        business_profile, "UPSELL", "products",
+        lambda: ", ".join(business_profile.products) if business_profile.products else "Not specified"
+    ) if business_profile else "Not specified"
     sales_str = format_sales(sales) if sales else "No sales"
     recent_runs_str = format_recent_runs(recent_runs) if recent_runs else "No previous messages"
     
@@ -459,6 +559,7 @@ def get_followup_prompt(business_profile, tasks, sales) -> str:
 def get_system_prompt(business_profile) -> str:
     """
     Generate system prompt based on business profile.
+    The rendered prompt is cached per profile version and shared by chat and scheduled runs.
     
     Args:
         business_profile: BusinessProfile model instance
@@ -466,6 +567,14 @@ def get_system_prompt(business_profile) -> str:
     Returns:
         System prompt string for OpenAI API
     """
+    return get_cached_fragment(
+        business_profile, "CHAT", "system",
+        lambda: _render_system_prompt(business_profile)
+    )
+
+
+def _render_system_prompt(business_profile) -> str:
+    """Render the chat system prompt (uncached)."""
     base_prompt = """You are a CRM sales agent assistant for a business, having a natural conversation with a salesperson (user).
 Do not mention that you are a language model or AI.
 
@@ -534,13 +643,18 @@ Respond naturally and helpfully. This is a conversation - engage with what they'
     return prompt
 
 
-def get_task_analysis_prompt(task_title: str, task_details: str = "") -> str:
+STRUCTURED_RECOMMENDATION_FORMAT = """Respond only with a JSON object of this form:
+{"recommendation": "<concise, actionable recommendation>", "priority": "low" | "medium" | "high", "next_action": "<single concrete next step>"}"""
+
+
+def get_task_analysis_prompt(task_title: str, task_details: str = "", structured: bool = False) -> str:
     """
     Generate prompt for analyzing and responding to tasks.
     
     Args:
         task_title: Title of the task
         task_details: Additional task details
+        structured: Ask for a JSON recommendation instead of free text
         
     Returns:
         Prompt for task analysis
@@ -552,12 +666,46 @@ Task: {task_title}"""
     if task_details:
         prompt += f"\nDetails: {task_details}"
     
-    prompt += "\n\nProvide a concise, actionable response or recommendation."
+    if structured:
+        prompt += f"\n\n{STRUCTURED_RECOMMENDATION_FORMAT}"
+    else:
+        prompt += "\n\nProvide a concise, actionable response or recommendation."
     
     return prompt
 
 
-def get_sales_prompt(customer: str, product: str, sales_status: str) -> str:
+def get_batch_task_analysis_prompt(tasks) -> str:
+    """
+    Generate prompt for analyzing several tasks in one request.
+    The model is asked for a JSON object holding one recommendation per task id.
+    
+    Args:
+        tasks: List of Task model instances
+        
+    Returns:
+        Prompt for batched task analysis
+    """
+    task_lines = []
+    for task in tasks:
+        task_str = f"- [id={task.id}] {task.title}"
+        if task.status:
+            task_str += f" (Status: {task.status})"
+        if task.due_date:
+            task_str += f" (Due: {task.due_date})"
+        task_lines.append(task_str)
+    tasks_str = "\n".join(task_lines)
+    
+    return f"""Analyze each of the following tasks and provide a recommendation or response for each one:
+
+{tasks_str}
+
+Respond only with a JSON object of this form:
+{{"recommendations": [{{"task_id": "<task id>", "recommendation": "<concise, actionable recommendation>", "priority": "low" | "medium" | "high", "next_action": "<single concrete next step>"}}]}}
+
+Include exactly one entry per task id."""
+
+
+def get_sales_prompt(customer: str, product: str, sales_status: str, structured: bool = False) -> str:
     """
     Generate prompt for sales-related interactions.
     
@@ -565,13 +713,35 @@ def get_sales_prompt(customer: str, product: str, sales_status: str) -> str:
         customer: Customer name
         product: Product name
         sales_status: Current sales status
+        structured: Ask for a JSON recommendation instead of free text
         
     Returns:
         Prompt for sales interaction
     """
-    return f"""You are following up on a sales opportunity:
+    prompt = f"""You are following up on a sales opportunity:
 - Customer: {customer}
 - Product: {product}
 - Status: {sales_status}
 
 Generate an appropriate follow-up message or action recommendation."""
+    
+    if structured:
+        prompt += f"\n\n{STRUCTURED_RECOMMENDATION_FORMAT}"
+    
+    return prompt
+
+
+def format_recommendation(recommendation) -> str:
+    """
+    Render a structured recommendation as message text.
+    
+    Args:
+        recommendation: AgentRecommendation instance
+        
+    Returns:
+        Formatted recommendation string
+    """
+    text = f"{recommendation.recommendation}\n\nPriority: {recommendation.priority.capitalize()}"
+    if recommendation.next_action:
+        text += f"\nNext action: {recommendation.next_action}"
+    return text
@@ -0,0 +1,173 @@
+"""Model routing by request complexity with per-route latency SLOs."""
+import math
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from app.config.settings import settings
+
+
+# Tiers ordered from fastest to most capable; failover walks towards the front
+TIER_ORDER = ["fast", "standard", "complex"]
+
+# Agent types whose prompts are short, templated and need little reasoning
+FAST_AGENT_TYPES = {"REMINDER", "NURTURE"}
+
+DATA_QUESTION_PATTERN = re.compile(
+    r"\b(how many|how much|total|sum|average|compare|progress|target|revenue|sales|"
+    r"pipeline|forecast|report|analy[sz]e|breakdown|trend|why)\b",
+    re.IGNORECASE
+)
+
+SHORT_MESSAGE_CHARS = 80
+LONG_MESSAGE_CHARS = 600
+
+
+class ModelRoute:
+    """A model tier: which model to call, its token budget and latency SLO."""
+    
+    def __init__(self, name: str, model: str, max_tokens: int, slo_p95_ms: float):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.slo_p95_ms = slo_p95_ms
+    
+    def __repr__(self) -> str:
+        return f"ModelRoute(name={self.name!r}, model={self.model!r}, max_tokens={self.max_tokens})"
+
+
+def default_routes() -> Dict[str, ModelRoute]:
+    """Build the route table from settings."""
+    return {
+        "fast": ModelRoute(
+            "fast",
+            settings.OPENAI_MODEL_FAST,
+            settings.MODEL_FAST_MAX_TOKENS,
+            settings.MODEL_FAST_SLO_P95_MS
+        ),
+        "standard": ModelRoute(
+            "standard",
+            settings.OPENAI_MODEL,
+            settings.MODEL_STANDARD_MAX_TOKENS,
+            settings.MODEL_STANDARD_SLO_P95_MS
+        ),
+        "complex": ModelRoute(
+            "complex",
+            settings.OPENAI_MODEL_COMPLEX,
+            settings.MODEL_COMPLEX_MAX_TOKENS,
+            settings.MODEL_COMPLEX_SLO_P95_MS
+        ),
+    }
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of samples (None when empty)."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class ModelRouter:
+    """Classifies requests with local heuristics and picks a model tier."""
+    
+    def __init__(
+        self,
+        routes: Optional[Dict[str, ModelRoute]] = None,
+        window_size: int = 200,
+        min_samples: int = 20,
+        probe_every: int = 10
+    ):
+        self.routes = routes or default_routes()
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self._latencies: Dict[str, Deque[float]] = {
+            name: deque(maxlen=window_size) for name in self.routes
+        }
+        self._failovers: Dict[str, int] = {name: 0 for name in self.routes}
+    
+    def classify(self, message: str = "", agent_type: Optional[str] = None) -> str:
+        """
+        Classify a request into a tier name.
+        
+        Args:
+            message: User message (chat requests)
+            agent_type: Agent type (scheduled or manual agent runs)
+        
+        Returns:
+            Tier name ("fast", "standard" or "complex")
+        """
+        if agent_type:
+            return "fast" if agent_type in FAST_AGENT_TYPES else "standard"
+        
+        text = (message or "").strip()
+        has_data_question = bool(DATA_QUESTION_PATTERN.search(text))
+        if len(text) > LONG_MESSAGE_CHARS or (has_data_question and len(text) > SHORT_MESSAGE_CHARS):
+            return "complex"
+        if has_data_question or len(text) > SHORT_MESSAGE_CHARS:
+            return "standard"
+        return "fast"
+    
+    def sample_count(self, tier: str) -> int:
+        """Number of latency samples in a tier's window."""
+        return len(self._latencies.get(tier, ()))
+    
+    def latency_percentile(self, tier: str, pct: float) -> Optional[float]:
+        """Observed latency percentile (ms) for a tier."""
+        return percentile(list(self._latencies.get(tier, ())), pct)
+    
+    def is_breaching_slo(self, tier: str) -> bool:
+        """Whether a tier's observed p95 latency exceeds its SLO."""
+        samples = self._latencies.get(tier)
+        if not samples or len(samples) < self.min_samples:
+            return False
+        return percentile(list(samples), 95) > self.routes[tier].slo_p95_ms
+    
+    def route(self, message: str = "", agent_type: Optional[str] = None) -> ModelRoute:
+        """
+        Pick the route for a request, failing over to a faster tier on SLO breach.
+        
+        Args:
+            message: User message (chat requests)
+            agent_type: Agent type (scheduled or manual agent runs)
+        
+        Returns:
+            ModelRoute to use for the LLM call
+        """
+        tier = self.classify(message=message, agent_type=agent_type)
+        position = TIER_ORDER.index(tier)
+        while position > 0 and self.is_breaching_slo(TIER_ORDER[position]):
+            breaching = TIER_ORDER[position]
+            self._failovers[breaching] += 1
+            # Let every Nth request through as a probe so the tier can recover
+            if self._failovers[breaching] % self.probe_every == 0:
+                break
+            position -= 1
+        return self.routes[TIER_ORDER[position]]
+    
+    def record(self, tier: str, latency_ms: float) -> None:
+        """Record the latency of a completed call on a tier."""
+        if tier in self._latencies:
+            self._latencies[tier].append(latency_ms)
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Per-route model, SLO, latency percentiles and failover counts."""
+        result = {}
+        for name, route in self.routes.items():
+            samples = list(self._latencies[name])
+            result[name] = {
+                "model": route.model,
+                "max_tokens": route.max_tokens,
+                "slo_p95_ms": route.slo_p95_ms,
+                "samples": len(samples),
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "breaching_slo": self.is_breaching_slo(name),
+                "failovers": self._failovers[name],
+            }
+        return result
+
+
+# Process-wide router shared by chat and scheduled runs
+model_router = ModelRouter()
@@ -1,183 +1,729 @@
 """Scheduler for automated CRM agent tasks."""
+import asyncio
+import pickle
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.events import JobExecutionEvent, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
 
-from app.db.database import AsyncSessionLocal
-from app.db import crud
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal, engine
+from app.db import crud, partitions
+from app.db.models import AgentJob, UserActivity
+from app.agent.prompts import format_recommendation
+from app.agent.fanout import fan_out, JobSummary
+from app.agent.leader import LeaderElector, make_holder_id
+from app.agent.job_queue import JobQueueWorker, enqueue_for_users, make_slot
+from app.agent.smoothing import load_curve, run_after_for
+from app.agent.timezones import current_tick, due_timezones, ticks_between
+from app.agent.context import context_cache, prefetch_contexts
+from app.agent.triggers import EVENT_DRIVEN_AGENT_TYPES
 from app.agent.orchestrator import (
     AgentOrchestrator,
-    run_morning_reminder,
-    run_follow_up,
-    run_closure_push,
-    run_nurture,
-    run_upsell
+    TASK_ANALYSIS_FALLBACK,
+    execute_agent_run
 )
 
 
 scheduler = AsyncIOScheduler(timezone="UTC")
 orchestrator = AgentOrchestrator()
 
+PENDING_TASK_STATUSES = ("pending", "open", "in progress")
+# Sales that no longer get follow-ups
+CLOSED_SALE_STATUSES = ("won", "lost", "closed", "closed_won", "closed_lost", "cancelled")
+# One LLM call per sale; a user's most recent open sales only
+MAX_SALES_FOLLOWUPS_PER_USER = 5
+
+# Table of the persistent job store, read back by get_scheduled_jobs
+JOBSTORE_TABLE = "apscheduler_jobs"
+
+# Kinds of scheduler_reports rows: last run outcome, last fan-out/enqueue summary and
+# last activity cycle per job ID, and context cache counters per process
+REPORT_LAST_RUN = "last_run"
+REPORT_SUMMARY = "summary"
+REPORT_ACTIVITY = "activity"
+REPORT_CONTEXT_CACHE = "context_cache"
+
+# Identifies this process in the reports it stores per process
+process_id = make_holder_id()
+
+# Reports being stored in the background (referenced until written)
+report_writes: Set[asyncio.Task] = set()
+
+# Set when leader election is enabled; only the leader's scheduler fires triggers
+leader_elector: Optional[LeaderElector] = None
+
+# Set when the durable job queue is enabled; consumes agent_jobs in every scheduler process
+job_worker: Optional[JobQueueWorker] = None
+
+
+async def iter_active_user_ids(
+    batch_size: int = 1000,
+    timezones: Optional[List[str]] = None,
+    tiers: Optional[List[str]] = None
+) -> AsyncIterator[int]:
+    """
+    Stream active user IDs page by page, optionally only those in the given timezones
+    and activity tiers.
+    Each page uses its own short-lived session so no connection is held for the whole fan-out.
+    """
+    after_user_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            user_ids = await crud.get_active_user_ids(
+                db,
+                after_user_id=after_user_id,
+                limit=batch_size,
+                timezones=timezones,
+                tiers=tiers
+            )
+        for user_id in user_ids:
+            yield user_id
+        if len(user_ids) < batch_size:
+            return
+        after_user_id = user_ids[-1]
+
+
+async def fan_out_job(
+    job_id: str,
+    handler: Callable[[int], Awaitable[Any]],
+    timezones: Optional[List[str]] = None,
+    tiers: Optional[List[str]] = None
+) -> JobSummary:
+    """
+    Run a per-user handler for every active user (in the given timezones and tiers)
+    through the bounded worker pool and record the job summary.
+    """
+    async def tracked_handler(user_id: int):
+        async with load_curve.track():
+            await handler(user_id)
+    
+    summary = await fan_out(
+        job_id,
+        iter_active_user_ids(settings.SCHEDULER_USER_BATCH_SIZE, timezones, tiers),
+        tracked_handler,
+        concurrency=settings.SCHEDULER_CONCURRENCY,
+        user_timeout=settings.SCHEDULER_USER_TIMEOUT_SECONDS
+    )
+    await save_report(REPORT_SUMMARY, job_id, summary.to_dict())
+    print(
+        f"Job {job_id}: {summary.users_processed} users, {summary.failures} failures "
+        f"({summary.timeouts} timeouts) in {summary.wall_time_seconds:.1f}s"
+    )
+    return summary
+
 
 async def process_due_tasks():
     """
-    Scheduled job to process tasks due today.
-    Uses LLM to analyze tasks and generate messages (logged for chat interface).
+    Scheduled job to process tasks due today for every active user.
+    """
+    await run_agent_job("process_due_tasks", "TASK_REMINDER")
+
+
+async def process_due_tasks_for_user(user_id: int):
+    """
+    Process one user's tasks due today.
+    Uses one batched LLM request to analyze the user's pending tasks and logs the
+    messages with one bulk insert (available in chat interface).
     """
     async with AsyncSessionLocal() as db:
         try:
-            # Get all users with tasks due today
-            # For simplicity, we'll process tasks for user_id=1
-            # In production, you'd iterate through all users
-            user_id = 1
-            
             tasks = await crud.get_today_tasks(db, user_id)
             
-            for task in tasks:
-                # Process tasks - LLM will interpret status values
-                if task.status and task.status.lower() in ["pending", "open", "in progress"]:
-                    # Analyze task using LLM
-                    analysis = await orchestrator.analyze_task(
-                        db=db,
-                        user_id=user_id,
-                        task_title=task.title,
-                        task_details=f"Status: {task.status}, Due: {task.due_date}"
-                    )
-                    
-                    # Log the message (available in chat interface)
-                    message = f"Task Reminder: {task.title}\n\n{analysis}"
-                    await crud.log_agent_run(
-                        db=db,
-                        user_id=user_id,
-                        agent_type="TASK_REMINDER",
-                        message=message
-                    )
+            # Process tasks - LLM will interpret status values
+            pending_tasks = [
+                task for task in tasks
+                if task.status and task.status.lower() in PENDING_TASK_STATUSES
+            ]
+            if not pending_tasks:
+                return
+            
+            # Analyze all pending tasks in one LLM request
+            analyses = await orchestrator.analyze_tasks_batch(
+                db=db,
+                user_id=user_id,
+                tasks=pending_tasks
+            )
+            
+            # Log the messages in one bulk insert (available in chat interface);
+            # the structured recommendation is stored alongside the rendered text
+            entries = []
+            for task in pending_tasks:
+                recommendation = analyses.get(str(task.id))
+                analysis = format_recommendation(recommendation) if recommendation else TASK_ANALYSIS_FALLBACK
+                entries.append({
+                    "user_id": user_id,
+                    "agent_type": "TASK_REMINDER",
+                    "message": f"Task Reminder: {task.title}\n\n{analysis}",
+                    "payload": recommendation.model_dump() if recommendation else None
+                })
+            await crud.log_agent_runs(db, entries, buffered=True)
         except Exception as e:
-            print(f"Error processing due tasks: {e}")
+            print(f"Error processing due tasks for user {user_id}: {e}")
+            raise
 
 
 async def process_sales_followups():
     """
-    Scheduled job to process sales follow-ups.
-    Uses LLM to generate personalized follow-up messages.
+    Scheduled job to follow up on open sales for every active user.
+    """
+    await run_agent_job("sales_followup", "SALES_FOLLOWUP")
+
+
+async def process_sales_followups_for_user(user_id: int):
+    """
+    Generate follow-ups for one user's open sales, most recent first.
+    Each sale gets a structured recommendation (stored as the payload) and the
+    messages are logged with one bulk insert (available in chat interface).
     """
     async with AsyncSessionLocal() as db:
         try:
-            # Get pending sales and generate follow-ups
-            # This is a placeholder - implement based on your sales model
-            user_id = 1
+            sales = await crud.get_sales_updates(db, user_id)
+            open_sales = [
+                sale for sale in sales
+                if not sale.status or sale.status.lower() not in CLOSED_SALE_STATUSES
+            ][:MAX_SALES_FOLLOWUPS_PER_USER]
+            if not open_sales:
+                return
             
-            # Example: Get sales that need follow-up
-            # sales = await crud.get_pending_sales(db, user_id)
-            # for sale in sales:
-            #     followup = await orchestrator.generate_sales_followup(
-            #         db=db,
-            #         user_id=user_id,
-            #         customer=sale.customer,
-            #         product=sale.product,
-            #         sales_status=sale.status.value
-            #     )
-            #     ...
-            pass
+            entries = []
+            for sale in open_sales:
+                recommendation = await orchestrator.generate_sales_followup(
+                    db=db,
+                    user_id=user_id,
+                    customer=sale.customer,
+                    product=sale.product,
+                    sales_status=sale.status or "unknown",
+                    structured=True
+                )
+                if recommendation is None:
+                    continue
+                entries.append({
+                    "user_id": user_id,
+                    "agent_type": "SALES_FOLLOWUP",
+                    "message": f"Sales Follow-up: {sale.customer} - {sale.product}\n\n{format_recommendation(recommendation)}",
+                    "payload": recommendation.model_dump()
+                })
+            await crud.log_agent_runs(db, entries, buffered=True)
         except Exception as e:
-            print(f"Error processing sales follow-ups: {e}")
+            print(f"Error processing sales follow-ups for user {user_id}: {e}")
+            raise
 
 
-# Wrapper functions for each agent type that handle database sessions
+# Wrapper functions for each agent type that handle database sessions.
+# They raise on failure so the fan-out can count failed users.
 async def reminder_wrapper(user_id: int):
     """Wrapper for REMINDER agent."""
     async with AsyncSessionLocal() as db:
-        await run_morning_reminder(db, user_id)
+        await execute_agent_run(db, user_id, "REMINDER", prefetched=use_prefetch())
 
 
 async def follow_up_wrapper(user_id: int):
     """Wrapper for FOLLOW_UP agent."""
     async with AsyncSessionLocal() as db:
-        await run_follow_up(db, user_id)
+        await execute_agent_run(db, user_id, "FOLLOW_UP", prefetched=use_prefetch())
 
 
 async def closure_wrapper(user_id: int):
     """Wrapper for CLOSURE agent."""
     async with AsyncSessionLocal() as db:
-        await run_closure_push(db, user_id)
+        await execute_agent_run(db, user_id, "CLOSURE", prefetched=use_prefetch())
 
 
 async def nurture_wrapper(user_id: int):
     """Wrapper for NURTURE agent."""
     async with AsyncSessionLocal() as db:
-        await run_nurture(db, user_id)
+        await execute_agent_run(db, user_id, "NURTURE", prefetched=use_prefetch())
 
 
 async def upsell_wrapper(user_id: int):
     """Wrapper for UPSELL agent."""
     async with AsyncSessionLocal() as db:
-        await run_upsell(db, user_id)
+        await execute_agent_run(db, user_id, "UPSELL", prefetched=use_prefetch())
 
 
-def start_scheduler():
-    """Start the APScheduler with configured jobs."""
-    # Morning reminder - 9:00 AM daily
-    scheduler.add_job(
-        reminder_wrapper,
-        trigger=CronTrigger(hour=9, minute=0),
-        args=[1],  # user_id, later configurable
-        id="morning_reminder",
-        name="Morning Reminder - Good Morning + Plan Check",
-        replace_existing=True
+AGENT_WRAPPERS = {
+    "REMINDER": reminder_wrapper,
+    "FOLLOW_UP": follow_up_wrapper,
+    "CLOSURE": closure_wrapper,
+    "NURTURE": nurture_wrapper,
+    "UPSELL": upsell_wrapper,
+}
+
+
+# Per-user handlers runnable through the job queue, by agent type
+JOB_HANDLERS = {
+    **AGENT_WRAPPERS,
+    "TASK_REMINDER": process_due_tasks_for_user,
+    "SALES_FOLLOWUP": process_sales_followups_for_user,
+}
+
+
+def use_job_queue() -> bool:
+    """Whether scheduled runs go through the durable job queue."""
+    return settings.JOB_QUEUE_ENABLED and AsyncSessionLocal is not None
+
+
+def use_prefetch() -> bool:
+    """
+    Whether scheduled runs read prefetched contexts. The cache is per process, so
+    the process that prefetches a context must be the one that runs it: without
+    the job queue the leader prefetches the users due at the next tick and runs
+    the fan-out itself; with it, each process's consumers claim the jobs due
+    within the lead and prefetch them (prefetch_claimed_contexts).
+    """
+    return settings.SCHEDULER_PREFETCH_ENABLED
+
+
+async def enqueue_job(
+    job_id: str,
+    agent_type: str,
+    fire_time: Optional[datetime] = None,
+    timezones: Optional[List[str]] = None,
+    tiers: Optional[List[str]] = None
+) -> int:
+    """
+    Enqueue one durable job per active user (in the given timezones and tiers) for this
+    firing of a scheduled job. Re-running it for the same slot only enqueues the
+    users that were missed. Runs are spread over the smoothing window after the
+    slot (SCHEDULER_SMOOTHING).
+    """
+    fire_time = fire_time or datetime.now(timezone.utc)
+    slot = make_slot(job_id, fire_time)
+    enqueued = await enqueue_for_users(
+        iter_active_user_ids(settings.SCHEDULER_USER_BATCH_SIZE, timezones, tiers),
+        agent_type,
+        slot,
+        batch_size=settings.SCHEDULER_USER_BATCH_SIZE,
+        run_after=lambda user_id, index: run_after_for(user_id, index, job_id, fire_time)
     )
-    
-    # Midday follow-up - 1:00 PM daily
-    scheduler.add_job(
-        follow_up_wrapper,
-        trigger=CronTrigger(hour=13, minute=0),
-        args=[1],
-        id="follow_up",
-        name="Follow-up - Ask What Happened",
-        replace_existing=True
+    await save_report(REPORT_SUMMARY, job_id, {
+        "job_id": job_id,
+        "slot": slot,
+        "enqueued": enqueued,
+        "timezones": timezones,
+        "smoothing": settings.SCHEDULER_SMOOTHING
+    })
+    print(f"Job {job_id}: enqueued {enqueued} {agent_type} runs for slot {slot}")
+    return enqueued
+
+
+async def pending_ticks(job_id: str, now: Optional[datetime] = None) -> List[datetime]:
+    """
+    Ticks a firing of a scheduled job evaluates: every tick after the last one the
+    job evaluated (scheduler_ticks) up to the current one, within
+    SCHEDULER_MISFIRE_GRACE_SECONDS. A firing that ran late, was coalesced with
+    missed ones or was skipped while the previous run was still going therefore
+    still runs the buckets due at the ticks in between. The cursor is shared by
+    every scheduler process, so a new leader carries on where the old one stopped.
+    """
+    now = now or datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        last_tick = await crud.get_scheduler_tick(db, job_id)
+    return ticks_between(
+        last_tick,
+        current_tick(settings.SCHEDULER_TICK_MINUTES, now),
+        settings.SCHEDULER_TICK_MINUTES,
+        oldest=now - timedelta(seconds=settings.SCHEDULER_MISFIRE_GRACE_SECONDS)
     )
+
+
+async def run_agent_job(job_id: str, agent_type: str):
+    """
+    Scheduled job: run an agent for every active user, through the job queue when enabled.
+    Evaluates every tick since the job's last one (pending_ticks), then records it.
+    """
+    for tick in await pending_ticks(job_id):
+        await run_agent_tick(job_id, agent_type, tick)
+        async with AsyncSessionLocal() as db:
+            await crud.advance_scheduler_tick(db, job_id, tick)
+
+
+async def run_agent_tick(job_id: str, agent_type: str, tick: datetime):
+    """
+    Run one tick of a scheduled job. Jobs with a local schedule only run the
+    timezone buckets whose local time matches the schedule at this tick. With
+    activity tiers enabled, only users in the tiers the job serves are run.
+    """
+    timezones = None
+    local_schedule = LOCAL_SCHEDULES.get(job_id)
+    if local_schedule is not None:
+        async with AsyncSessionLocal() as db:
+            profile_timezones = await crud.get_profile_timezones(db)
+        timezones = due_timezones(local_schedule, profile_timezones, tick)
+        if not timezones:
+            return
     
-    # Late afternoon closure push - 4:00 PM daily
-    scheduler.add_job(
-        closure_wrapper,
-        trigger=CronTrigger(hour=16, minute=0),
-        args=[1],
-        id="closure_push",
-        name="Closure Push - Close Deals",
-        replace_existing=True
-    )
+    tiers = JOB_TIERS.get(job_id)
+    if tiers is not None:
+        if not settings.ACTIVITY_TIERS_ENABLED:
+            # Without tiers, daily jobs run everyone and tier-only jobs do not run
+            if UserActivity.DAILY not in tiers:
+                return
+            tiers = None
+        else:
+            await record_activity_cycle(job_id, tick, timezones, tiers)
     
+    if use_job_queue():
+        await enqueue_job(job_id, agent_type, tick, timezones, tiers)
+    else:
+        await fan_out_job(job_id, JOB_HANDLERS[agent_type], timezones, tiers)
+
+
+async def record_activity_cycle(
+    job_id: str,
+    tick: datetime,
+    timezones: Optional[List[str]],
+    tiers: List[str]
+) -> None:
+    """Record the tier breakdown of a job's audience and the runs saved by skipping inactive tiers."""
+    async with AsyncSessionLocal() as db:
+        tier_counts = await crud.count_users_by_tier(db, timezones)
+        previous = await crud.get_scheduler_report(db, REPORT_ACTIVITY, job_id) or {}
+    served = sum(count for tier, count in tier_counts.items() if tier in tiers)
+    # Only jobs for the daily tier would otherwise run everyone; tier-only jobs are extra runs
+    saved = sum(tier_counts.values()) - served if UserActivity.DAILY in tiers else 0
+    await save_report(REPORT_ACTIVITY, job_id, {
+        "slot": tick.isoformat(),
+        "tiers": tier_counts,
+        "served": served,
+        "saved_runs": saved,
+        "saved_runs_total": previous.get("saved_runs_total", 0) + saved,
+    })
+    if saved:
+        print(f"Job {job_id}: skipping {saved} weekly/paused users at {tick.isoformat()}")
+
+
+# Scheduled jobs: (job ID, name, schedule in each user's local time, agent type, activity tiers served)
+SCHEDULED_JOBS = [
+    # Morning reminder - 9:00 AM daily
+    ("morning_reminder", "Morning Reminder - Good Morning + Plan Check", {"hour": 9, "minute": 0}, "REMINDER", ["daily"]),
+    # Midday follow-up - 1:00 PM daily
+    ("follow_up", "Follow-up - Ask What Happened", {"hour": 13, "minute": 0}, "FOLLOW_UP", ["daily"]),
+    # Late afternoon closure push - 4:00 PM daily
+    ("closure_push", "Closure Push - Close Deals", {"hour": 16, "minute": 0}, "CLOSURE", ["daily"]),
     # Nurture every 2 days at 11:00 AM
-    scheduler.add_job(
-        nurture_wrapper,
-        trigger=CronTrigger(hour=11, minute=0, day="*/2"),
-        args=[1],
-        id="nurture",
-        name="Nurture - Keep Leads Engaged",
-        replace_existing=True
+    ("nurture", "Nurture - Keep Leads Engaged", {"hour": 11, "minute": 0, "day": "*/2"}, "NURTURE", ["daily"]),
+    # Sales follow-ups - 2:00 PM daily
+    ("sales_followup", "Sales Follow-up - Chase Open Sales", {"hour": 14, "minute": 0}, "SALES_FOLLOWUP", ["daily"]),
+    # Upsell every Monday at 10:00 AM
+    ("upsell", "Upsell - Suggest Additional Products", {"day_of_week": "mon", "hour": 10, "minute": 0}, "UPSELL", ["daily"]),
+    # Weekly check-in for users who have gone quiet - Monday 9:00 AM
+    ("weekly_checkin", "Weekly Check-in - Re-engage Quiet Users", {"day_of_week": "mon", "hour": 9, "minute": 0}, "REMINDER", ["weekly"]),
+]
+
+LOCAL_SCHEDULES = {job_id: local_schedule for job_id, _, local_schedule, _, _ in SCHEDULED_JOBS}
+JOB_TIERS = {job_id: tiers for job_id, _, _, _, tiers in SCHEDULED_JOBS}
+
+
+def tick_trigger() -> CronTrigger:
+    """UTC trigger shared by all scheduled jobs; every tick resolves the timezone buckets that are due."""
+    return CronTrigger(minute=f"*/{settings.SCHEDULER_TICK_MINUTES}")
+
+
+def prefetch_trigger() -> CronTrigger:
+    """UTC trigger firing SCHEDULER_PREFETCH_LEAD_MINUTES before every tick."""
+    tick = settings.SCHEDULER_TICK_MINUTES
+    lead = min(settings.SCHEDULER_PREFETCH_LEAD_MINUTES, tick - 1)
+    return CronTrigger(minute=f"{(tick - lead) % tick}/{tick}")
+
+
+async def prefetch_due_contexts():
+    """
+    Scheduled job: warm the agent context cache for the users due at the next tick,
+    so the runs themselves mostly do LLM work.
+    """
+    lead = timedelta(minutes=settings.SCHEDULER_PREFETCH_LEAD_MINUTES)
+    tick = current_tick(settings.SCHEDULER_TICK_MINUTES, datetime.now(timezone.utc) + lead)
+    async with AsyncSessionLocal() as db:
+        profile_timezones = await crud.get_profile_timezones(db)
+    timezones = set()
+    tiers = set()
+    for _, _, local_schedule, _, job_tiers in SCHEDULED_JOBS:
+        due = due_timezones(local_schedule, profile_timezones, tick)
+        if due:
+            timezones.update(due)
+            tiers.update(job_tiers)
+    if not timezones:
+        return
+    
+    summary = await prefetch_contexts(
+        iter_active_user_ids(
+            settings.SCHEDULER_USER_BATCH_SIZE,
+            sorted(timezones),
+            sorted(tiers) if settings.ACTIVITY_TIERS_ENABLED else None
+        ),
+        concurrency=settings.SCHEDULER_PREFETCH_CONCURRENCY
     )
+    await save_report(REPORT_SUMMARY, "prefetch", {**summary.to_dict(), "slot": tick.isoformat(), "timezones": sorted(timezones)})
+    await save_report(REPORT_CONTEXT_CACHE, process_id, context_cache.stats())
+    print(
+        f"Prefetched context for {summary.users_processed - summary.failures} users "
+        f"due at {tick.isoformat()} in {summary.wall_time_seconds:.1f}s"
+    )
+
+
+async def prefetch_claimed_contexts(jobs: List[AgentJob]):
+    """
+    Job queue prefetch hook: warm the agent context cache for the jobs this
+    process claimed ahead of their due time.
+    """
+    user_ids = sorted({job.user_id for job in jobs if job.agent_type in AGENT_WRAPPERS})
+    if not user_ids:
+        return
     
-    # Upsell every Monday at 10:00 AM
-    scheduler.add_job(
-        upsell_wrapper,
-        trigger=CronTrigger(day_of_week="mon", hour=10, minute=0),
-        args=[1],
-        id="upsell",
-        name="Upsell - Suggest Additional Products",
-        replace_existing=True
+    async def iter_user_ids():
+        for user_id in user_ids:
+            yield user_id
+    
+    summary = await prefetch_contexts(iter_user_ids(), concurrency=settings.SCHEDULER_PREFETCH_CONCURRENCY)
+    await save_report(REPORT_SUMMARY, "prefetch", {
+        **summary.to_dict(),
+        "worker_id": process_id,
+        "due_until": max(job.run_after for job in jobs).isoformat(),
+    })
+    await save_report(REPORT_CONTEXT_CACHE, process_id, context_cache.stats())
+
+
+async def refresh_activity_index():
+    """Scheduled job: fold new chat messages and task/lead updates into the activity index."""
+    async with AsyncSessionLocal() as db:
+        counts = await crud.refresh_user_activity(
+            db,
+            daily_days=settings.ACTIVITY_DAILY_DAYS,
+            weekly_days=settings.ACTIVITY_WEEKLY_DAYS
+        )
+    print(f"Activity index refreshed: {counts}")
+
+
+async def maintain_run_log_partitions():
+    """Scheduled job: create the coming months' agent_run_logs partitions, archive and drop expired ones."""
+    if engine is None:
+        return
+    result = await partitions.maintain(engine)
+    await save_report(REPORT_SUMMARY, "partition_maintenance", {
+        "created": result["created"],
+        "retired": result["retired"],
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    })
+    print(
+        f"Run log partitions: created {result['created'] or 'none'}, "
+        f"retired {[retired['partition'] for retired in result['retired']] or 'none'}"
+    )
+
+
+def use_event_triggers() -> bool:
+    """Whether FOLLOW_UP and CLOSURE run on crm-backend change events instead of on their schedule."""
+    return (
+        settings.EVENT_TRIGGERS_ENABLED and settings.EVENT_TRIGGERS_REPLACE_POLLS
+        and bool(settings.WEBHOOK_SECRET) and use_job_queue()
     )
+
+
+def job_definitions() -> List[Tuple[str, str, Callable, CronTrigger, list]]:
+    """Jobs to register: (job ID, name, function, trigger, args)."""
+    trigger = tick_trigger()
+    definitions = [
+        (job_id, name, run_agent_job, trigger, [job_id, agent_type])
+        for job_id, name, _, agent_type, _ in SCHEDULED_JOBS
+        if not (use_event_triggers() and agent_type in EVENT_DRIVEN_AGENT_TYPES)
+    ]
+    if use_prefetch() and not use_job_queue():
+        # With the job queue, the consumers prefetch the jobs they claim instead
+        definitions.append(
+            ("prefetch_contexts", "Prefetch - Warm Agent Context", prefetch_due_contexts, prefetch_trigger(), [])
+        )
+    if settings.ACTIVITY_TIERS_ENABLED:
+        definitions.append(
+            ("refresh_activity", "Activity Index - Refresh Tiers", refresh_activity_index,
+             IntervalTrigger(minutes=settings.ACTIVITY_REFRESH_MINUTES), [])
+        )
+    if settings.RUN_LOG_PARTITIONS_ENABLED:
+        definitions.append(
+            ("partition_maintenance", "Run Log Partitions - Create Ahead and Archive Expired",
+             maintain_run_log_partitions, CronTrigger(hour=3, minute=0, timezone=timezone.utc), [])
+        )
+    return definitions
+
+
+def job_defaults() -> Dict[str, Any]:
+    """Misfire policy applied to every scheduled job."""
+    return {
+        "coalesce": settings.SCHEDULER_COALESCE,
+        "misfire_grace_time": settings.SCHEDULER_MISFIRE_GRACE_SECONDS,
+        "max_instances": 1,
+    }
+
+
+def make_jobstore():
+    """
+    Job store for the scheduler: a SQLAlchemy store in the application database,
+    so next run times survive restarts, or the in-memory store.
+    APScheduler's SQLAlchemy store is synchronous, so it uses the application
+    database URL with the psycopg2 driver instead of the asyncpg engine.
+    """
+    if settings.SCHEDULER_JOBSTORE != "sqlalchemy" or engine is None:
+        return MemoryJobStore()
+    try:
+        url = settings.SCHEDULER_JOBSTORE_URL or engine.url.set(drivername="postgresql+psycopg2")
+        return SQLAlchemyJobStore(url=url, tablename=JOBSTORE_TABLE)
+    except Exception as e:
+        print(f"Warning: persistent job store unavailable, using in-memory jobs: {e}")
+        return MemoryJobStore()
+
+
+async def save_report(kind: str, job_id: str, report: Dict[str, Any]) -> None:
+    """Store the latest report of a job in scheduler_reports, where the API processes read it."""
+    if AsyncSessionLocal is None:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await crud.save_scheduler_report(db, kind, job_id, report)
+    except Exception as e:
+        print(f"Warning: failed to store the {kind} report of {job_id}: {e}")
+
+
+def record_job_event(event: JobExecutionEvent):
+    """Store the outcome of the last run of each job (listeners are synchronous, so in the background)."""
+    status = {EVENT_JOB_EXECUTED: "executed", EVENT_JOB_ERROR: "error", EVENT_JOB_MISSED: "missed"}[event.code]
+    report = {
+        "scheduled_run_time": event.scheduled_run_time.isoformat() if event.scheduled_run_time else None,
+        "status": status,
+        "error": str(event.exception) if event.exception else None,
+    }
+    task = asyncio.get_running_loop().create_task(save_report(REPORT_LAST_RUN, event.job_id, report))
+    report_writes.add(task)
+    task.add_done_callback(report_writes.discard)
+
+
+def register_jobs():
+    """
+    Add the scheduled jobs, keeping the stored next run time of jobs that already
+    exist so a run missed during a restart is caught up under the misfire policy.
+    Jobs no longer defined are removed from the store.
+    """
+    defaults = job_defaults()
+    definitions = job_definitions()
+    for job_id, name, func, trigger, args in definitions:
+        existing = scheduler.get_job(job_id)
+        if existing is None:
+            scheduler.add_job(func, trigger=trigger, args=args, id=job_id, name=name, **defaults)
+            continue
+        scheduler.modify_job(job_id, func=func, args=args, name=name, **defaults)
+        if str(existing.trigger) != str(trigger):
+            scheduler.reschedule_job(job_id, trigger=trigger)
+    
+    defined = {job_id for job_id, _, _, _, _ in definitions}
+    for job in scheduler.get_jobs():
+        if job.id not in defined:
+            print(f"Removing stale scheduled job {job.id}")
+            scheduler.remove_job(job.id)
+
+
+def start_scheduler():
+    """Start the APScheduler with configured jobs."""
+    scheduler.configure(jobstores={"default": make_jobstore()}, job_defaults=job_defaults())
+    scheduler.add_listener(record_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    try:
+        # Jobs are registered against the started (paused) store so stored jobs are visible
+        scheduler.start(paused=True)
+    except Exception as e:
+        print(f"Warning: job store failed to start, using in-memory jobs: {e}")
+        scheduler.configure(jobstores={"default": MemoryJobStore()})
+        scheduler.start(paused=True)
+    register_jobs()
+    
+    global leader_elector, job_worker
+    if settings.LEADER_ELECTION_ENABLED and AsyncSessionLocal is not None:
+        # Every process registers the jobs, but triggers only fire while this
+        # process holds the scheduler lease; the others stay API-only
+        leader_elector = LeaderElector(
+            on_elected=scheduler.resume,
+            on_demoted=scheduler.pause
+        )
+        leader_elector.start()
+        print(f"Scheduler started paused, waiting for leader election ({leader_elector.holder_id})")
+    else:
+        scheduler.resume()
+    
+    if AsyncSessionLocal is not None:
+        load_curve.start()
     
-    scheduler.start()
-    print("Scheduler started with multi-agent timeline:")
+    if use_job_queue():
+        # Consumers run in every scheduler process, leader or not, so throughput
+        # scales with the number of workers
+        job_worker = JobQueueWorker(
+            handlers=JOB_HANDLERS,
+            worker_id=process_id,
+            prefetch=prefetch_claimed_contexts if use_prefetch() else None,
+            prefetch_lead_seconds=settings.SCHEDULER_PREFETCH_LEAD_MINUTES * 60
+        )
+        job_worker.start()
+        print(f"Job queue worker started with {job_worker.concurrency} consumers ({job_worker.worker_id})")
+    print("Scheduler started with multi-agent timeline (user's local time):")
     print("- 09:00 → REMINDER (daily)")
     print("- 13:00 → FOLLOW_UP (daily)")
+    print("- 14:00 → SALES_FOLLOWUP for open sales (daily)")
     print("- 16:00 → CLOSURE push (daily)")
     print("- 11:00 → NURTURE (every 2 days)")
     print("- 10:00 → UPSELL (every Monday)")
+    print("- 09:00 → weekly check-in REMINDER for quiet users (every Monday)")
+    if use_event_triggers():
+        print("- FOLLOW_UP / CLOSURE → on crm-backend change events instead of 13:00 / 16:00")
+
+
+async def get_scheduled_jobs(db: AsyncSession) -> List[Dict[str, Any]]:
+    """
+    Next run time, misfire policy, last evaluated tick and last run outcome of each
+    scheduled job. Read from the persistent job store, scheduler_ticks and
+    scheduler_reports rather than this process's scheduler, which does not run in
+    the API processes. Empty with the in-memory job store.
+    """
+    stored_jobs = await crud.get_stored_jobs(db, JOBSTORE_TABLE)
+    ticks = await crud.get_scheduler_ticks(db)
+    last_runs = await crud.get_scheduler_reports(db, REPORT_LAST_RUN)
+    jobs = []
+    for job_id, job_state in stored_jobs:
+        # Pickled by APScheduler's SQLAlchemyJobStore in our own database
+        state = pickle.loads(job_state)
+        next_run_time = state.get("next_run_time")
+        last_tick = ticks.get(job_id)
+        jobs.append({
+            "id": job_id,
+            "name": state.get("name"),
+            "trigger": str(state.get("trigger")),
+            "next_run_time": next_run_time.isoformat() if next_run_time else None,
+            "coalesce": state.get("coalesce"),
+            "misfire_grace_time": state.get("misfire_grace_time"),
+            "last_tick": last_tick.isoformat() if last_tick else None,
+            "last_run": last_runs.get(job_id),
+        })
+    return jobs
+
+
+def get_leader_status() -> Optional[Dict[str, Any]]:
+    """Leadership state of this process, or None when leader election is disabled."""
+    return leader_elector.status() if leader_elector else None
+
+
+def get_job_worker_stats() -> Optional[Dict[str, Any]]:
+    """Job queue consumer counters of this process, or None when the queue is not consumed here."""
+    return job_worker.stats() if job_worker else None
 
 
-def shutdown_scheduler():
-    """Shutdown the scheduler gracefully."""
+async def shutdown_scheduler():
+    """Shutdown the scheduler gracefully, releasing the scheduler lease if held."""
+    if job_worker is not None:
+        await job_worker.stop()
+    await load_curve.stop()
+    if leader_elector is not None:
+        await leader_elector.stop()
     scheduler.shutdown()
     print("Scheduler shut down")
 
@@ -0,0 +1,213 @@
+"""Load smoothing for scheduled runs and the observed load curve.
+
+Instead of running every user's job at exactly 09:00:00, each queued job gets a
+`run_after` inside a smoothing window after the slot:
+
+- "offset": a deterministic per-user offset (hash of job ID and user ID), so a
+  user runs at the same time every day and the load is uniform over the window
+- "rate": jobs are spaced at SCHEDULER_TARGET_RUNS_PER_SECOND in enqueue order
+- "off": every job is due at the slot time
+"""
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal
+from app.db import crud
+from app.agent.leader import make_holder_id
+
+
+def user_offset_seconds(user_id: int, job_id: str, window_seconds: float) -> float:
+    """
+    Deterministic offset of a user's run within the window.
+    Uses a stable hash (not Python's salted hash) so every process agrees.
+    
+    Args:
+        user_id: User ID
+        job_id: Scheduled job ID (different jobs spread users differently)
+        window_seconds: Smoothing window
+    
+    Returns:
+        Offset in [0, window_seconds)
+    """
+    digest = hashlib.sha1(f"{job_id}:{user_id}".encode()).digest()
+    fraction = int.from_bytes(digest[:8], "big") / 2 ** 64
+    return fraction * window_seconds
+
+
+def run_after_for(
+    user_id: int,
+    index: int,
+    job_id: str,
+    base_time: datetime,
+    mode: Optional[str] = None
+) -> datetime:
+    """
+    When a user's queued run becomes due.
+    
+    Args:
+        user_id: User ID
+        index: Position of the user in the enqueue order (used by "rate")
+        job_id: Scheduled job ID
+        base_time: Slot time
+        mode: "offset", "rate" or "off" (default: SCHEDULER_SMOOTHING)
+    
+    Returns:
+        Due time of the run
+    """
+    mode = mode or settings.SCHEDULER_SMOOTHING
+    if mode == "offset":
+        offset = user_offset_seconds(user_id, job_id, settings.SCHEDULER_SMOOTHING_WINDOW_SECONDS)
+    elif mode == "rate":
+        offset = index / settings.SCHEDULER_TARGET_RUNS_PER_SECOND
+    else:
+        offset = 0.0
+    return base_time + timedelta(seconds=offset)
+
+
+class LoadCurve:
+    """
+    Per-bucket counts of started runs and peak concurrency in this process.
+    Runs happen in the worker processes, so the buckets are flushed to
+    scheduler_load every SCHEDULER_LOAD_FLUSH_SECONDS and the API reads the
+    curve of every process from there (read_load_curve).
+    """
+    
+    def __init__(self, bucket_seconds: int = 60, retention_buckets: int = 1440, worker_id: Optional[str] = None):
+        self.bucket_seconds = bucket_seconds
+        self.retention_buckets = retention_buckets
+        self.worker_id = worker_id or make_holder_id()
+        self.in_flight = 0
+        self._buckets: Dict[int, Dict[str, int]] = {}
+        self._changed: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+    
+    def _bucket(self, now: Optional[float] = None) -> Tuple[int, Dict[str, int]]:
+        key = int((now if now is not None else time.time()) // self.bucket_seconds)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {"started": 0, "peak_in_flight": self.in_flight}
+            oldest = key - self.retention_buckets
+            for stale in [k for k in self._buckets if k <= oldest]:
+                del self._buckets[stale]
+                self._changed.discard(stale)
+        return key, bucket
+    
+    def record_start(self, now: Optional[float] = None) -> None:
+        """Count a run starting."""
+        self.in_flight += 1
+        key, bucket = self._bucket(now)
+        bucket["started"] += 1
+        bucket["peak_in_flight"] = max(bucket["peak_in_flight"], self.in_flight)
+        self._changed.add(key)
+    
+    def record_end(self) -> None:
+        """Count a run finishing."""
+        self.in_flight -= 1
+    
+    @asynccontextmanager
+    async def track(self):
+        """Record a run for the duration of the block."""
+        self.record_start()
+        try:
+            yield
+        finally:
+            self.record_end()
+    
+    def changed_buckets(self) -> List[Dict[str, Any]]:
+        """Buckets changed since the last call, as scheduler_load rows of this process."""
+        rows = [
+            {
+                "bucket_start": datetime.fromtimestamp(key * self.bucket_seconds, timezone.utc),
+                "started": self._buckets[key]["started"],
+                "peak_in_flight": self._buckets[key]["peak_in_flight"],
+            }
+            for key in sorted(self._changed)
+        ]
+        self._changed.clear()
+        return rows
+    
+    async def flush(self) -> int:
+        """
+        Write the changed buckets of this process to scheduler_load.
+        
+        Returns:
+            Number of buckets written
+        """
+        rows = self.changed_buckets()
+        if not rows or AsyncSessionLocal is None:
+            return 0
+        oldest = datetime.now(timezone.utc) - timedelta(seconds=self.bucket_seconds * self.retention_buckets)
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.save_load_buckets(db, self.worker_id, rows, oldest)
+        except Exception as e:
+            # Counts are absolute per bucket: write them again with the next flush
+            self._changed.update(int(row["bucket_start"].timestamp()) // self.bucket_seconds for row in rows)
+            print(f"Warning: failed to store the load curve: {e}")
+            return 0
+        return len(rows)
+    
+    async def run(self, interval_seconds: float) -> None:
+        """Flush every interval until cancelled."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.flush()
+    
+    def start(self) -> None:
+        """Start flushing the buckets in the background."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(settings.SCHEDULER_LOAD_FLUSH_SECONDS))
+    
+    async def stop(self) -> None:
+        """Stop the flush loop and write the last buckets."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+
+load_curve = LoadCurve()
+
+
+async def read_load_curve(db: AsyncSession, minutes: int = 60, bucket_seconds: int = 60) -> Dict[str, Any]:
+    """
+    Load curve of every scheduler process for the last `minutes`, from scheduler_load.
+    
+    Args:
+        db: Database session
+        minutes: How far back to report
+        bucket_seconds: Bucket size the processes record
+    
+    Returns:
+        Buckets (start time, runs started, peak concurrency summed over the
+        processes) and their peaks
+    """
+    since = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    rows = await crud.get_load_buckets(db, since)
+    buckets: List[Dict[str, Any]] = [
+        {
+            "start": bucket_start.isoformat(),
+            "started": started,
+            "peak_in_flight": peak_in_flight,
+            "workers": workers,
+        }
+        for bucket_start, started, peak_in_flight, workers in rows
+    ]
+    return {
+        "bucket_seconds": bucket_seconds,
+        "peak_started_per_bucket": max((b["started"] for b in buckets), default=0),
+        "peak_in_flight": max((b["peak_in_flight"] for b in buckets), default=0),
+        "buckets": buckets,
+    }
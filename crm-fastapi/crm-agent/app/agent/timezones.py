@@ -0,0 +1,90 @@
+"""Timezone buckets for per-user local-time scheduling.
+
+Scheduled jobs are defined in local time ("09:00 every day"). Instead of one
+timer per user, each job ticks every SCHEDULER_TICK_MINUTES in UTC. On every tick
+the job resolves which timezones are at its local time and runs one batch for
+the users in those timezones. The number of timers stays equal to the number of
+jobs however many users there are.
+"""
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from apscheduler.triggers.cron import CronTrigger
+
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+def is_valid_timezone(name: str) -> bool:
+    """Whether `name` is a known IANA timezone (ex: "Asia/Beirut")."""
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def resolve_timezone(name: Optional[str]) -> tzinfo:
+    """Timezone for a profile value; unknown or empty values fall back to UTC."""
+    if name and is_valid_timezone(name):
+        return ZoneInfo(name)
+    return timezone.utc
+
+
+def current_tick(tick_minutes: int, now: Optional[datetime] = None) -> datetime:
+    """
+    Start of the tick containing `now` (UTC, truncated to a multiple of tick_minutes).
+    A late (caught up) run within the same tick resolves to the tick it belongs to.
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    minute = now.minute - now.minute % tick_minutes
+    return now.replace(minute=minute, second=0, microsecond=0)
+
+
+def ticks_between(
+    after: Optional[datetime],
+    until: datetime,
+    tick_minutes: int,
+    oldest: Optional[datetime] = None
+) -> List[datetime]:
+    """
+    Ticks after `after` up to and including `until`, oldest first.
+    
+    Args:
+        after: Last tick already evaluated (None: only `until` is due)
+        until: Current tick start
+        tick_minutes: Tick length
+        oldest: Ticks before this are dropped (past the misfire grace time)
+    
+    Returns:
+        Tick starts to evaluate
+    """
+    if after is None:
+        return [until]
+    ticks = []
+    tick = until
+    while tick > after and (oldest is None or tick >= oldest):
+        ticks.append(tick)
+        tick -= timedelta(minutes=tick_minutes)
+    return ticks[::-1]
+
+
+def due_timezones(local_schedule: Dict[str, Any], timezones: Iterable[str], tick: datetime) -> List[str]:
+    """
+    Timezone buckets whose local time matches a schedule at this tick.
+    
+    Args:
+        local_schedule: CronTrigger fields in local time (ex: {"hour": 9, "minute": 0})
+        timezones: Distinct profile timezones
+        tick: Tick start from current_tick
+    
+    Returns:
+        Timezones due at this tick
+    """
+    due = []
+    for name in timezones:
+        trigger = CronTrigger(timezone=resolve_timezone(name), **local_schedule)
+        if trigger.get_next_fire_time(None, tick - timedelta(seconds=1)) == tick:
+            due.append(name)
+    return due
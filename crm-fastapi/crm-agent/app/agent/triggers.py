@@ -0,0 +1,151 @@
+"""Event-driven agent runs from crm-backend change events.
+
+FOLLOW_UP and CLOSURE only make sense after something changed: a task was done,
+an opportunity moved stage. crm-backend posts these changes to
+POST /webhooks/crm-events and an agent run is enqueued only for the events worth
+reacting to:
+
+- a task moving to a done status → FOLLOW_UP (ask how it went)
+- an open opportunity moving to another stage → CLOSURE (push to close)
+- an opportunity won or lost → FOLLOW_UP (ask what made the difference)
+
+Events are debounced per user and agent type: the run is due
+EVENT_DEBOUNCE_SECONDS after the user's last event, so a burst of changes (ex: a
+bulk status update) yields one run. Runs are bucketed by
+EVENT_DEBOUNCE_MAX_WAIT_SECONDS so a steady stream of events cannot push a run
+back forever. The debounce state is the pending agent_jobs row itself, so it
+holds across API processes.
+"""
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.db import crud
+from app.agent.job_queue import make_idempotency_key
+from app.agent.context import context_cache
+
+
+TASK_STATUS_CHANGED = "task.status_changed"
+OPPORTUNITY_STAGE_CHANGED = "opportunity.stage_changed"
+
+TASK_DONE_STATUSES = ("done", "completed", "complete")
+OPPORTUNITY_CLOSED_STATUSES = ("won", "lost")
+
+# Agent types that can run on events instead of on their schedule
+EVENT_DRIVEN_AGENT_TYPES = ("FOLLOW_UP", "CLOSURE")
+
+SIGNATURE_PREFIX = "sha256="
+
+
+class ChangeEvent(BaseModel):
+    """A change in crm-backend, as posted to the webhook."""
+    type: str  # task.status_changed or opportunity.stage_changed
+    user_id: int  # Owner (assigned user) of the task or opportunity
+    entity_id: Optional[int] = None
+    old_value: Optional[str] = None  # Previous task status or pipeline stage
+    new_value: Optional[str] = None  # New task status or pipeline stage
+    status: Optional[str] = None  # Opportunity status (Open, Won, Lost)
+
+
+# Webhook counters since process start
+trigger_stats: Dict[str, int] = {
+    "received": 0,
+    "ignored": 0,
+    "enqueued": 0,
+    "debounced": 0,
+}
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: Optional[str] = None) -> bool:
+    """
+    Check the X-CRM-Signature header (sha256=<hex HMAC of the raw body>).
+    Every request is rejected when no WEBHOOK_SECRET is configured.
+    """
+    secret = settings.WEBHOOK_SECRET if secret is None else secret
+    if not secret:
+        return False
+    if not signature or not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len(SIGNATURE_PREFIX):])
+
+
+def agent_type_for(event: ChangeEvent) -> Optional[str]:
+    """Agent to run for a change event, or None when there is nothing to react to."""
+    new_value = (event.new_value or "").strip().lower()
+    old_value = (event.old_value or "").strip().lower()
+    if event.type == TASK_STATUS_CHANGED:
+        if new_value in TASK_DONE_STATUSES and old_value not in TASK_DONE_STATUSES:
+            return "FOLLOW_UP"
+        return None
+    if event.type == OPPORTUNITY_STAGE_CHANGED:
+        if (event.status or "").strip().lower() in OPPORTUNITY_CLOSED_STATUSES:
+            return "FOLLOW_UP"
+        if new_value and new_value != old_value:
+            return "CLOSURE"
+        return None
+    return None
+
+
+def debounce_slot(now: datetime, bucket_offset: int = 0) -> str:
+    """Slot of an event-driven run: one per EVENT_DEBOUNCE_MAX_WAIT_SECONDS bucket."""
+    bucket_seconds = settings.EVENT_DEBOUNCE_MAX_WAIT_SECONDS
+    bucket = int(now.timestamp() // bucket_seconds) + bucket_offset
+    start = datetime.fromtimestamp(bucket * bucket_seconds, timezone.utc)
+    return f"event@{start.strftime('%Y-%m-%dT%H:%M:%S')}"
+
+
+async def handle_events(db: AsyncSession, events: List[ChangeEvent]) -> Dict[str, int]:
+    """
+    Enqueue (or push back) one debounced run per user and agent type for the events
+    worth reacting to.
+    
+    Args:
+        db: Database session
+        events: Change events from crm-backend
+    
+    Returns:
+        Counts of received, ignored, enqueued and debounced (merged into a pending run) events
+    """
+    counts = {"received": len(events), "ignored": 0, "enqueued": 0, "debounced": 0}
+    runs: Dict[Tuple[int, str], None] = {}
+    for event in events:
+        agent_type = agent_type_for(event)
+        if agent_type is None:
+            counts["ignored"] += 1
+            continue
+        if (event.user_id, agent_type) in runs:
+            counts["debounced"] += 1
+            continue
+        runs[(event.user_id, agent_type)] = None
+    
+    now = datetime.now(timezone.utc)
+    run_after = now + timedelta(seconds=settings.EVENT_DEBOUNCE_SECONDS)
+    for user_id, agent_type in runs:
+        # The run is built from fresh data, not from a context prefetched before the change
+        context_cache.invalidate(user_id)
+        # If this bucket's run already started, the change goes to the next bucket's run
+        for bucket_offset in (0, 1):
+            slot = debounce_slot(now, bucket_offset)
+            inserted = await crud.debounce_agent_job(db, {
+                "user_id": user_id,
+                "agent_type": agent_type,
+                "slot": slot,
+                "idempotency_key": make_idempotency_key(user_id, agent_type, slot),
+                "max_attempts": settings.JOB_MAX_ATTEMPTS,
+                "run_after": run_after,
+            })
+            if inserted is not None:
+                counts["enqueued" if inserted else "debounced"] += 1
+                break
+        else:
+            counts["debounced"] += 1
+    
+    for key, value in counts.items():
+        trigger_stats[key] += value
+    return counts
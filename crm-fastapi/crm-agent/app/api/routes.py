@@ -8,7 +8,7 @@ from pydantic import BaseModel
 from app.db.database import get_db
 from app.db import crud
 from app.agent.orchestrator import AgentOrchestrator, run_agent
-from app.agent.prompts import AgentType
+from app.agent.prompts import AgentType, invalidate_profile_fragments
 
 
 # Request Models
@@ -127,6 +127,8 @@ async def create_business_profile(
         daily_goal=profile.daily_goal,
         keywords=profile.keywords
     )
+    # Drop compiled prompt fragments rendered from the previous profile version
+    invalidate_profile_fragments(user_id)
     return {"status": "success", "profile_id": business_profile.id}
 
 
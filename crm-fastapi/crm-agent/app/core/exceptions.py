@@ -48,3 +48,12 @@ class ValidationError(CRMException):
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
         )
 
+
+class LLMTimeoutError(CRMException):
+    """Raised when an LLM call exceeds its deadline."""
+    
+    def __init__(self, timeout: float):
+        super().__init__(
+            detail=f"LLM call exceeded its deadline of {timeout:.1f}s",
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT
+        )
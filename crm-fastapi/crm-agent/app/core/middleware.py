@@ -2,6 +2,8 @@
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
 
+from app.config.settings import settings
+
 
 def setup_cors(app: FastAPI) -> None:
     """Configure CORS middleware for FastAPI application.
@@ -16,3 +18,35 @@ def setup_cors(app: FastAPI) -> None:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that gives each HTTP request a deadline for its LLM calls.
+    
+    The budget is REQUEST_DEADLINE_SECONDS; clients may shorten it with an
+    `X-Request-Timeout` header (seconds). The deadline is carried in a context
+    variable, so it propagates into the orchestrator without extra arguments.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        from app.agent.llm_calls import deadline_scope
+        
+        seconds = settings.REQUEST_DEADLINE_SECONDS
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout":
+                try:
+                    seconds = min(seconds, float(value.decode()))
+                except ValueError:
+                    pass
+                break
+        
+        with deadline_scope(seconds):
+            await self.app(scope, receive, send)
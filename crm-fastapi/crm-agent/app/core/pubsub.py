@@ -0,0 +1,288 @@
+"""Push of new agent run logs to connected chat clients.
+
+Every committed AgentRunLog row is published here, and /ws/chat/{user_id}
+subscribes to a user's rows and sends them as they arrive, so scheduled
+REMINDER, FOLLOW_UP and CLOSURE messages show up without the UI re-fetching
+history.
+
+Backends (PUSH_BACKEND):
+- memory: fan-out inside the process. Enough when the scheduler runs in the
+  API process.
+- postgres: publishes with NOTIFY on PUSH_CHANNEL and fans out what it hears
+  with LISTEN, so rows written by `python -m app.worker` or another API process
+  reach every socket. NOTIFY payloads are capped at 8000 bytes; longer messages
+  are announced without their text and loaded by ID, only by the processes
+  with a subscriber for that user.
+
+Delivery is best effort: a client that stops reading is dropped once its queue
+holds PUSH_QUEUE_SIZE messages, and reconnects with since_id to catch up.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+import asyncpg
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+
+from app.config.settings import settings
+from app.db import database
+from app.db.models import AgentRunLog
+
+
+# NOTIFY rejects payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7900
+LISTEN_RETRY_SECONDS = 5
+# Messages waiting for NOTIFY; past this they are dropped instead of slowing the writers
+OUTBOX_SIZE = 10000
+STOP_DRAIN_SECONDS = 2
+
+
+def run_log_message(
+    user_id: int,
+    run_id: int,
+    agent_type: str,
+    message: str,
+    created_at: datetime,
+    payload: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Pushed form of an agent run log: a chat history item plus user_id."""
+    return {
+        "user_id": user_id,
+        "id": run_id,
+        "agent_type": agent_type,
+        "message": message,
+        "payload": payload,
+        "created_at": created_at.isoformat(),
+    }
+
+
+class Subscription:
+    """One socket's queue of pushed messages."""
+    
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        # Set when the queue overflowed: messages were lost and the client must catch up
+        self.dropped = False
+
+
+class MemoryPubSub:
+    """In-process fan-out of agent run logs to per-user subscriptions."""
+    
+    backend = "memory"
+    
+    def __init__(self, queue_size: Optional[int] = None):
+        self.queue_size = queue_size or settings.PUSH_QUEUE_SIZE
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+    
+    async def start(self, listen: bool = True) -> None:
+        """Start the backend; listen=False for processes that only publish (the worker)."""
+    
+    async def stop(self) -> None:
+        """Stop the backend."""
+    
+    def subscribe(self, user_id: int) -> Subscription:
+        """Subscribe to a user's new messages."""
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscription (idempotent)."""
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+    
+    async def publish(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Publish committed agent run logs. Never raises: a lost push is caught
+        up by the client's next history read.
+        
+        Args:
+            messages: run_log_message() dicts
+        """
+        self.published += len(messages)
+        self._deliver(messages)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Subscriber and message counters."""
+        return {
+            "backend": self.backend,
+            "users": len(self._subscriptions),
+            "subscriptions": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+    
+    def _deliver(self, messages: List[Dict[str, Any]]) -> None:
+        for message in messages:
+            for subscription in list(self._subscriptions.get(message["user_id"], ())):
+                try:
+                    subscription.queue.put_nowait(message)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    # The client stopped reading: drop it rather than buffer without bound
+                    subscription.dropped = True
+                    self.dropped += 1
+                    self.unsubscribe(subscription)
+
+
+class PostgresPubSub(MemoryPubSub):
+    """Fan-out across processes through Postgres LISTEN/NOTIFY."""
+    
+    backend = "postgres"
+    
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        channel: Optional[str] = None,
+        queue_size: Optional[int] = None
+    ):
+        super().__init__(queue_size)
+        # asyncpg takes a plain postgresql:// DSN
+        self.dsn = dsn or make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        self.channel = channel or settings.PUSH_CHANNEL
+        self.notify_failures = 0
+        self._outbox: asyncio.Queue = asyncio.Queue(OUTBOX_SIZE)
+        self._send_task: Optional[asyncio.Task] = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self._loads: Set[asyncio.Task] = set()
+    
+    async def start(self, listen: bool = True) -> None:
+        if self._send_task is None:
+            self._send_task = asyncio.create_task(self._send())
+        if listen and self._listen_task is None:
+            self._listen_task = asyncio.create_task(self._listen())
+    
+    async def stop(self) -> None:
+        if self._send_task is not None:
+            # Give the last messages (ex: the final log buffer flush) a moment to go out
+            try:
+                await asyncio.wait_for(self._outbox.join(), STOP_DRAIN_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        for name in ("_send_task", "_listen_task"):
+            task = getattr(self, name)
+            setattr(self, name, None)
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+    
+    async def publish(self, messages: List[Dict[str, Any]]) -> None:
+        """Queue the messages for NOTIFY; the writer does not wait for the round trip."""
+        if self._send_task is None:
+            return
+        for message in messages:
+            payload = json.dumps(message)
+            if len(payload.encode()) > MAX_NOTIFY_BYTES:
+                # Listeners load the text by ID
+                payload = json.dumps({key: message[key] for key in ("user_id", "id")})
+            try:
+                self._outbox.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.notify_failures += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["listening"] = self._listen_task is not None
+        stats["outbox"] = self._outbox.qsize()
+        stats["notify_failures"] = self.notify_failures
+        return stats
+    
+    async def _send(self) -> None:
+        conn = None
+        try:
+            while True:
+                payloads = [await self._outbox.get()]
+                while not self._outbox.empty():
+                    payloads.append(self._outbox.get_nowait())
+                try:
+                    if conn is None or conn.is_closed():
+                        conn = await asyncpg.connect(self.dsn)
+                    # One round trip for everything queued
+                    await conn.execute(
+                        "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload",
+                        self.channel, payloads
+                    )
+                    self.published += len(payloads)
+                except Exception as e:
+                    self.notify_failures += len(payloads)
+                    print(f"Push NOTIFY failed ({len(payloads)} messages): {e}")
+                    if conn is not None:
+                        conn.terminate()
+                    conn = None
+                    await asyncio.sleep(1)
+                finally:
+                    for _ in payloads:
+                        self._outbox.task_done()
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+    
+    async def _listen(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                await conn.add_listener(self.channel, self._on_notify)
+                print(f"Push: listening on {self.channel}")
+                while not conn.is_closed():
+                    await asyncio.sleep(LISTEN_RETRY_SECONDS)
+                print("Push: listen connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Push: listen failed ({e}), retrying in {LISTEN_RETRY_SECONDS}s")
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+    
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("user_id") not in self._subscriptions:
+            return
+        if "message" in message:
+            self._deliver([message])
+        else:
+            task = asyncio.create_task(self._load_and_deliver(message["id"]))
+            self._loads.add(task)
+            task.add_done_callback(self._loads.discard)
+    
+    async def _load_and_deliver(self, run_id: int) -> None:
+        if database.AsyncSessionLocal is None:
+            return
+        try:
+            async with database.AsyncSessionLocal() as db:
+                run = (await db.execute(select(AgentRunLog).where(AgentRunLog.id == run_id))).scalar_one_or_none()
+        except Exception as e:
+            print(f"Push: could not load run log {run_id}: {e}")
+            return
+        if run is not None:
+            self._deliver([run_log_message(run.user_id, run.id, run.agent_type, run.message, run.created_at, run.payload)])
+
+
+def create_pubsub() -> MemoryPubSub:
+    """Pub/sub for the configured PUSH_BACKEND."""
+    if settings.PUSH_BACKEND == "postgres":
+        return PostgresPubSub()
+    return MemoryPubSub()
+
+
+pubsub = create_pubsub()
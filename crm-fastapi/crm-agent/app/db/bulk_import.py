@@ -0,0 +1,336 @@
+"""Bulk import of leads, tasks, sales and targets through COPY.
+
+POST /import/{table} streams a CSV (header row) or NDJSON upload into the
+table without building ORM objects:
+
+1. The body is decoded and split into records as it arrives.
+2. Records are validated against the model's columns (types, NOT NULL,
+   string lengths) and sent to a temporary staging table with binary COPY,
+   IMPORT_CHUNK_ROWS at a time, so memory stays flat whatever the file size.
+3. One INSERT ... SELECT merges the staging table into the real one. Rows
+   with an `id` are upserted on it (the last row wins when an ID repeats), and
+   rows without one are inserted with a new ID. An upsert never changes a
+   row's user_id: a row whose ID belongs to another user is skipped and
+   reported like an invalid one.
+
+The whole import is one transaction: invalid rows are skipped and reported
+(the first MAX_REPORTED_ERRORS of them), and once more than max_errors rows
+are invalid the import is rejected and nothing is written. Table triggers
+(progress rollups) see the merge like any other write.
+"""
+import codecs
+import csv
+import json
+import time
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import Column, Date, Integer, String
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config.settings import settings
+from app.core.exceptions import ValidationError
+from app.db.models import Leads, Task, Sales, Targets
+
+
+IMPORT_TABLES = {"leads": Leads, "tasks": Task, "sales": Sales, "targets": Targets}
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 100
+STAGING_TABLE = "import_staging"
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+# A parsed record, or the reason it could not be parsed
+Record = Tuple[int, Union[Dict[str, Any], str]]
+
+
+class ImportRejected(Exception):
+    """More invalid rows than allowed; the import was rolled back."""
+    
+    def __init__(self, result: Dict[str, Any]):
+        super().__init__(f"{result['skipped']} invalid rows")
+        self.result = result
+
+
+def import_columns(table: str) -> List[Column]:
+    """Columns an import can set: all but updated_at, which the database maintains."""
+    return [column for column in IMPORT_TABLES[table].__table__.columns if column.name != "updated_at"]
+
+
+def convert_value(column: Column, value: Any) -> Any:
+    """Value of an imported field as the column's Python type (None for empty); ValueError if invalid."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(column.type, Integer):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"{column.name} must be an integer")
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f"{column.name} must be an integer")
+        if not INT_MIN <= number <= INT_MAX:
+            raise ValueError(f"{column.name} is out of range")
+        return number
+    if isinstance(column.type, Date):
+        try:
+            return date.fromisoformat(str(value).strip())
+        except ValueError:
+            raise ValueError(f"{column.name} must be a date (YYYY-MM-DD)")
+    if isinstance(column.type, String):
+        if not isinstance(value, str):
+            raise ValueError(f"{column.name} must be a string")
+        if column.type.length is not None and len(value) > column.type.length:
+            raise ValueError(f"{column.name} is longer than {column.type.length} characters")
+        return value
+    return value
+
+
+def validate_record(columns: List[Column], record: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Staging row of a record, in column order.
+    
+    Args:
+        columns: import_columns() of the table
+        record: Field name to value
+    
+    Returns:
+        Tuple of converted values
+    
+    Raises:
+        ValueError: If a field is unknown, missing or invalid
+    """
+    unknown = record.keys() - {column.name for column in columns}
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(sorted(unknown))}")
+    
+    row = []
+    for column in columns:
+        value = convert_value(column, record.get(column.name))
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        if value is None and not column.nullable and not column.primary_key:
+            raise ValueError(f"{column.name} is required")
+        row.append(value)
+    
+    user_id = row[[column.name for column in columns].index("user_id")]
+    if user_id <= 0:
+        raise ValueError("user_id must be a positive integer")
+    return tuple(row)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Lines of a streamed UTF-8 body (a leading BOM is dropped)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    try:
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                yield line.removesuffix("\r")
+        buffer += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ValidationError("body", "must be UTF-8")
+    if buffer:
+        yield buffer.removesuffix("\r")
+
+
+async def iter_csv(lines: AsyncIterator[str], column_names: List[str]) -> AsyncIterator[Record]:
+    """Records of CSV lines; the first row is the header."""
+    header = None
+    record_lines: List[str] = []
+    quotes = 0
+    line_number = start = 0
+    async for line in lines:
+        line_number += 1
+        if not record_lines:
+            start = line_number
+        record_lines.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            # A quoted field runs over the line break
+            continue
+        text = "\n".join(record_lines)
+        record_lines, quotes = [], 0
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in fields]
+            unknown = set(header) - set(column_names)
+            if unknown:
+                raise ValidationError("header", f"unknown columns: {', '.join(sorted(unknown))}")
+            continue
+        if len(fields) != len(header):
+            yield start, f"expected {len(header)} fields, got {len(fields)}"
+        else:
+            yield start, dict(zip(header, fields))
+    if record_lines:
+        yield start, "unterminated quoted field"
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """Records of NDJSON lines (one JSON object per line)."""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, "invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "expected a JSON object"
+        else:
+            yield line_number, record
+
+
+def merge_sql(table: str, column_names: List[str]) -> Tuple[str, str, str]:
+    """
+    Upsert of staged rows with an ID, sequence catch-up, and insert of rows without one.
+    
+    The upsert only updates rows of the same user and returns the inserted and
+    updated counts, then the lines whose ID belongs to another user's row.
+    """
+    names = ", ".join(column_names)
+    fields = [name for name in column_names if name != "id"]
+    assignments = [f"{name} = EXCLUDED.{name}" for name in fields if name != "user_id"]
+    if "updated_at" in IMPORT_TABLES[table].__table__.columns:
+        assignments.append("updated_at = now()")
+    upsert = f"""
+        WITH staged AS (
+            SELECT DISTINCT ON (id) line, {names} FROM {STAGING_TABLE}
+            WHERE id IS NOT NULL
+            ORDER BY id, line DESC
+        ), merged AS (
+            INSERT INTO {table} ({names})
+            SELECT {names} FROM staged
+            ON CONFLICT (id) DO UPDATE SET {", ".join(assignments)}
+            WHERE {table}.user_id = EXCLUDED.user_id
+            RETURNING id, (xmax = 0) AS inserted
+        )
+        SELECT
+            count(*) FILTER (WHERE inserted),
+            count(*) FILTER (WHERE NOT inserted),
+            ARRAY(SELECT line FROM staged WHERE id NOT IN (SELECT id FROM merged) ORDER BY line)
+        FROM merged
+    """
+    # New IDs must not collide with the imported ones
+    sequence = f"pg_get_serial_sequence('{table}', 'id')"
+    catch_up = f"SELECT setval({sequence}, greatest((SELECT max(id) FROM {table}), nextval({sequence})))"
+    insert = f"""
+        INSERT INTO {table} ({", ".join(fields)})
+        SELECT {", ".join(fields)} FROM {STAGING_TABLE}
+        WHERE id IS NULL
+        ORDER BY line
+    """
+    return upsert, catch_up, insert
+
+
+async def import_records(
+    conn,
+    table: str,
+    records: AsyncIterator[Record],
+    max_errors: int = 0,
+    chunk_rows: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Validate, COPY and merge records into a table in one transaction.
+    
+    Args:
+        conn: asyncpg connection
+        table: One of IMPORT_TABLES
+        records: (line, record or parse error) pairs
+        max_errors: Invalid rows to skip before rejecting the import
+        chunk_rows: Rows per COPY (default: IMPORT_CHUNK_ROWS)
+    
+    Returns:
+        Counts of rows read, inserted, updated and skipped, with the first errors
+    
+    Raises:
+        ImportRejected: If more than max_errors rows are invalid
+    """
+    chunk_rows = chunk_rows or settings.IMPORT_CHUNK_ROWS
+    columns = import_columns(table)
+    column_names = [column.name for column in columns]
+    result: Dict[str, Any] = {
+        "table": table, "rows": 0, "inserted": 0, "updated": 0, "skipped": 0, "errors": []
+    }
+    started = time.monotonic()
+    
+    async def copy(chunk):
+        await conn.copy_records_to_table(STAGING_TABLE, records=chunk, columns=["line", *column_names])
+    
+    def skip(line, error):
+        result["skipped"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": line, "error": error})
+        if result["skipped"] > max_errors:
+            raise ImportRejected(result)
+    
+    async with conn.transaction():
+        # The merge of a large file may outlast DB_STATEMENT_TIMEOUT_MS
+        await conn.execute("SET LOCAL statement_timeout = 0")
+        await conn.execute(
+            f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+            f"SELECT 0::bigint AS line, {', '.join(column_names)} FROM {table} WITH NO DATA"
+        )
+        chunk = []
+        async for line, record in records:
+            result["rows"] += 1
+            try:
+                if isinstance(record, str):
+                    raise ValueError(record)
+                chunk.append((line, *validate_record(columns, record)))
+            except ValueError as e:
+                skip(line, str(e))
+                continue
+            if len(chunk) >= chunk_rows:
+                await copy(chunk)
+                chunk = []
+        if chunk:
+            await copy(chunk)
+        
+        upsert, catch_up, insert = merge_sql(table, column_names)
+        inserted, updated, conflicts = await conn.fetchrow(upsert)
+        for line in conflicts:
+            skip(line, "id belongs to another user")
+        if inserted or updated:
+            await conn.execute(catch_up)
+        status = await conn.execute(insert)
+        result["inserted"] = inserted + int(status.split()[-1])
+        result["updated"] = updated
+    
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+async def import_stream(
+    engine: AsyncEngine,
+    table: str,
+    chunks: AsyncIterator[bytes],
+    format: str,
+    max_errors: int = 0
+) -> Dict[str, Any]:
+    """
+    Import a streamed CSV or NDJSON body into a table over a pooled primary connection.
+    
+    Args:
+        engine: Primary database engine
+        table: One of IMPORT_TABLES
+        chunks: Body bytes as they arrive
+        format: "csv" or "ndjson"
+        max_errors: Invalid rows to skip before rejecting the import
+    
+    Returns:
+        import_records() result
+    """
+    lines = iter_lines(chunks)
+    if format == "csv":
+        records = iter_csv(lines, [column.name for column in import_columns(table)])
+    else:
+        records = iter_ndjson(lines)
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        return await import_records(raw.driver_connection, table, records, max_errors)
@@ -1,9 +1,16 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import Optional, List
-from datetime import date
+from sqlalchemy import select, insert, update, or_, and_, case, func, literal, literal_column, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import date, datetime, timedelta
 
-from app.db.models import Task, Targets, BusinessProfile, Leads, Sales, AgentRunLog
+from app.db.models import Task, Targets, BusinessProfile, Leads, Sales, AgentRunLog, SchedulerLease, SchedulerTick, AgentJob
+from app.db.models import SchedulerReport, SchedulerLoad
+from app.db.models import UserActivity, ActivityCursor, ChatHead, ProgressRollup
+from app.db.log_buffer import run_log_buffer
+from app.db.replicas import replica_read, replica_set
+from app.core.pubsub import pubsub, run_log_message
+from app.config.settings import settings
 
 
 async def get_today_tasks(db: AsyncSession, user_id: int) -> List[Task]:
@@ -49,6 +56,7 @@ async def get_today_tasks(db: AsyncSession, user_id: int) -> List[Task]:
         select(Task)
         .where(Task.user_id == user_id)
         .where(Task.due_date == today)
+        .execution_options(**replica_read(user_id))
     )
     return list(result.scalars().all())
 
@@ -68,22 +76,51 @@ async def get_progress(db: AsyncSession, user_id: int) -> float:
     if not isinstance(user_id, int) or user_id <= 0:
         raise ValueError("user_id must be a positive integer")
     
-    result = await db.execute(
-        select(Targets)
-        .where(Targets.user_id == user_id)
+    progress = await get_progress_many(db, [user_id])
+    return progress[user_id]
+
+
+def target_progress_sum():
+    """SQL sum of achieved/target * 100 over targets rows, skipping target = 0."""
+    return func.coalesce(
+        func.sum(case((Targets.target > 0, Targets.achieved * 100.0 / Targets.target), else_=0)),
+        0
     )
-    targets = result.scalars().all()
-    
-    if not targets:
-        return 0.0
+
+
+async def get_progress_many(db: AsyncSession, user_ids: List[int]) -> Dict[int, float]:
+    """
+    Progress percentage of several users in one query.
+    Reads the progress_rollups rows kept by the targets triggers (one primary key
+    lookup per user), or aggregates targets in SQL when PROGRESS_ROLLUP_ENABLED is off.
     
-    total_progress = 0.0
-    for target in targets:
-        if target.target > 0:  # Avoid division by zero
-            progress = (target.achieved / target.target) * 100
-            total_progress += progress
+    Args:
+        db: Database session
+        user_ids: User IDs to get progress for
+        
+    Returns:
+        Dict of user_id to progress (0.0 for users without targets)
+    """
+    for user_id in user_ids:
+        if not isinstance(user_id, int) or user_id <= 0:
+            raise ValueError("user_id must be a positive integer")
     
-    return total_progress
+    if settings.PROGRESS_ROLLUP_ENABLED:
+        query = (
+            select(ProgressRollup.user_id, ProgressRollup.progress)
+            .where(ProgressRollup.user_id.in_(user_ids))
+            .where(ProgressRollup.targets > 0)
+        )
+    else:
+        query = (
+            select(Targets.user_id, target_progress_sum())
+            .where(Targets.user_id.in_(user_ids))
+            .group_by(Targets.user_id)
+        )
+    result = await db.execute(query.execution_options(**replica_read()))
+    progress = {user_id: 0.0 for user_id in user_ids}
+    progress.update({user_id: float(value) for user_id, value in result.all()})
+    return progress
 
 
 async def get_user_phone(db: AsyncSession, user_id: int) -> str:
@@ -126,6 +163,7 @@ async def get_business_profile(db: AsyncSession, user_id: int) -> Optional[Busin
         result = await db.execute(
             select(BusinessProfile)
             .where(BusinessProfile.user_id == user_id)
+            .execution_options(**replica_read(user_id))
         )
         return result.scalar_one_or_none()
     except Exception as e:
@@ -133,6 +171,59 @@ async def get_business_profile(db: AsyncSession, user_id: int) -> Optional[Busin
         return None
 
 
+async def get_active_user_ids(
+    db: AsyncSession,
+    after_user_id: int = 0,
+    limit: int = 1000,
+    timezones: Optional[List[str]] = None,
+    tiers: Optional[List[str]] = None
+) -> List[int]:
+    """
+    Get one page of active user IDs (users with a business profile).
+    Keyset-paginated on user_id so callers can stream over any number of users.
+    
+    Args:
+        db: Database session
+        after_user_id: Return only user IDs greater than this one
+        limit: Maximum number of user IDs to return
+        timezones: Only users whose profile is in one of these timezones (default: all)
+        tiers: Only users in these activity tiers; users not indexed yet count as daily (default: all)
+        
+    Returns:
+        Ascending list of user IDs
+    """
+    query = select(BusinessProfile.user_id).where(BusinessProfile.user_id > after_user_id)
+    if timezones is not None:
+        query = query.where(BusinessProfile.timezone.in_(timezones))
+    if tiers is not None:
+        query = (
+            query
+            .outerjoin(UserActivity, UserActivity.user_id == BusinessProfile.user_id)
+            .where(func.coalesce(UserActivity.tier, UserActivity.DAILY).in_(tiers))
+        )
+    result = await db.execute(
+        query
+        .distinct()
+        .order_by(BusinessProfile.user_id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def get_profile_timezones(db: AsyncSession) -> List[str]:
+    """
+    Get the distinct timezones of all business profiles (the scheduler's timezone buckets).
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        List of timezone names
+    """
+    result = await db.execute(select(BusinessProfile.timezone).distinct())
+    return list(result.scalars().all())
+
+
 async def create_or_update_business_profile(
     db: AsyncSession,
     user_id: int,
@@ -140,10 +231,13 @@ async def create_or_update_business_profile(
     products: Optional[list] = None,
     tone: Optional[str] = None,
     daily_goal: Optional[str] = None,
-    keywords: Optional[list] = None
+    keywords: Optional[list] = None,
+    timezone: Optional[str] = None
 ) -> BusinessProfile:
     """
     Create or update a business profile for a user.
+    Callers drop the user's cached prompt fragments afterwards
+    (app.agent.prompts.invalidate_profile_fragments).
     
     Args:
         db: Database session
@@ -153,6 +247,7 @@ async def create_or_update_business_profile(
         tone: Communication tone (ex: friendly, strict, professional)
         daily_goal: Daily goal description (ex: "sell 20 cheese blocks")
         keywords: List of keywords (ex: ["target", "follow-up", "closing"])
+        timezone: IANA timezone for scheduled messages (ex: "Asia/Beirut", default: UTC)
         
     Returns:
         Created or updated BusinessProfile
@@ -160,6 +255,8 @@ async def create_or_update_business_profile(
     if not isinstance(user_id, int) or user_id <= 0:
         raise ValueError("user_id must be a positive integer")
     
+    # Pin the user to the primary first: the profile is read back to be updated
+    replica_set.note_write(user_id)
     profile = await get_business_profile(db, user_id)
     
     if profile:
@@ -173,6 +270,9 @@ async def create_or_update_business_profile(
             profile.daily_goal = daily_goal
         if keywords is not None:
             profile.keywords = keywords
+        if timezone is not None:
+            profile.timezone = timezone
+        profile.version = (profile.version or 1) + 1
     else:
         # Create new profile
         profile = BusinessProfile(
@@ -181,7 +281,8 @@ async def create_or_update_business_profile(
             products=products,
             tone=tone,
             daily_goal=daily_goal,
-            keywords=keywords
+            keywords=keywords,
+            timezone=timezone or "UTC"
         )
         db.add(profile)
     
@@ -208,6 +309,7 @@ async def get_leads(db: AsyncSession, user_id: int) -> List[Leads]:
         select(Leads)
         .where(Leads.user_id == user_id)
         .order_by(Leads.updated_at.desc())
+        .execution_options(**replica_read(user_id))
     )
     return list(result.scalars().all())
 
@@ -256,6 +358,7 @@ async def get_sales_updates(db: AsyncSession, user_id: int) -> List[Sales]:
         select(Sales)
         .where(Sales.user_id == user_id)
         .order_by(Sales.id.desc())
+        .execution_options(**replica_read(user_id))
     )
     return list(result.scalars().all())
 
@@ -264,8 +367,10 @@ async def log_agent_run(
     db: AsyncSession,
     user_id: int,
     agent_type: str,
-    message: str
-) -> AgentRunLog:
+    message: str,
+    payload: Optional[Dict[str, Any]] = None,
+    buffered: bool = False
+) -> Optional[AgentRunLog]:
     """
     Log an agent run.
     
@@ -274,36 +379,107 @@ async def log_agent_run(
         user_id: User ID
         agent_type: Type of agent that ran
         message: Message that was sent
+        payload: Optional structured output the message was rendered from
+        buffered: Hand the row to the write-behind buffer instead of committing it now
         
     Returns:
-        Created AgentRunLog instance
+        Created AgentRunLog instance, or None when buffered
     """
     if not isinstance(user_id, int) or user_id <= 0:
         raise ValueError("user_id must be a positive integer")
     
+    replica_set.note_write(user_id)
+    if buffered and run_log_buffer.running:
+        await run_log_buffer.add({
+            "user_id": user_id,
+            "agent_type": agent_type,
+            "message": message,
+            "payload": payload
+        })
+        return None
+    
     log_entry = AgentRunLog(
         user_id=user_id,
         agent_type=agent_type,
-        message=message
+        message=message,
+        payload=payload
     )
     db.add(log_entry)
     await db.commit()
     await db.refresh(log_entry)
+    await pubsub.publish([
+        run_log_message(user_id, log_entry.id, agent_type, message, log_entry.created_at, payload)
+    ])
     return log_entry
 
 
+async def log_agent_runs(
+    db: AsyncSession,
+    entries: List[Dict[str, Any]],
+    buffered: bool = False
+) -> int:
+    """
+    Log several agent runs with a single multi-row INSERT and one commit.
+    
+    Args:
+        db: Database session
+        entries: List of dicts with user_id, agent_type, message and optional payload keys
+        buffered: Hand the rows to the write-behind buffer instead of committing them now
+        
+    Returns:
+        Number of rows inserted (or buffered)
+    """
+    if not entries:
+        return 0
+    
+    for entry in entries:
+        user_id = entry.get("user_id")
+        if not isinstance(user_id, int) or user_id <= 0:
+            raise ValueError("user_id must be a positive integer")
+    
+    for entry in entries:
+        replica_set.note_write(entry["user_id"])
+    if buffered and run_log_buffer.running:
+        for entry in entries:
+            await run_log_buffer.add(entry)
+        return len(entries)
+    
+    result = await db.execute(
+        insert(AgentRunLog).returning(AgentRunLog.id, AgentRunLog.created_at, sort_by_parameter_order=True),
+        entries
+    )
+    rows = result.all()
+    await db.commit()
+    await pubsub.publish([
+        run_log_message(entry["user_id"], row.id, entry["agent_type"], entry["message"], row.created_at, entry.get("payload"))
+        for entry, row in zip(entries, rows)
+    ])
+    return len(entries)
+
+
 async def get_recent_agent_runs(
     db: AsyncSession,
     user_id: int,
-    limit: int = 5
+    limit: int = 5,
+    before: Optional[Tuple[datetime, int]] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    since_id: Optional[int] = None
 ) -> List[AgentRunLog]:
     """
-    Get recent agent runs for a user.
+    Get recent agent runs for a user, one keyset page at a time.
+    
+    Pages are cut on (created_at, id) and read straight off the
+    (user_id, created_at, id) index, so a page costs the same at any depth.
+    since_id pages walk the primary key up from the ID, which only spans the
+    rows written since then.
     
     Args:
         db: Database session
         user_id: User ID to get runs for
         limit: Maximum number of runs to return (default: 5)
+        before: (created_at, id) position; only runs older than it are returned
+        after: (created_at, id) position; only the runs right after it are returned
+        since_id: Only the runs with a greater ID, from the lowest up
         
     Returns:
         List of recent AgentRunLog entries, ordered by most recent first
@@ -314,16 +490,685 @@ async def get_recent_agent_runs(
     if db is None:
         return []
     
+    position = tuple_(AgentRunLog.created_at, AgentRunLog.id)
+    
+    def cursor(value: Tuple[datetime, int]):
+        # Bind with the column types so a tz-aware created_at compares as timestamptz
+        return tuple_(literal(value[0], AgentRunLog.created_at.type), literal(value[1], AgentRunLog.id.type))
+    
+    query = select(AgentRunLog).where(AgentRunLog.user_id == user_id).execution_options(**replica_read(user_id))
+    if before is not None:
+        query = query.where(position < cursor(before))
+    if after is not None:
+        # Walk forward from the cursor so the page starts right after it
+        query = query.where(position > cursor(after))
+        query = query.order_by(AgentRunLog.created_at.asc(), AgentRunLog.id.asc())
+    elif since_id is not None:
+        # Range scan of ix_agent_run_logs_user_id_id in each partition
+        query = query.where(AgentRunLog.id > since_id).order_by(AgentRunLog.id.asc())
+    else:
+        query = query.order_by(AgentRunLog.created_at.desc(), AgentRunLog.id.desc())
+    
     try:
-        result = await db.execute(
-            select(AgentRunLog)
-            .where(AgentRunLog.user_id == user_id)
-            .order_by(AgentRunLog.created_at.desc())
-            .limit(limit)
-        )
-        return list(result.scalars().all())
+        result = await db.execute(query.limit(limit))
+        runs = list(result.scalars().all())
+        if after is not None or since_id is not None:
+            runs.reverse()
+        return runs
     except Exception as e:
         print(f"Error fetching recent agent runs: {e}")
         # Return empty list instead of raising error
         return []
 
+
+async def get_chat_head(db: AsyncSession, user_id: int) -> Optional[int]:
+    """
+    Get the ID of a user's latest agent run log, without reading agent_run_logs.
+    
+    Args:
+        db: Database session
+        user_id: User ID to look up
+        
+    Returns:
+        The latest log ID (0 if the user has none), or None if it can't be read
+    """
+    if db is None:
+        return None
+    
+    try:
+        result = await db.execute(
+            select(ChatHead.last_log_id)
+            .where(ChatHead.user_id == user_id)
+            .execution_options(**replica_read(user_id))
+        )
+        return result.scalar_one_or_none() or 0
+    except Exception as e:
+        print(f"Error fetching chat head: {e}")
+        # The history read that follows shares the session
+        await db.rollback()
+        return None
+
+
+async def acquire_lease(
+    db: AsyncSession,
+    name: str,
+    holder_id: str,
+    ttl_seconds: float
+) -> bool:
+    """
+    Acquire or renew a named lease in one atomic upsert.
+    Succeeds if the lease is free, expired, or already held by `holder_id`.
+    Expiry is computed with database time so holders need no clock agreement.
+    
+    Args:
+        db: Database session
+        name: Lease name (ex: "scheduler")
+        holder_id: Unique ID of the process asking for the lease
+        ttl_seconds: Lease lifetime from now
+        
+    Returns:
+        True if `holder_id` holds the lease after the call
+    """
+    expires_at = func.now() + timedelta(seconds=ttl_seconds)
+    stmt = pg_insert(SchedulerLease).values(
+        name=name,
+        holder_id=holder_id,
+        expires_at=expires_at
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SchedulerLease.name],
+        set_={
+            "holder_id": stmt.excluded.holder_id,
+            "acquired_at": case(
+                (SchedulerLease.holder_id == stmt.excluded.holder_id, SchedulerLease.acquired_at),
+                else_=func.now()
+            ),
+            "renewed_at": func.now(),
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=or_(
+            SchedulerLease.holder_id == stmt.excluded.holder_id,
+            SchedulerLease.expires_at < func.now()
+        )
+    ).returning(SchedulerLease.holder_id)
+    
+    result = await db.execute(stmt)
+    acquired = result.first() is not None
+    await db.commit()
+    return acquired
+
+
+async def release_lease(db: AsyncSession, name: str, holder_id: str) -> None:
+    """
+    Release a lease held by `holder_id` so another process can take over immediately.
+    
+    Args:
+        db: Database session
+        name: Lease name
+        holder_id: ID of the current holder
+    """
+    await db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name)
+        .where(SchedulerLease.holder_id == holder_id)
+        .values(expires_at=func.now())
+    )
+    await db.commit()
+
+
+async def get_lease(db: AsyncSession, name: str) -> Optional[SchedulerLease]:
+    """
+    Get a lease row by name.
+    
+    Args:
+        db: Database session
+        name: Lease name
+        
+    Returns:
+        SchedulerLease or None if the lease was never taken
+    """
+    result = await db.execute(
+        select(SchedulerLease).where(SchedulerLease.name == name)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_scheduler_tick(db: AsyncSession, job_id: str) -> Optional[datetime]:
+    """
+    Get the last tick a scheduled job evaluated.
+    
+    Args:
+        db: Database session
+        job_id: Scheduled job ID
+        
+    Returns:
+        Tick start, or None if the job never ran
+    """
+    result = await db.execute(
+        select(SchedulerTick.last_tick).where(SchedulerTick.job_id == job_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def advance_scheduler_tick(db: AsyncSession, job_id: str, tick: datetime) -> None:
+    """
+    Record that a scheduled job evaluated a tick (never moves the cursor back).
+    
+    Args:
+        db: Database session
+        job_id: Scheduled job ID
+        tick: Tick start
+    """
+    stmt = pg_insert(SchedulerTick).values(job_id=job_id, last_tick=tick)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[SchedulerTick.job_id],
+        set_={"last_tick": func.greatest(SchedulerTick.last_tick, stmt.excluded.last_tick)}
+    ))
+    await db.commit()
+
+
+async def get_scheduler_ticks(db: AsyncSession) -> Dict[str, datetime]:
+    """
+    Get the last tick every scheduled job evaluated.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Dictionary mapping job ID to tick start
+    """
+    result = await db.execute(select(SchedulerTick.job_id, SchedulerTick.last_tick))
+    return {job_id: last_tick for job_id, last_tick in result.all()}
+
+
+async def get_stored_jobs(db: AsyncSession, table: str) -> List[Tuple[str, bytes]]:
+    """
+    Get the jobs persisted by APScheduler's SQLAlchemy job store.
+    
+    Args:
+        db: Database session
+        table: Job store table name
+        
+    Returns:
+        List of (job ID, pickled job state) ordered by next run time, empty if
+        the table does not exist (in-memory job store)
+    """
+    if await db.scalar(text("SELECT to_regclass(:table)"), {"table": table}) is None:
+        return []
+    result = await db.execute(text(f"SELECT id, job_state FROM {table} ORDER BY next_run_time NULLS LAST, id"))
+    return [(job_id, job_state) for job_id, job_state in result.all()]
+
+
+async def save_scheduler_report(db: AsyncSession, kind: str, job_id: str, report: Dict[str, Any]) -> None:
+    """
+    Store the latest report of a kind for a scheduled job, replacing the previous one.
+    
+    Args:
+        db: Database session
+        kind: Report kind (ex: last_run)
+        job_id: Scheduled job ID
+        report: JSON-serializable report
+    """
+    stmt = pg_insert(SchedulerReport).values(kind=kind, job_id=job_id, report=report)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[SchedulerReport.kind, SchedulerReport.job_id],
+        set_={"report": stmt.excluded.report, "updated_at": func.now()}
+    ))
+    await db.commit()
+
+
+async def get_scheduler_report(db: AsyncSession, kind: str, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the latest report of a kind for one scheduled job.
+    
+    Args:
+        db: Database session
+        kind: Report kind (ex: activity)
+        job_id: Scheduled job ID
+        
+    Returns:
+        Report, or None if none was stored
+    """
+    result = await db.execute(
+        select(SchedulerReport.report)
+        .where(SchedulerReport.kind == kind)
+        .where(SchedulerReport.job_id == job_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_scheduler_reports(
+    db: AsyncSession,
+    kind: str,
+    since: Optional[datetime] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the latest report of a kind for every scheduled job.
+    
+    Args:
+        db: Database session
+        kind: Report kind (ex: last_run)
+        since: Only reports updated at or after this (ex: drop per-process reports of stopped processes)
+        
+    Returns:
+        Dictionary mapping job ID to report
+    """
+    query = select(SchedulerReport.job_id, SchedulerReport.report).where(SchedulerReport.kind == kind)
+    if since is not None:
+        query = query.where(SchedulerReport.updated_at >= since)
+    result = await db.execute(query.order_by(SchedulerReport.job_id))
+    return {job_id: report for job_id, report in result.all()}
+
+
+async def save_load_buckets(
+    db: AsyncSession,
+    worker_id: str,
+    buckets: List[Dict[str, Any]],
+    oldest: datetime
+) -> None:
+    """
+    Store a process's load curve buckets (absolute counts, so a rewrite replaces them)
+    and drop buckets past retention.
+    
+    Args:
+        db: Database session
+        worker_id: Process that recorded the buckets
+        buckets: Rows with bucket_start, started and peak_in_flight
+        oldest: Buckets starting before this are deleted
+    """
+    stmt = pg_insert(SchedulerLoad).values([{**bucket, "worker_id": worker_id} for bucket in buckets])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[SchedulerLoad.bucket_start, SchedulerLoad.worker_id],
+        set_={"started": stmt.excluded.started, "peak_in_flight": stmt.excluded.peak_in_flight}
+    ))
+    await db.execute(SchedulerLoad.__table__.delete().where(SchedulerLoad.bucket_start < oldest))
+    await db.commit()
+
+
+async def get_load_buckets(db: AsyncSession, since: datetime) -> List[Tuple[datetime, int, int, int]]:
+    """
+    Get the load curve of every scheduler process, summed per bucket.
+    
+    Args:
+        db: Database session
+        since: Only buckets starting at or after this
+        
+    Returns:
+        List of (bucket start, runs started, peak concurrency, processes) in time order
+    """
+    result = await db.execute(
+        select(
+            SchedulerLoad.bucket_start,
+            func.sum(SchedulerLoad.started),
+            func.sum(SchedulerLoad.peak_in_flight),
+            func.count(SchedulerLoad.worker_id)
+        )
+        .where(SchedulerLoad.bucket_start >= since)
+        .group_by(SchedulerLoad.bucket_start)
+        .order_by(SchedulerLoad.bucket_start)
+    )
+    return [(bucket_start, int(started), int(peak), workers) for bucket_start, started, peak, workers in result.all()]
+
+
+async def enqueue_agent_jobs(db: AsyncSession, jobs: List[Dict[str, Any]]) -> int:
+    """
+    Insert agent jobs in one statement, skipping jobs whose idempotency key already exists.
+    
+    Args:
+        db: Database session
+        jobs: Column values for each job (user_id, agent_type, slot, idempotency_key, max_attempts)
+        
+    Returns:
+        Number of jobs actually inserted
+    """
+    if not jobs:
+        return 0
+    
+    stmt = (
+        pg_insert(AgentJob)
+        .values(jobs)
+        .on_conflict_do_nothing(index_elements=[AgentJob.idempotency_key])
+        .returning(AgentJob.id)
+    )
+    result = await db.execute(stmt)
+    inserted = len(result.all())
+    await db.commit()
+    return inserted
+
+
+async def debounce_agent_job(db: AsyncSession, job: Dict[str, Any]) -> Optional[bool]:
+    """
+    Enqueue a job, or push back the due time of the same job if it is still pending.
+    Repeated calls with the same idempotency key collapse into one run.
+    
+    Args:
+        db: Database session
+        job: Column values of the job (user_id, agent_type, slot, idempotency_key, max_attempts, run_after)
+        
+    Returns:
+        True if the job was inserted, False if a pending job was pushed back,
+        None if the job already started (nothing was changed)
+    """
+    stmt = pg_insert(AgentJob).values(job)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AgentJob.idempotency_key],
+        set_={
+            "run_after": func.greatest(AgentJob.run_after, stmt.excluded.run_after),
+            "updated_at": func.now()
+        },
+        where=AgentJob.status == AgentJob.PENDING
+    ).returning(literal_column("xmax = 0").label("inserted"))
+    result = await db.execute(stmt)
+    row = result.first()
+    await db.commit()
+    return None if row is None else bool(row.inserted)
+
+
+async def claim_agent_jobs(
+    db: AsyncSession,
+    worker_id: str,
+    limit: int,
+    visibility_timeout_seconds: float,
+    ahead_seconds: float = 0
+) -> List[AgentJob]:
+    """
+    Claim up to `limit` runnable jobs for a worker.
+    Runnable jobs are pending jobs whose backoff has elapsed (or that are due within
+    `ahead_seconds`), and running jobs whose visibility timeout expired (their worker
+    died). Rows locked by other workers are skipped, so concurrent workers never
+    claim the same job.
+    
+    Args:
+        db: Database session
+        worker_id: ID of the claiming worker
+        limit: Maximum number of jobs to claim
+        visibility_timeout_seconds: How long the claim hides the jobs from other workers,
+            counted from the due time of jobs claimed ahead
+        ahead_seconds: Also claim pending jobs due within this many seconds
+        
+    Returns:
+        Claimed jobs, with `attempts` already incremented
+    """
+    runnable = (
+        select(AgentJob.id)
+        .where(or_(
+            and_(AgentJob.status == AgentJob.PENDING, AgentJob.run_after <= func.now() + timedelta(seconds=ahead_seconds)),
+            and_(AgentJob.status == AgentJob.RUNNING, AgentJob.locked_until < func.now())
+        ))
+        .order_by(AgentJob.run_after)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(AgentJob)
+        .where(AgentJob.id.in_(runnable.scalar_subquery()))
+        .values(
+            status=AgentJob.RUNNING,
+            locked_by=worker_id,
+            locked_until=func.greatest(AgentJob.run_after, func.now()) + timedelta(seconds=visibility_timeout_seconds),
+            attempts=AgentJob.attempts + 1
+        )
+        .returning(AgentJob)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    jobs = list(result.scalars().all())
+    await db.commit()
+    return jobs
+
+
+async def complete_agent_job(db: AsyncSession, job_id: int, worker_id: str) -> bool:
+    """
+    Mark a claimed job as succeeded.
+    
+    Args:
+        db: Database session
+        job_id: Job ID
+        worker_id: ID of the worker holding the claim
+        
+    Returns:
+        False if the claim was lost (visibility timeout expired and another worker took the job)
+    """
+    result = await db.execute(
+        update(AgentJob)
+        .where(AgentJob.id == job_id)
+        .where(AgentJob.status == AgentJob.RUNNING)
+        .where(AgentJob.locked_by == worker_id)
+        .values(status=AgentJob.SUCCEEDED, locked_by=None, locked_until=None, last_error=None)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def fail_agent_job(
+    db: AsyncSession,
+    job_id: int,
+    worker_id: str,
+    error: str,
+    retry_in_seconds: Optional[float]
+) -> bool:
+    """
+    Record a failed attempt: reschedule the job after a backoff, or dead-letter it.
+    
+    Args:
+        db: Database session
+        job_id: Job ID
+        worker_id: ID of the worker holding the claim
+        error: Error message of the attempt
+        retry_in_seconds: Backoff before the next attempt, or None to dead-letter the job
+        
+    Returns:
+        False if the claim was lost
+    """
+    values: Dict[str, Any] = {"locked_by": None, "locked_until": None, "last_error": error}
+    if retry_in_seconds is None:
+        values["status"] = AgentJob.DEAD
+    else:
+        values["status"] = AgentJob.PENDING
+        values["run_after"] = func.now() + timedelta(seconds=retry_in_seconds)
+    
+    result = await db.execute(
+        update(AgentJob)
+        .where(AgentJob.id == job_id)
+        .where(AgentJob.status == AgentJob.RUNNING)
+        .where(AgentJob.locked_by == worker_id)
+        .values(**values)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def release_agent_jobs(db: AsyncSession, job_ids: List[int], worker_id: str) -> int:
+    """
+    Hand claimed jobs that never started back to the queue, undoing their claim.
+    
+    Args:
+        db: Database session
+        job_ids: Job IDs
+        worker_id: ID of the worker holding the claims
+        
+    Returns:
+        Number of jobs released
+    """
+    if not job_ids:
+        return 0
+    
+    result = await db.execute(
+        update(AgentJob)
+        .where(AgentJob.id.in_(job_ids))
+        .where(AgentJob.status == AgentJob.RUNNING)
+        .where(AgentJob.locked_by == worker_id)
+        .values(status=AgentJob.PENDING, locked_by=None, locked_until=None, attempts=AgentJob.attempts - 1)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def requeue_agent_job(db: AsyncSession, job_id: int) -> bool:
+    """
+    Move a dead-lettered job back to pending with a fresh attempt budget.
+    
+    Args:
+        db: Database session
+        job_id: Job ID
+        
+    Returns:
+        False if no dead job with this ID exists
+    """
+    result = await db.execute(
+        update(AgentJob)
+        .where(AgentJob.id == job_id)
+        .where(AgentJob.status == AgentJob.DEAD)
+        .values(status=AgentJob.PENDING, attempts=0, run_after=func.now())
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def get_agent_job_counts(db: AsyncSession) -> Dict[str, int]:
+    """
+    Count agent jobs per status.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Mapping of status to number of jobs
+    """
+    result = await db.execute(
+        select(AgentJob.status, func.count()).group_by(AgentJob.status)
+    )
+    return {status: count for status, count in result.all()}
+
+
+async def get_dead_agent_jobs(db: AsyncSession, limit: int = 20) -> List[AgentJob]:
+    """
+    Get the most recently dead-lettered jobs.
+    
+    Args:
+        db: Database session
+        limit: Maximum number of jobs to return (default: 20)
+        
+    Returns:
+        Dead jobs, most recent first
+    """
+    result = await db.execute(
+        select(AgentJob)
+        .where(AgentJob.status == AgentJob.DEAD)
+        .order_by(AgentJob.updated_at.desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def count_users_by_tier(
+    db: AsyncSession,
+    timezones: Optional[List[str]] = None
+) -> Dict[str, int]:
+    """
+    Count active users per activity tier; users not indexed yet count as daily.
+    
+    Args:
+        db: Database session
+        timezones: Only users whose profile is in one of these timezones (default: all)
+        
+    Returns:
+        Mapping of tier to number of users
+    """
+    tier = func.coalesce(UserActivity.tier, UserActivity.DAILY)
+    query = (
+        select(tier, func.count(func.distinct(BusinessProfile.user_id)))
+        .select_from(BusinessProfile)
+        .outerjoin(UserActivity, UserActivity.user_id == BusinessProfile.user_id)
+        .group_by(tier)
+    )
+    if timezones is not None:
+        query = query.where(BusinessProfile.timezone.in_(timezones))
+    result = await db.execute(query)
+    return {tier_name: count for tier_name, count in result.all()}
+
+
+async def refresh_user_activity(
+    db: AsyncSession,
+    daily_days: int,
+    weekly_days: int,
+    overlap_seconds: float = 300,
+    batch_size: int = 1000
+) -> Dict[str, int]:
+    """
+    Fold new activity into the activity index and recompute tiers.
+    Each source (chat messages, lead updates, task updates) is only scanned past its
+    high-water mark, minus an overlap for rows committed late; re-applying activity is
+    harmless since timestamps are merged with GREATEST. Users with a profile but no
+    activity yet are indexed as first seen now.
+    
+    Args:
+        db: Database session
+        daily_days: Users active within this many days are in the daily tier
+        weekly_days: Users active within this many days are in the weekly tier, others are paused
+        overlap_seconds: How far before the high-water mark each scan starts
+        batch_size: Users per upsert statement
+        
+    Returns:
+        Number of users with new activity per source
+    """
+    sources = {
+        "messages": (AgentRunLog.user_id, AgentRunLog.created_at, AgentRunLog.agent_type == "USER_MESSAGE", "last_message_at"),
+        "leads": (Leads.user_id, Leads.updated_at, None, "last_lead_at"),
+        "tasks": (Task.user_id, Task.updated_at, None, "last_task_at"),
+    }
+    result = await db.execute(select(ActivityCursor))
+    cursors = {cursor.source: cursor.high_water_at for cursor in result.scalars().all()}
+    
+    counts = {}
+    for source, (user_column, time_column, condition, activity_column) in sources.items():
+        query = select(user_column, func.max(time_column)).where(time_column.is_not(None)).group_by(user_column)
+        if condition is not None:
+            query = query.where(condition)
+        if source in cursors:
+            query = query.where(time_column > cursors[source] - timedelta(seconds=overlap_seconds))
+        rows = (await db.execute(query)).all()
+        counts[source] = len(rows)
+        if not rows:
+            continue
+        
+        for start in range(0, len(rows), batch_size):
+            values = [
+                {"user_id": user_id, activity_column: active_at, "last_active_at": active_at}
+                for user_id, active_at in rows[start:start + batch_size]
+            ]
+            stmt = pg_insert(UserActivity).values(values)
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=[UserActivity.user_id],
+                set_={
+                    activity_column: func.greatest(getattr(UserActivity, activity_column), stmt.excluded[activity_column]),
+                    "last_active_at": func.greatest(UserActivity.last_active_at, stmt.excluded.last_active_at),
+                }
+            ))
+        
+        high_water_at = max(active_at for _, active_at in rows)
+        stmt = pg_insert(ActivityCursor).values(source=source, high_water_at=high_water_at)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[ActivityCursor.source],
+            set_={"high_water_at": func.greatest(ActivityCursor.high_water_at, stmt.excluded.high_water_at)}
+        ))
+    
+    # New users start in the daily tier and decay if they stay inactive
+    await db.execute(
+        pg_insert(UserActivity)
+        .from_select(["user_id", "last_active_at"], select(BusinessProfile.user_id, func.now()).distinct())
+        .on_conflict_do_nothing(index_elements=[UserActivity.user_id])
+    )
+    
+    tier = case(
+        (UserActivity.last_active_at >= func.now() - timedelta(days=daily_days), UserActivity.DAILY),
+        (UserActivity.last_active_at >= func.now() - timedelta(days=weekly_days), UserActivity.WEEKLY),
+        else_=UserActivity.PAUSED
+    )
+    await db.execute(
+        update(UserActivity)
+        .where(UserActivity.tier.is_distinct_from(tier))
+        .values(tier=tier)
+    )
+    await db.commit()
+    return counts
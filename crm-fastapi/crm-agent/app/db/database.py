@@ -1,7 +1,23 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from app.config.settings import settings
+from app.db.pool_metrics import InstrumentedPool, PoolMetrics, instrument, pool_stats
+from app.db.replicas import RoutingSession, replica_set
+
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "alembic.ini")
+
+# Schema created by create_all before migrations existed
+BASELINE_REVISION = "0001_baseline"
+# pg_advisory_lock key serializing run_migrations across processes
+MIGRATION_LOCK_KEY = 7_301_204
 
 
 class Base(DeclarativeBase):
@@ -9,25 +25,51 @@ class Base(DeclarativeBase):
     pass
 
 
+# Connection pool settings shared by the primary and replica engines
+ENGINE_OPTIONS: Dict[str, Any] = {
+    "echo": settings.DEBUG,
+    "future": True,
+    "poolclass": InstrumentedPool,
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_pre_ping": True,  # Verify connections before using
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+}
+if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+    ENGINE_OPTIONS["connect_args"] = {
+        "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+    }
+
+# Metrics of every engine's pool, for GET /db/pool
+pool_metrics: List[PoolMetrics] = []
+
 # Create async engine with connection pool settings for better error handling
 try:
-    engine = create_async_engine(
-        settings.DATABASE_URL,
-        echo=settings.DEBUG,
-        future=True,
-        pool_pre_ping=True,  # Verify connections before using
-        pool_recycle=3600,   # Recycle connections after 1 hour
-    )
+    engine = create_async_engine(settings.DATABASE_URL, **ENGINE_OPTIONS)
+    pool_metrics.append(instrument(engine.sync_engine.pool, "primary"))
 except Exception as e:
     print(f"Warning: Database engine creation failed: {e}")
     print("Server will start but database features may not work.")
     engine = None
 
+# Read replicas: replica_read() queries are routed to them by RoutingSession
+if engine:
+    for replica_url in settings.DATABASE_REPLICA_URLS:
+        try:
+            replica_name = make_url(replica_url).render_as_string(hide_password=True)
+            replica_engine = create_async_engine(replica_url, **ENGINE_OPTIONS)
+            pool_metrics.append(instrument(replica_engine.sync_engine.pool, replica_name))
+            replica_set.add(replica_name, replica_engine)
+        except Exception as e:
+            print(f"Warning: Read replica engine creation failed: {e}")
+
 # Create async session factory (only if engine is available)
 if engine:
     AsyncSessionLocal = async_sessionmaker(
         engine,
         class_=AsyncSession,
+        sync_session_class=RoutingSession,
         expire_on_commit=False,
         autocommit=False,
         autoflush=False
@@ -59,14 +101,54 @@ async def get_db() -> Optional[AsyncSession]:
         yield None
 
 
+def get_pool_stats() -> List[Dict[str, Any]]:
+    """Occupancy, checkout wait, hold time and connection lifetime of every engine's pool."""
+    return [pool_stats(metrics) for metrics in pool_metrics]
+
+
+def run_migrations(connection: Connection) -> None:
+    """
+    Upgrade the schema to the latest Alembic revision over the given connection.
+    A database created by create_all (tables but no alembic_version) is stamped at
+    the baseline first, so only the later migrations run on it.
+    
+    Processes starting together (API and worker) take turns on a session-level
+    advisory lock; the one that waited finds the schema current and has nothing
+    to stamp or upgrade.
+    """
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    # Index builds and backfills may run longer than DB_STATEMENT_TIMEOUT_MS
+    connection.exec_driver_sql("SET statement_timeout = 0")
+    # Session-level: held across the migrations' own commits until unlocked
+    connection.exec_driver_sql(f"SELECT pg_advisory_lock({MIGRATION_LOCK_KEY})")
+    try:
+        # Inspected under the lock, after any concurrent run has finished
+        tables = inspect(connection).get_table_names()
+        # End the inspection's implicit transaction; migrations manage their own
+        connection.commit()
+        if "alembic_version" not in tables and "agent_run_logs" in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
+    finally:
+        # Leave a failed migration's transaction so the unlock can run
+        connection.rollback()
+        connection.exec_driver_sql(f"SELECT pg_advisory_unlock({MIGRATION_LOCK_KEY})")
+        # Back to the connection's configured timeout before it returns to the pool
+        connection.exec_driver_sql("RESET statement_timeout")
+        connection.commit()
+
+
 async def init_db():
-    """Initialize database tables."""
+    """Bring the database schema up to date (Alembic migrations)."""
     if not engine:
-        print("Warning: Database engine not available. Skipping table creation.")
+        print("Warning: Database engine not available. Skipping migrations.")
+        return
+    if not settings.DB_AUTO_MIGRATE:
         return
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        async with engine.connect() as conn:
+            await conn.run_sync(run_migrations)
     except Exception as e:
         print(f"Warning: Database initialization failed: {e}")
         print("Server will continue but database features may not work.")
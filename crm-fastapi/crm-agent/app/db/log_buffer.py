@@ -0,0 +1,201 @@
+"""Write-behind buffer for agent run logs.
+
+Logging a chat exchange used to cost two INSERT + COMMIT round trips before the
+reply was returned, and every scheduled run paid one more. Callers now hand the
+rows to the buffer and move on. A background task writes them with one multi-row
+INSERT per batch, as soon as LOG_BUFFER_MAX_ROWS rows are waiting or every
+LOG_BUFFER_FLUSH_INTERVAL_MS.
+
+Rows stay in the buffer until their batch commits: a failed flush is retried on
+the next one and stop() flushes what is left, so rows are written at least once
+as long as the process shuts down cleanly. A caller that needs the row ID awaits
+add(..., wait=True), which returns once the row is committed. The buffer holds
+at most LOG_BUFFER_MAX_PENDING rows: past that, a row that an inline flush
+cannot make room for is written through, and its caller gets the error.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.config.settings import settings
+from app.db import database
+from app.db.models import AgentRunLog
+from app.core.pubsub import pubsub, run_log_message
+
+
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+
+class RunLogBuffer:
+    """Batches AgentRunLog inserts and writes them from a background task."""
+    
+    def __init__(
+        self,
+        max_rows: Optional[int] = None,
+        flush_interval_seconds: Optional[float] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.max_rows = max_rows or settings.LOG_BUFFER_MAX_ROWS
+        self.flush_interval_seconds = flush_interval_seconds or settings.LOG_BUFFER_FLUSH_INTERVAL_MS / 1000
+        self.max_pending = max_pending or settings.LOG_BUFFER_MAX_PENDING
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self._pending: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        """Whether rows are buffered (otherwise add() writes through)."""
+        return self._task is not None
+    
+    def start(self) -> None:
+        """Start the background flush task."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the flush task and write every buffered row."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await task
+        
+        for attempt in range(SHUTDOWN_FLUSH_ATTEMPTS):
+            await self.flush()
+            if not self._pending:
+                return
+            await asyncio.sleep(attempt + 1)
+        print(f"Run log buffer: {len(self._pending)} rows could not be written on shutdown")
+        self._fail_pending(RuntimeError("Run log buffer stopped before the row was written"))
+    
+    async def add(self, entry: Dict[str, Any], wait: bool = False) -> Optional[int]:
+        """
+        Buffer one agent run log row.
+        
+        Args:
+            entry: user_id, agent_type, message and optional payload
+            wait: Wait until the row is committed and return its ID
+        
+        Returns:
+            Row ID if wait is set (or the buffer is not running or full), else None
+        
+        Raises:
+            Exception: The write error, when the buffer is full and the row is written through
+        """
+        row = {
+            "user_id": entry["user_id"],
+            "agent_type": entry["agent_type"],
+            "message": entry["message"],
+            "payload": entry.get("payload"),
+            # Time of the message, not of the flush
+            "created_at": entry.get("created_at") or datetime.now(timezone.utc),
+        }
+        if not self.running:
+            return (await self._write([row]))[0]
+        
+        if len(self._pending) >= self.max_pending:
+            # Backpressure: the database is not keeping up, write inline
+            await self.flush()
+            if len(self._pending) >= self.max_pending:
+                # The flush failed; don't grow the buffer past its bound
+                return (await self._write([row]))[0]
+        
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        if future is not None:
+            return await future
+        return None
+    
+    async def flush(self) -> int:
+        """
+        Write the buffered rows, one INSERT per batch of max_rows.
+        On failure, rows awaited by a caller fail with the error and the other rows
+        are kept for the next flush.
+        
+        Returns:
+            Number of rows written
+        """
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.max_rows]
+                try:
+                    ids = await self._write([row for row, _ in batch])
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Run log buffer flush failed ({len(self._pending)} rows pending): {e}")
+                    self._fail_pending(e, waiting_only=True)
+                    break
+                # Only flush() removes rows, and new rows are appended after the batch
+                del self._pending[:len(batch)]
+                for (_, future), row_id in zip(batch, ids):
+                    if future is not None and not future.done():
+                        future.set_result(row_id)
+                written += len(batch)
+                self.flushes += 1
+        self.written += written
+        return written
+    
+    def has_pending(self, user_id: int) -> bool:
+        """Whether rows of a user are waiting for a flush."""
+        return any(row["user_id"] == user_id for row, _ in self._pending)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Buffered rows and flush counters."""
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+        }
+    
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._stopping:
+                await self.flush()
+    
+    async def _write(self, rows: List[Dict[str, Any]]) -> List[int]:
+        if database.AsyncSessionLocal is None:
+            raise RuntimeError("Database not configured")
+        async with database.AsyncSessionLocal() as db:
+            result = await db.execute(
+                insert(AgentRunLog).returning(AgentRunLog.id, sort_by_parameter_order=True),
+                rows
+            )
+            ids = list(result.scalars().all())
+            await db.commit()
+        await pubsub.publish([
+            run_log_message(row["user_id"], row_id, row["agent_type"], row["message"], row["created_at"], row["payload"])
+            for row, row_id in zip(rows, ids)
+        ])
+        return ids
+    
+    def _fail_pending(self, error: Exception, waiting_only: bool = False) -> None:
+        kept = []
+        for row, future in self._pending:
+            if future is not None:
+                if not future.done():
+                    future.set_exception(error)
+            elif waiting_only:
+                kept.append((row, future))
+        self._pending = kept
+
+
+run_log_buffer = RunLogBuffer()
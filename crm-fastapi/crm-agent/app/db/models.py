@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Date, Text, DateTime, Float, JSON, Index, DDL, event
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -6,6 +6,10 @@ from app.db.database import Base
 class BusinessProfile(Base):
     """Business profile model for agent adaptation."""
     __tablename__ = "business_profiles"
+    __table_args__ = (
+        # Active users of a timezone bucket, keyset-paginated on user_id
+        Index("ix_business_profiles_timezone_user_id", "timezone", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False, index=True)
@@ -14,14 +18,22 @@ class BusinessProfile(Base):
     tone = Column(String(255), nullable=True)  # ex: friendly, strict, professional
     daily_goal = Column(String(500), nullable=True)  # "sell 20 cheese blocks"
     keywords = Column(JSON, nullable=True)  # ["target", "follow-up", "closing"]
+    timezone = Column(String(64), nullable=False, default="UTC", server_default="UTC")  # IANA name, ex: "Asia/Beirut"
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every write (prompt cache key)
 
 
 class Leads(Base):
     """Leads model - universal CRM data model."""
     __tablename__ = "leads"
+    __table_args__ = (
+        # A user's leads, most recently updated first
+        Index("ix_leads_user_id_updated_at", "user_id", "updated_at"),
+        # Leads updated since the activity cursor (index-only)
+        Index("ix_leads_updated_at", "updated_at", postgresql_include=["user_id"]),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     customer_name = Column(String(255), nullable=False)
     stage = Column(String(255), nullable=True)  # Generic stage field - LLM interprets
     notes = Column(Text, nullable=True)
@@ -31,20 +43,31 @@ class Leads(Base):
 class Task(Base):
     """Task model - universal CRM data model."""
     __tablename__ = "tasks"
+    __table_args__ = (
+        # A user's tasks due on a day, covering every column read (index-only)
+        Index("ix_tasks_user_id_due_date", "user_id", "due_date", postgresql_include=["id", "title", "status", "updated_at"]),
+        # Tasks updated since the activity cursor (index-only)
+        Index("ix_tasks_updated_at", "updated_at", postgresql_include=["user_id"]),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     title = Column(String(255), nullable=False)
     status = Column(String(255), nullable=True)  # Generic status field - LLM interprets
     due_date = Column(Date, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 class Sales(Base):
     """Sales model - universal CRM data model."""
     __tablename__ = "sales"
+    __table_args__ = (
+        # A user's sales, latest first
+        Index("ix_sales_user_id_id", "user_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     customer = Column(String(255), nullable=False)
     product = Column(String(255), nullable=False)
     status = Column(String(255), nullable=True)  # Generic status field - LLM interprets
@@ -65,10 +88,141 @@ class Targets(Base):
 class AgentRunLog(Base):
     """Agent run log model for tracking agent messages."""
     __tablename__ = "agent_run_logs"
+    __table_args__ = (
+        # A user's recent runs and keyset pages of chat history, latest first
+        Index("ix_agent_run_logs_user_id_created_at_id", "user_id", "created_at", "id"),
+        # A user's messages after a chat client's last seen ID
+        Index("ix_agent_run_logs_user_id_id", "user_id", "id"),
+        # User messages since the activity cursor (index-only)
+        Index("ix_agent_run_logs_agent_type_created_at", "agent_type", "created_at", postgresql_include=["user_id"]),
+        # Monthly partitions agent_run_logs_pYYYYMM (migration 0007, app/db/partitions.py)
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    
+    # The partition key is part of the primary key; IDs still come from the sequence
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)
+    agent_type = Column(String(50), nullable=False)
+    message = Column(Text, nullable=False)
+    payload = Column(JSON(none_as_null=True), nullable=True)  # Structured LLM output (recommendation, priority, next_action)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True, index=True)
+
+
+# create_all makes no monthly partitions; rows land in the DEFAULT one (as past
+# the months created by migration 0007) until partition maintenance adds them
+event.listen(
+    AgentRunLog.__table__,
+    "after_create",
+    DDL("CREATE TABLE %(fullname)s_default PARTITION OF %(fullname)s DEFAULT").execute_if(dialect="postgresql")
+)
+
+
+class SchedulerLease(Base):
+    """Lease row for leader election: only the holder of an unexpired lease runs scheduled jobs."""
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String(100), primary_key=True)
+    holder_id = Column(String(255), nullable=False)
+    acquired_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    renewed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class SchedulerTick(Base):
+    """Last tick each scheduled job evaluated; the next firing catches up on the ticks after it."""
+    __tablename__ = "scheduler_ticks"
+    
+    job_id = Column(String(100), primary_key=True)
+    last_tick = Column(DateTime(timezone=True), nullable=False)
+
+
+class SchedulerReport(Base):
+    """Latest report of each scheduled job, written by the scheduler process and read by the API."""
+    __tablename__ = "scheduler_reports"
+    
+    kind = Column(String(50), primary_key=True)  # last_run, summary, activity, context_cache
+    job_id = Column(String(100), primary_key=True)  # Job ID, or process ID for context_cache
+    report = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class SchedulerLoad(Base):
+    """Runs started and peak concurrency per minute bucket, one row per scheduler process."""
+    __tablename__ = "scheduler_load"
+    
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    worker_id = Column(String(100), primary_key=True)  # Process that ran the runs (host:pid:suffix)
+    started = Column(Integer, nullable=False)
+    peak_in_flight = Column(Integer, nullable=False)
+
+
+class AgentJob(Base):
+    """Durable agent run job, consumed by queue workers with SELECT ... FOR UPDATE SKIP LOCKED."""
+    __tablename__ = "agent_jobs"
+    __table_args__ = (
+        Index("ix_agent_jobs_status_run_after", "status", "run_after"),
+        Index("ix_agent_jobs_status_locked_until", "status", "locked_until"),
+        Index("ix_agent_jobs_status_updated_at", "status", "updated_at"),
+    )
+    
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    DEAD = "dead"  # Dead letter: out of attempts, kept for inspection and manual requeue
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False, index=True)
-    agent_type = Column(String(50), nullable=False, index=True)
-    message = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    agent_type = Column(String(50), nullable=False)
+    slot = Column(String(100), nullable=False)  # Scheduled slot, ex: "morning_reminder@2026-10-19T09:00"
+    idempotency_key = Column(String(255), nullable=False, unique=True)  # user_id:agent_type:slot
+    status = Column(String(20), nullable=False, default=PENDING, server_default=PENDING)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # Retry backoff
+    locked_by = Column(String(255), nullable=True)  # Worker currently running the job
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Visibility timeout
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class UserActivity(Base):
+    """Activity index: last user activity per source and the scheduling tier derived from it."""
+    __tablename__ = "user_activity"
+    
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    PAUSED = "paused"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)  # Last USER_MESSAGE in the chat
+    last_lead_at = Column(DateTime(timezone=True), nullable=True)
+    last_task_at = Column(DateTime(timezone=True), nullable=True)
+    last_active_at = Column(DateTime(timezone=True), nullable=False)  # Latest of the above, or first seen
+    tier = Column(String(20), nullable=False, default=DAILY, server_default=DAILY, index=True)
+
+
+class ActivityCursor(Base):
+    """High-water mark of each source already folded into the activity index."""
+    __tablename__ = "activity_cursors"
+    
+    source = Column(String(50), primary_key=True)  # messages, leads, tasks
+    high_water_at = Column(DateTime(timezone=True), nullable=False)
+
 
+class ChatHead(Base):
+    """Latest agent run log ID per user, kept by a trigger on agent_run_logs (migration 0005)."""
+    __tablename__ = "chat_heads"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    last_log_id = Column(Integer, nullable=False)
+
+
+class ProgressRollup(Base):
+    """Per-user sum of target progress, kept by triggers on targets (migration 0006)."""
+    __tablename__ = "progress_rollups"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    progress = Column(Float, nullable=False, server_default="0")  # Sum of achieved / target * 100
+    targets = Column(Integer, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,345 @@
+"""Monthly partitions of agent_run_logs: creation ahead of time, retention and archival.
+
+agent_run_logs is range-partitioned on created_at (migration 0007): one
+partition per UTC month, agent_run_logs_pYYYYMM, plus agent_run_logs_legacy
+holding every row from before the migration and agent_run_logs_default
+catching rows of months without a partition. The daily partition_maintenance
+job (scheduler leader only) calls maintain(), which:
+
+1. Creates the partitions of the current month and the next
+   RUN_LOG_PARTITIONS_AHEAD months that don't exist yet, so inserts rarely
+   reach the default partition. Rows of the month already there are moved
+   into the new partition in the same transaction.
+2. Retires partitions that ended more than RUN_LOG_RETENTION_MONTHS full
+   months ago: each is detached (a catalog change, no row is moved), its rows
+   are written to RUN_LOG_ARCHIVE_DIR/<partition>.jsonl.gz, and the table is
+   dropped once the file is on disk and reads back with every row. The legacy
+   partition goes as a whole once its upper bound (the migration's cutover
+   month) is old enough. The archive is the only copy left, so
+   RUN_LOG_ARCHIVE_DIR must be an absolute path on persistent storage (a
+   volume, not the application directory); nothing is retired otherwise.
+
+Every step is idempotent: a table detached by a run that failed before the
+drop is picked up and archived by the next one. DDL waits at most LOCK_TIMEOUT
+for its lock, so a busy parent table fails the step (retried next day) instead
+of queueing writers behind it.
+"""
+import asyncio
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config.settings import settings
+
+
+PARENT_TABLE = "agent_run_logs"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+# Tables maintain() may detach, archive and drop
+PARTITION_NAME = re.compile(r"^agent_run_logs_(p\d{6}|legacy)$")
+LOCK_TIMEOUT = "5s"
+ARCHIVE_FETCH_ROWS = 5000
+ARCHIVE_COLUMNS = ["id", "user_id", "agent_type", "message", "payload", "created_at"]
+
+# (name, lower bound, upper bound) of a partition; None for MINVALUE / MAXVALUE
+Partition = Tuple[str, Optional[datetime], Optional[datetime]]
+
+PARTITIONS_SQL = """
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = $1 AND parent.relnamespace = current_schema()::regnamespace
+    ORDER BY child.relname
+"""
+# Tables left detached by an interrupted retirement
+DETACHED_SQL = """
+    SELECT relname FROM pg_class
+    WHERE relkind = 'r' AND NOT relispartition AND relname ~ $1
+    AND relnamespace = current_schema()::regnamespace
+    ORDER BY relname
+"""
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    """First instant (UTC) of the month `months` after the one containing moment."""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    """Name of a month's partition (agent_run_logs_pYYYYMM)."""
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def parse_bound(expression: str) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Bounds of a range partition from its pg_get_expr(relpartbound) text.
+    
+    Args:
+        expression: e.g. "FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00')"
+    
+    Returns:
+        (lower, upper); None for MINVALUE / MAXVALUE
+    
+    Raises:
+        ValueError: If the expression is not a range bound
+    """
+    match = re.fullmatch(r"FOR VALUES FROM \((.+)\) TO \((.+)\)", expression.strip())
+    if match is None:
+        raise ValueError(f"not a range partition bound: {expression}")
+    bounds = []
+    for value in match.groups():
+        if value in ("MINVALUE", "MAXVALUE"):
+            bounds.append(None)
+        else:
+            bounds.append(datetime.fromisoformat(value.strip("'")))
+    return bounds[0], bounds[1]
+
+
+def months_to_create(partitions: List[Partition], now: datetime, months_ahead: int) -> List[datetime]:
+    """
+    Months from the current one to months_ahead later that no partition covers yet.
+    
+    A month that overlaps an existing partition (the legacy one, or a partition
+    created by hand with other bounds) is skipped, as Postgres would reject it.
+    """
+    months = []
+    for offset in range(months_ahead + 1):
+        start, end = month_start(now, offset), month_start(now, offset + 1)
+        overlaps = any(
+            (lower is None or lower < end) and (upper is None or start < upper)
+            for _, lower, upper in partitions
+        )
+        if not overlaps:
+            months.append(start)
+    return months
+
+
+def partitions_to_retire(partitions: List[Partition], now: datetime, retention_months: int) -> List[str]:
+    """Partitions whose rows all predate the last retention_months full months."""
+    if retention_months <= 0:
+        return []
+    cutoff = month_start(now, -retention_months)
+    return [
+        name for name, _, upper in partitions
+        if PARTITION_NAME.match(name) and upper is not None and upper <= cutoff
+    ]
+
+
+async def list_partitions(conn) -> List[Partition]:
+    """Attached range partitions of agent_run_logs with their bounds (the default one left out)."""
+    rows = await conn.fetch(PARTITIONS_SQL, PARENT_TABLE)
+    return [(name, *parse_bound(expression)) for name, expression in rows if expression != "DEFAULT"]
+
+
+async def run_ddl(conn, *statements: str) -> None:
+    """Run DDL statements in one transaction, giving up after LOCK_TIMEOUT."""
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        for statement in statements:
+            await conn.execute(statement)
+
+
+async def create_partitions(conn, months_ahead: int, now: Optional[datetime] = None) -> List[str]:
+    """
+    Create the missing partitions of the current month and the next months_ahead.
+    
+    Postgres refuses a new partition while the default partition holds rows of
+    its range, so each one is created as a plain table, the month's rows are
+    moved into it from the default partition, and it is attached.
+    
+    Args:
+        conn: asyncpg connection
+        months_ahead: Future months to cover
+        now: Current time (default: now)
+    
+    Returns:
+        Names of the partitions created
+    """
+    now = now or datetime.now(timezone.utc)
+    created = []
+    for start in months_to_create(await list_partitions(conn), now, months_ahead):
+        name = partition_name(start)
+        lower, upper = start.isoformat(), month_start(start, 1).isoformat()
+        await run_ddl(
+            conn,
+            f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+            f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE created_at >= '{lower}' AND created_at < '{upper}'
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """,
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+        created.append(name)
+    return created
+
+
+def archive_row(row) -> str:
+    """JSON line of an archived run log."""
+    record = dict(zip(ARCHIVE_COLUMNS, row))
+    if record["payload"] is not None:
+        record["payload"] = json.loads(record["payload"])
+    record["created_at"] = record["created_at"].isoformat()
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def write_rows(file, rows) -> None:
+    file.write("".join(archive_row(row) for row in rows))
+
+
+def close_archive(file, raw, path: str) -> None:
+    file.close()
+    raw.flush()
+    os.fsync(raw.fileno())
+    raw.close()
+    os.replace(path + ".tmp", path)
+    # Make the rename itself durable
+    directory = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def verify_archive(path: str, rows: int) -> None:
+    """
+    Read an archive back in full (checking the gzip CRC) and count its lines.
+    
+    Raises:
+        RuntimeError: If the file is unreadable or does not hold `rows` lines
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            lines = sum(1 for _ in file)
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        raise RuntimeError(f"archive {path} is unreadable: {e}")
+    if lines != rows:
+        raise RuntimeError(f"archive {path} holds {lines} rows, expected {rows}")
+
+
+async def archive_partition(conn, name: str, archive_dir: str) -> Dict[str, Any]:
+    """
+    Write a detached partition's rows to <archive_dir>/<name>.jsonl.gz.
+    
+    The file is written under a .tmp name, synced and renamed, then read back
+    and checked against the table's row count, so a complete archive exists
+    before the table is dropped.
+    
+    Args:
+        conn: asyncpg connection
+        name: Detached partition table
+        archive_dir: Archive directory (created if missing)
+    
+    Returns:
+        Archive path and row count
+    
+    Raises:
+        RuntimeError: If the archive could not be verified
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+    raw = open(path + ".tmp", "wb")
+    file = gzip.open(raw, "wt", encoding="utf-8")
+    rows = 0
+    try:
+        async with conn.transaction():
+            expected = await conn.fetchval(f"SELECT count(*) FROM {name}")
+            cursor = await conn.cursor(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {name} ORDER BY created_at, id")
+            while True:
+                batch = await cursor.fetch(ARCHIVE_FETCH_ROWS)
+                if not batch:
+                    break
+                # Compression and file writes stay off the event loop
+                await asyncio.to_thread(write_rows, file, batch)
+                rows += len(batch)
+        await asyncio.to_thread(close_archive, file, raw, path)
+    except BaseException:
+        file.close()
+        raw.close()
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        raise
+    if rows != expected:
+        raise RuntimeError(f"archived {rows} rows of {name}, expected {expected}")
+    await asyncio.to_thread(verify_archive, path, rows)
+    return {"partition": name, "rows": rows, "archive": path}
+
+
+async def archive_and_drop(conn, name: str, archive_dir: str) -> Dict[str, Any]:
+    """Archive a detached partition, then drop it; a partition whose archive fails verification is kept."""
+    result = await archive_partition(conn, name, archive_dir)
+    await run_ddl(conn, f"DROP TABLE {name}")
+    print(f"Archived {result['rows']} run logs of {name} to {result['archive']}")
+    return result
+
+
+async def retire_partitions(
+    conn,
+    retention_months: int,
+    archive_dir: str,
+    now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Detach, archive and drop the partitions older than the retention period.
+    
+    Args:
+        conn: asyncpg connection
+        retention_months: Full months kept online (0 = keep everything)
+        archive_dir: Archive directory
+        now: Current time (default: now)
+    
+    Returns:
+        archive_partition() results of the retired partitions
+    
+    Raises:
+        ValueError: If archive_dir is not an absolute path
+    """
+    if not os.path.isabs(archive_dir):
+        raise ValueError(f"RUN_LOG_ARCHIVE_DIR must be an absolute path on persistent storage, got {archive_dir!r}")
+    now = now or datetime.now(timezone.utc)
+    retired = []
+    # Left detached by a run that failed before the drop
+    for row in await conn.fetch(DETACHED_SQL, PARTITION_NAME.pattern):
+        retired.append(await archive_and_drop(conn, row[0], archive_dir))
+    for name in partitions_to_retire(await list_partitions(conn), now, retention_months):
+        await run_ddl(conn, f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+        retired.append(await archive_and_drop(conn, name, archive_dir))
+    return retired
+
+
+async def maintain(
+    engine: AsyncEngine,
+    months_ahead: Optional[int] = None,
+    retention_months: Optional[int] = None,
+    archive_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Create upcoming partitions and retire expired ones over a pooled primary connection.
+    
+    Args:
+        engine: Primary database engine
+        months_ahead: Future months to cover (default: RUN_LOG_PARTITIONS_AHEAD)
+        retention_months: Full months kept online (default: RUN_LOG_RETENTION_MONTHS)
+        archive_dir: Archive directory (default: RUN_LOG_ARCHIVE_DIR)
+    
+    Returns:
+        Created partition names and retired partition results
+    """
+    months_ahead = months_ahead if months_ahead is not None else settings.RUN_LOG_PARTITIONS_AHEAD
+    retention_months = retention_months if retention_months is not None else settings.RUN_LOG_RETENTION_MONTHS
+    archive_dir = archive_dir or settings.RUN_LOG_ARCHIVE_DIR
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        created = await create_partitions(driver, months_ahead)
+        retired = await retire_partitions(driver, retention_months, archive_dir)
+    return {"created": created, "retired": retired}
@@ -0,0 +1,161 @@
+"""Connection pool instrumentation for the primary and replica engines.
+
+Engines are created with InstrumentedPool, which records for each pool:
+- checkout wait: time from asking the pool for a connection to getting one
+  (includes the pre-ping and opening a new connection), and pool timeouts
+  (the `QueuePool limit ... reached` errors);
+- hold time: how long a connection stays checked out;
+- connection lifetime: age of each connection when it is closed (recycled,
+  invalidated or dropped as overflow).
+
+Together with the live checked-out/overflow counts, GET /db/pool shows whether
+requests wait on a saturated pool and who keeps connections for long.
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000, 30000]
+HOLD_BUCKETS_MS = [10, 50, 100, 500, 1000, 5000, 30000, 120000]
+LIFETIME_BUCKETS_SECONDS = [1, 60, 300, 900, 1800, 3600, 7200]
+
+
+class Histogram:
+    """Counts of observations per upper bound (cumulative, like Prometheus `le` buckets)."""
+    
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        buckets, total = {}, 0
+        for bound, count in zip([*map(str, self.bounds), "+Inf"], self.counts):
+            total += count
+            buckets[bound] = total
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "le": buckets,
+        }
+
+
+class PoolMetrics:
+    """Counters and histograms of one engine's pool."""
+    
+    def __init__(self, name: str, pool: "InstrumentedPool"):
+        self.name = name
+        # The engine's current pool (dispose() replaces it)
+        self.pool = pool
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.peak_checked_out = 0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.hold_ms = Histogram(HOLD_BUCKETS_MS)
+        self.lifetime_seconds = Histogram(LIFETIME_BUCKETS_SECONDS)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times checkouts into its PoolMetrics."""
+    
+    metrics: Optional[PoolMetrics] = None
+    
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.wait_ms.observe((time.perf_counter() - started) * 1000)
+    
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+def instrument(pool: InstrumentedPool, name: str) -> PoolMetrics:
+    """
+    Start recording a pool's metrics.
+    
+    Args:
+        pool: The engine's pool (engine.sync_engine.pool)
+        name: Name shown in pool_stats()
+    
+    Returns:
+        The pool's PoolMetrics
+    """
+    metrics = pool.metrics = PoolMetrics(name, pool)
+    
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+        connection_record.info["connected_at"] = time.monotonic()
+    
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        metrics.peak_checked_out = max(metrics.peak_checked_out, metrics.pool.checkedout())
+    
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            metrics.hold_ms.observe((time.perf_counter() - checked_out_at) * 1000)
+    
+    @event.listens_for(pool, "close")
+    def on_close(dbapi_connection, connection_record):
+        metrics.closes += 1
+        connected_at = connection_record.info.get("connected_at")
+        if connected_at is not None:
+            metrics.lifetime_seconds.observe(time.monotonic() - connected_at)
+    
+    return metrics
+
+
+def pool_stats(metrics: PoolMetrics) -> Dict[str, Any]:
+    """Live pool occupancy plus the recorded counters and histograms."""
+    pool = metrics.pool
+    return {
+        "name": metrics.name,
+        "pool_size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "timeout_seconds": pool.timeout(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "peak_checked_out": metrics.peak_checked_out,
+        "checkouts": metrics.checkouts,
+        "timeouts": metrics.timeouts,
+        "connects": metrics.connects,
+        "closes": metrics.closes,
+        "checkout_wait_ms": metrics.wait_ms.snapshot(),
+        "hold_ms": metrics.hold_ms.snapshot(),
+        "connection_lifetime_seconds": metrics.lifetime_seconds.snapshot(),
+    }
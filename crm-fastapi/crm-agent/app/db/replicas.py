@@ -0,0 +1,212 @@
+"""Read-replica routing for read-only CRM queries.
+
+Sessions from AsyncSessionLocal are RoutingSessions. A SELECT built with
+`.execution_options(**replica_read(user_id))` runs on a streaming replica from
+DATABASE_REPLICA_URLS; everything else (writes, flushes, lazy loads, untagged
+reads) stays on the primary, so primary load follows the writes.
+
+- Read-your-writes: a write for a user (note_write) pins that user's reads to
+  the primary for REPLICA_STICKY_SECONDS. The pin is per process; writes made
+  by `python -m app.worker` reach the user through push instead.
+- Health: start() checks every replica's replay lag each REPLICA_CHECK_SECONDS.
+  A replica that can't be reached, is not streaming, or lags more than
+  REPLICA_MAX_LAG_SECONDS leaves the rotation until a check passes again.
+- A session keeps the replica it started reading from, so the reads of one
+  request see one snapshot of the data.
+"""
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+
+
+# Execution options of replica-routable statements
+READ_REPLICA = "read_replica"
+REPLICA_USER_ID = "replica_user_id"
+# Pins older than REPLICA_STICKY_SECONDS are pruned past this many
+MAX_PINNED_USERS = 10000
+
+# Seconds of replay lag; NULL when the server is not a streaming standby
+LAG_SQL = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN NULL
+    WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+END
+""")
+
+
+def replica_read(user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Execution options that let a SELECT run on a replica.
+    
+    Args:
+        user_id: User the rows belong to; reads of a user who just wrote stay on the primary
+    
+    Returns:
+        Options for Executable.execution_options()
+    """
+    return {READ_REPLICA: True, REPLICA_USER_ID: user_id}
+
+
+class Replica:
+    """One replica engine and its last health check."""
+    
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.reads = 0
+
+
+class ReplicaSet:
+    """Replica engines in rotation, their health and the per-user primary pins."""
+    
+    def __init__(
+        self,
+        max_lag_seconds: Optional[float] = None,
+        check_seconds: Optional[float] = None,
+        sticky_seconds: Optional[float] = None
+    ):
+        self.max_lag_seconds = max_lag_seconds if max_lag_seconds is not None else settings.REPLICA_MAX_LAG_SECONDS
+        self.check_seconds = check_seconds or settings.REPLICA_CHECK_SECONDS
+        self.sticky_seconds = sticky_seconds if sticky_seconds is not None else settings.REPLICA_STICKY_SECONDS
+        self.replicas: List[Replica] = []
+        self.primary_reads = 0
+        self._rotation = itertools.count()
+        self._pinned: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def add(self, name: str, engine: AsyncEngine) -> None:
+        """Add a replica; it joins the rotation after its first passing check."""
+        self.replicas.append(Replica(name, engine))
+    
+    async def start(self) -> None:
+        """Check the replicas once, then keep checking them in the background."""
+        if not self.replicas or self._task is not None:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the health checks and close the replica engines."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            replica.healthy = False
+            await replica.engine.dispose()
+    
+    def note_write(self, user_id: int) -> None:
+        """Pin a user's reads to the primary until replicas have caught up with their write."""
+        now = time.monotonic()
+        if len(self._pinned) >= MAX_PINNED_USERS:
+            self._pinned = {
+                pinned_user: until for pinned_user, until in self._pinned.items() if until > now
+            }
+        self._pinned[user_id] = now + self.sticky_seconds
+    
+    def is_pinned(self, user_id: Optional[int]) -> bool:
+        """Whether a user's reads must stay on the primary."""
+        if user_id is None:
+            return False
+        until = self._pinned.get(user_id)
+        return until is not None and until > time.monotonic()
+    
+    def engine_for(self, user_id: Optional[int], session_info: Dict[str, Any]) -> Optional[AsyncEngine]:
+        """
+        Replica engine for a replica-routable read, or None for the primary.
+        
+        Args:
+            user_id: User the read is for (None when it isn't tied to one)
+            session_info: Session.info; remembers the session's replica
+        
+        Returns:
+            The engine to read from, or None to read from the primary
+        """
+        replica = session_info.get("replica")
+        if self.is_pinned(user_id):
+            replica = None
+        elif replica is None or not replica.healthy:
+            healthy = [candidate for candidate in self.replicas if candidate.healthy]
+            replica = healthy[next(self._rotation) % len(healthy)] if healthy else None
+        if replica is None:
+            self.primary_reads += 1
+            return None
+        session_info["replica"] = replica
+        replica.reads += 1
+        return replica.engine
+    
+    async def check(self) -> None:
+        """Measure every replica's lag and update the rotation."""
+        for replica in self.replicas:
+            try:
+                lag = await self._lag(replica)
+                replica.lag_seconds = lag
+                replica.error = None if lag is not None else "not a streaming standby"
+            except Exception as e:
+                replica.lag_seconds = None
+                replica.error = str(e)[:200]
+            healthy = replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag_seconds
+            if healthy != replica.healthy:
+                reason = replica.error or f"lag {replica.lag_seconds:.1f}s"
+                state = "back in rotation" if healthy else f"out of rotation ({reason})"
+                print(f"Read replica {replica.name}: {state}")
+            replica.healthy = healthy
+    
+    def stats(self) -> Dict[str, Any]:
+        """Replica health and read counters."""
+        return {
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "error": replica.error,
+                    "reads": replica.reads,
+                }
+                for replica in self.replicas
+            ],
+            "primary_reads": self.primary_reads,
+            "pinned_users": sum(1 for until in self._pinned.values() if until > time.monotonic()),
+            "max_lag_seconds": self.max_lag_seconds,
+        }
+    
+    async def _lag(self, replica: Replica) -> Optional[float]:
+        async with replica.engine.connect() as conn:
+            lag = await conn.scalar(LAG_SQL)
+        return float(lag) if lag is not None else None
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            await self.check()
+
+
+class RoutingSession(Session):
+    """Session that sends replica_read() statements to a healthy replica."""
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if clause is not None and not self._flushing and replica_set.replicas:
+            options = clause.get_execution_options() if hasattr(clause, "get_execution_options") else {}
+            if options.get(READ_REPLICA):
+                engine = replica_set.engine_for(options.get(REPLICA_USER_ID), self.info)
+                if engine is not None:
+                    return engine.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+replica_set = ReplicaSet()
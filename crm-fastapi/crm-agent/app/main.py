@@ -1,22 +1,43 @@
 """FastAPI main application - CRM Agent."""
 from contextlib import asynccontextmanager
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
 import os
 
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, field_validator
 
 from app.config.settings import settings
 from app.db.database import get_db, init_db
-from app.db import crud
-from app.agent.scheduler import start_scheduler, shutdown_scheduler
+from app.db import crud, database
+from app.db.log_buffer import run_log_buffer
+from app.db.replicas import replica_set
+from app.db.bulk_import import FORMATS, IMPORT_TABLES, ImportRejected, import_stream
+from app.agent.scheduler import (
+    start_scheduler,
+    shutdown_scheduler,
+    REPORT_ACTIVITY,
+    REPORT_CONTEXT_CACHE,
+    REPORT_SUMMARY,
+    get_leader_status,
+    get_job_worker_stats,
+    get_scheduled_jobs
+)
+from app.agent.router import model_router
+from app.agent.llm_calls import hedge_stats
+from app.agent.smoothing import read_load_curve
+from app.agent.timezones import is_valid_timezone
+from app.agent.prompts import invalidate_profile_fragments
+from app.agent.triggers import ChangeEvent, handle_events, trigger_stats, verify_signature
 from app.core.dependencies import get_agent_service, get_chat_service
-from app.core.middleware import LoggingMiddleware, ErrorHandlingMiddleware
-from app.core.exceptions import CRMException
+from app.core.middleware import LoggingMiddleware, ErrorHandlingMiddleware, DeadlineMiddleware
+from app.core.exceptions import CRMException, ValidationError as CRMValidationError
+from app.core.pubsub import pubsub, run_log_message
 from app.modules.agent.services.agent_service import IAgentService
 from app.modules.chat.services.chat_service import IChatService
 from app.modules.agent.dto.agent_dto import AgentRunRequest, AgentRunResponse, AgentListResponse
@@ -28,10 +49,20 @@ async def lifespan(app: FastAPI):
     """Application lifespan: startup and shutdown."""
     # Startup
     await init_db()
-    start_scheduler()
+    await replica_set.start()
+    await pubsub.start()
+    if settings.LOG_BUFFER_ENABLED:
+        run_log_buffer.start()
+    # API-only processes leave scheduling to `python -m app.worker`
+    if settings.SCHEDULER_ENABLED:
+        start_scheduler()
     yield
     # Shutdown
-    shutdown_scheduler()
+    if settings.SCHEDULER_ENABLED:
+        await shutdown_scheduler()
+    await run_log_buffer.stop()
+    await pubsub.stop()
+    await replica_set.stop()
 
 
 app = FastAPI(
@@ -45,6 +76,7 @@ app = FastAPI(
 # Add custom middleware
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(ErrorHandlingMiddleware)
+app.add_middleware(DeadlineMiddleware)
 
 # CORS middleware for frontend access
 app.add_middleware(
@@ -79,6 +111,19 @@ class BusinessProfileRequest(BaseModel):
     tone: Optional[str] = None
     daily_goal: Optional[str] = None
     keywords: Optional[list] = None
+    timezone: Optional[str] = None  # IANA name, ex: "Asia/Beirut"; scheduled messages use local time
+    
+    @field_validator('timezone')
+    @classmethod
+    def validate_timezone(cls, v):
+        if v is not None and not is_valid_timezone(v):
+            raise ValueError(f"Unknown timezone: {v}")
+        return v
+
+
+class CrmEventsRequest(BaseModel):
+    """Batch of crm-backend change events."""
+    events: List[ChangeEvent]
 
 
 # Health Check
@@ -127,16 +172,50 @@ async def send_chat_message(
         )
 
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak If-None-Match comparison (RFC 9110): W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
 @app.get("/chat/history/{user_id}", response_model=ChatHistoryResponse)
 async def get_chat_history(
     user_id: int,
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since_id: Optional[int] = Query(None, ge=0),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     chat_service: IChatService = Depends(get_chat_service)
 ):
-    """Get chat history for a user."""
+    """
+    Get a page of chat history for a user, latest first.
+    
+    Page back with `before=<next_cursor>`; fetch newer messages with
+    `after=<prev_cursor>`, or poll with `since_id=<latest message id>`.
+    The weak ETag tracks the user's latest message, so a client revalidating
+    with If-None-Match gets a 304 without the messages being read.
+    """
     try:
-        return await chat_service.get_history(db, user_id, limit)
+        # Write this process's buffered messages of the user first so the history
+        # includes them; polls of users with nothing buffered stay read-only
+        if run_log_buffer.has_pending(user_id):
+            await run_log_buffer.flush()
+        head = await crud.get_chat_head(db, user_id)
+        if head is not None:
+            etag = f'W/"{user_id}-{head}"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers=headers)
+            response.headers.update(headers)
+        return await chat_service.get_history(db, user_id, limit, before=before, after=after, since_id=since_id)
+    except CRMValidationError:
+        # Malformed cursor
+        raise
     except (RuntimeError, ValueError) as e:
         # Database not configured or validation error - return empty history
         print(f"Warning in get_chat_history: {e}")
@@ -150,6 +229,80 @@ async def get_chat_history(
         return ChatHistoryResponse(user_id=user_id, messages=[])
 
 
+@app.get("/chat/log-buffer")
+async def get_log_buffer_stats():
+    """Write-behind buffer of chat and agent run logs in this process."""
+    return run_log_buffer.stats()
+
+
+# Messages sent to a reconnecting socket before live pushes
+PUSH_CATCH_UP_LIMIT = 100
+
+
+@app.websocket("/ws/chat/{user_id}")
+async def chat_push(websocket: WebSocket, user_id: int, since_id: Optional[int] = None):
+    """
+    Push a user's new chat messages (agent run logs, scheduled ones included)
+    as they are written, as JSON history items with user_id.
+    
+    With since_id, the messages saved after it are sent first, so a client that
+    reconnects misses nothing; messages may then arrive twice and carry their
+    id for de-duplication. Client messages are ignored.
+    """
+    await websocket.accept()
+    # Subscribe before reading the catch-up so nothing falls in between
+    subscription = pubsub.subscribe(user_id)
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        if since_id is not None and database.AsyncSessionLocal is not None:
+            async with database.AsyncSessionLocal() as db:
+                runs = await crud.get_recent_agent_runs(db, user_id, limit=PUSH_CATCH_UP_LIMIT, since_id=since_id)
+            for run in reversed(runs):
+                await websocket.send_json(
+                    run_log_message(run.user_id, run.id, run.agent_type, run.message, run.created_at, run.payload)
+                )
+        
+        while True:
+            if subscription.dropped and subscription.queue.empty():
+                # Fell behind: the client reconnects with since_id to catch up
+                await websocket.close(code=1013)
+                return
+            getter = asyncio.create_task(subscription.queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    getter.cancel()
+                    return
+                receiver = asyncio.create_task(websocket.receive())
+            if getter in done:
+                await websocket.send_json(getter.result())
+            else:
+                getter.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        pubsub.unsubscribe(subscription)
+
+
+@app.get("/chat/push")
+async def get_push_stats():
+    """WebSocket push subscribers and message counters in this process."""
+    return pubsub.stats()
+
+
+@app.get("/db/pool")
+async def get_pool_stats():
+    """Connection pool occupancy, checkout waits and timeouts, hold times and connection lifetimes."""
+    return {"pools": database.get_pool_stats()}
+
+
+@app.get("/db/replicas")
+async def get_replica_stats():
+    """Read replica health, lag and read counters in this process."""
+    return replica_set.stats()
+
+
 # Business Profile Endpoints
 @app.post("/business-profile/{user_id}")
 async def create_business_profile(
@@ -165,8 +318,11 @@ async def create_business_profile(
         products=profile.products,
         tone=profile.tone,
         daily_goal=profile.daily_goal,
-        keywords=profile.keywords
+        keywords=profile.keywords,
+        timezone=profile.timezone
     )
+    # Drop compiled prompt fragments rendered from the previous profile version
+    invalidate_profile_fragments(user_id)
     return {"status": "success", "profile_id": business_profile.id}
 
 
@@ -187,7 +343,8 @@ async def get_business_profile_endpoint(
         "products": profile.products,
         "tone": profile.tone,
         "daily_goal": profile.daily_goal,
-        "keywords": profile.keywords
+        "keywords": profile.keywords,
+        "timezone": profile.timezone
     }
 
 
@@ -223,6 +380,50 @@ async def get_progress_endpoint(
     return {"user_id": user_id, "progress": progress}
 
 
+@app.get("/progress")
+async def get_progress_batch_endpoint(
+    user_ids: List[int] = Query(..., min_length=1, max_length=settings.PROGRESS_BATCH_MAX_USERS),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get progress of several users (?user_ids=1&user_ids=2) in one query."""
+    try:
+        progress = await crud.get_progress_many(db, list(dict.fromkeys(user_ids)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "progress": [
+            {"user_id": user_id, "progress": value}
+            for user_id, value in progress.items()
+        ]
+    }
+
+
+# Bulk Import Endpoints
+@app.post("/import/{table}")
+async def bulk_import(
+    table: str,
+    request: Request,
+    format: Optional[str] = Query(None, description="csv or ndjson (default: from Content-Type)"),
+    max_errors: int = Query(0, ge=0, description="Invalid rows to skip before rejecting the import")
+):
+    """
+    Load a streamed CSV or NDJSON upload into leads, tasks, sales or targets with COPY.
+    Rows with an `id` are upserted on it; rows without one are inserted.
+    """
+    if table not in IMPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown import table: {table}")
+    if format is None:
+        format = "ndjson" if "json" in request.headers.get("content-type", "") else "csv"
+    if format not in FORMATS:
+        raise CRMValidationError("format", "must be csv or ndjson")
+    if database.engine is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    try:
+        return await import_stream(database.engine, table, request.stream(), format, max_errors)
+    except ImportRejected as e:
+        return JSONResponse(status_code=422, content=e.result)
+
+
 # Agent Control Endpoints
 @app.post("/agents/run", response_model=AgentRunResponse)
 async def run_agent_endpoint(
@@ -240,3 +441,143 @@ async def list_agents(
 ):
     """List all available agent types."""
     return await agent_service.list_agents()
+
+
+@app.get("/agents/routing")
+async def get_model_routing():
+    """Model routing table with per-route latency percentiles, failover and hedging counts."""
+    return {"routes": model_router.stats(), "hedging": hedge_stats.snapshot()}
+
+
+@app.get("/scheduler/summary")
+async def get_scheduler_summary(
+    db: AsyncSession = Depends(get_db)
+):
+    """Scheduler leadership of this process and last fan-out summary per scheduled job, as stored by the workers."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    return {
+        "leader": get_leader_status(),
+        "jobs": await crud.get_scheduler_reports(db, REPORT_SUMMARY)
+    }
+
+
+@app.get("/scheduler/jobs")
+async def get_scheduler_jobs(
+    db: AsyncSession = Depends(get_db)
+):
+    """Scheduled jobs from the persistent job store with next run time, misfire policy, last tick and last run outcome."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    return {"jobs": await get_scheduled_jobs(db)}
+
+
+@app.get("/scheduler/load")
+async def get_scheduler_load(
+    minutes: int = 60,
+    db: AsyncSession = Depends(get_db)
+):
+    """Observed load curve of scheduled runs in every worker: runs started and peak concurrency per minute."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    return await read_load_curve(db, minutes)
+
+
+@app.get("/scheduler/prefetch")
+async def get_scheduler_prefetch(
+    db: AsyncSession = Depends(get_db)
+):
+    """Context cache hit rates per worker (reported within the last day) and the last prefetch run."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    since = datetime.now(timezone.utc) - timedelta(days=1)
+    return {
+        "caches": await crud.get_scheduler_reports(db, REPORT_CONTEXT_CACHE, since),
+        "last_prefetch": await crud.get_scheduler_report(db, REPORT_SUMMARY, "prefetch"),
+    }
+
+
+@app.get("/scheduler/activity")
+async def get_scheduler_activity(
+    db: AsyncSession = Depends(get_db)
+):
+    """Users per activity tier and the runs skipped for weekly/paused users in the last cycle of each job."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    return {
+        "enabled": settings.ACTIVITY_TIERS_ENABLED,
+        "tiers": await crud.count_users_by_tier(db),
+        "jobs": await crud.get_scheduler_reports(db, REPORT_ACTIVITY),
+    }
+
+
+@app.get("/scheduler/queue")
+async def get_job_queue(
+    db: AsyncSession = Depends(get_db)
+):
+    """Durable job queue: jobs per status, latest dead letters and this process's consumer counters."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    counts = await crud.get_agent_job_counts(db)
+    dead_jobs = await crud.get_dead_agent_jobs(db)
+    return {
+        "counts": counts,
+        "dead_letters": [
+            {
+                "id": job.id,
+                "user_id": job.user_id,
+                "agent_type": job.agent_type,
+                "slot": job.slot,
+                "attempts": job.attempts,
+                "last_error": job.last_error,
+                "updated_at": job.updated_at.isoformat() if job.updated_at else None
+            }
+            for job in dead_jobs
+        ],
+        "worker": get_job_worker_stats()
+    }
+
+
+@app.post("/scheduler/queue/{job_id}/requeue")
+async def requeue_dead_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Move a dead-lettered job back to the queue with a fresh attempt budget."""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    if not await crud.requeue_agent_job(db, job_id):
+        raise HTTPException(status_code=404, detail="Dead job not found")
+    return {"status": "requeued", "job_id": job_id}
+
+
+# Event-driven agent runs
+@app.post("/webhooks/crm-events", status_code=202)
+async def receive_crm_events(
+    request: Request,
+    x_crm_signature: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Change events from crm-backend; enqueues one debounced FOLLOW_UP/CLOSURE run per user when relevant."""
+    if not settings.EVENT_TRIGGERS_ENABLED or not settings.JOB_QUEUE_ENABLED:
+        raise HTTPException(status_code=503, detail="Event triggers not enabled")
+    if not settings.WEBHOOK_SECRET:
+        # Unsigned events would let any caller enqueue LLM runs for any user
+        raise HTTPException(status_code=503, detail="WEBHOOK_SECRET not configured")
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    
+    body = await request.body()
+    if not verify_signature(body, x_crm_signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    try:
+        payload = CrmEventsRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    return await handle_events(db, payload.events)
+
+
+@app.get("/webhooks/crm-events")
+async def get_crm_event_stats():
+    """Events received, ignored, enqueued and debounced by this process."""
+    return trigger_stats
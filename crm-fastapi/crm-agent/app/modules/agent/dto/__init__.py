@@ -2,12 +2,16 @@
 from app.modules.agent.dto.agent_dto import (
     AgentRunRequest,
     AgentRunResponse,
-    AgentListResponse
+    AgentListResponse,
+    AgentRecommendation,
+    TaskRecommendation
 )
 
 __all__ = [
     "AgentRunRequest",
     "AgentRunResponse",
-    "AgentListResponse"
+    "AgentListResponse",
+    "AgentRecommendation",
+    "TaskRecommendation"
 ]
 
@@ -1,5 +1,5 @@
 """DTOs for agent operations."""
-from typing import Optional
+from typing import Optional, Literal
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 from app.agent.prompts import AgentType
 
@@ -57,3 +57,36 @@ class AgentListResponse(BaseModel):
         }
     )
 
+
+class AgentRecommendation(BaseModel):
+    """Structured LLM output for task analysis and sales follow-ups."""
+    recommendation: str = Field(..., min_length=1, description="Concise, actionable recommendation")
+    priority: Literal["low", "medium", "high"] = Field(default="medium", description="Priority of the recommendation")
+    next_action: str = Field(default="", description="Single concrete next step")
+    
+    @field_validator('priority', mode='before')
+    @classmethod
+    def normalize_priority(cls, v):
+        if isinstance(v, str):
+            return v.strip().lower()
+        return v
+    
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "recommendation": "Call the customer before noon to confirm the order.",
+                "priority": "high",
+                "next_action": "Call Ahmad about the 20 cheese blocks"
+            }
+        }
+    )
+
+
+class TaskRecommendation(AgentRecommendation):
+    """Structured LLM output for one task in a batched task analysis."""
+    task_id: str = Field(..., description="ID of the analyzed task")
+    
+    @field_validator('task_id', mode='before')
+    @classmethod
+    def coerce_task_id(cls, v):
+        return str(v) if v is not None else v
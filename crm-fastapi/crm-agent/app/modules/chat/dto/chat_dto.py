@@ -1,5 +1,5 @@
 """DTOs for chat operations."""
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 
@@ -38,14 +38,18 @@ class ChatMessageItem(BaseModel):
     id: int = Field(..., description="Message ID")
     agent_type: str = Field(..., description="Type of agent or message")
     message: str = Field(..., description="Message content")
+    payload: Optional[Dict[str, Any]] = Field(
+        default=None, description="Structured output the message was rendered from (recommendation, priority, next_action)"
+    )
     created_at: str = Field(..., description="ISO format timestamp")
     
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
                 "id": 1,
-                "agent_type": "AGENT_RESPONSE",
-                "message": "Here are your tasks...",
+                "agent_type": "TASK_REMINDER",
+                "message": "Task Reminder: Call Dana\n\nSend the quote today\n\nPriority: High",
+                "payload": {"recommendation": "Send the quote today", "priority": "high", "next_action": "Call Dana"},
                 "created_at": "2024-01-15T09:00:00"
             }
         }
@@ -72,7 +76,9 @@ class ChatMessageResponse(BaseModel):
 class ChatHistoryResponse(BaseModel):
     """Response DTO for chat history."""
     user_id: int = Field(..., description="User ID")
-    messages: List[ChatMessageItem] = Field(..., description="List of messages")
+    messages: List[ChatMessageItem] = Field(..., description="List of messages, latest first")
+    next_cursor: Optional[str] = Field(default=None, description="Pass as `before` for the older page")
+    prev_cursor: Optional[str] = Field(default=None, description="Pass as `after` for the newer page")
     
     model_config = ConfigDict(
         json_schema_extra={
@@ -85,7 +91,9 @@ class ChatHistoryResponse(BaseModel):
                         "message": "Hello",
                         "created_at": "2024-01-15T09:00:00"
                     }
-                ]
+                ],
+                "next_cursor": "MjAyNC0wMS0xNVQwOTowMDowMHwx",
+                "prev_cursor": None
             }
         }
     )
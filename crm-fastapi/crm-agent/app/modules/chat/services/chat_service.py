@@ -1,6 +1,9 @@
 """Service layer for chat operations."""
+import base64
+import binascii
 from abc import ABC, abstractmethod
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.modules.chat.dto.chat_dto import (
@@ -9,11 +12,25 @@ from app.modules.chat.dto.chat_dto import (
     ChatHistoryResponse,
     ChatMessageItem
 )
-from app.core.exceptions import DatabaseError
+from app.core.exceptions import DatabaseError, ValidationError
 from fastapi import HTTPException, status
 from app.db import crud
 
 
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    """Opaque history cursor for a message's (created_at, id) position."""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{message_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str, field: str) -> Tuple[datetime, int]:
+    """(created_at, id) position of a history cursor; ValidationError if malformed."""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValidationError(field, "invalid cursor")
+
+
 class IChatService(ABC):
     """Interface for chat service."""
     
@@ -31,9 +48,12 @@ class IChatService(ABC):
         self,
         db: AsyncSession,
         user_id: int,
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        since_id: Optional[int] = None
     ) -> ChatHistoryResponse:
-        """Get chat history for a user."""
+        """Get a page of chat history for a user."""
         pass
 
 
@@ -58,21 +78,24 @@ class ChatService(IChatService):
                 message=request.message
             )
             
-            # Log the user message and agent response (if database is available)
+            # Log the user message and agent response (if database is available);
+            # the rows are written behind the response
             if db is not None:
                 try:
                     await crud.log_agent_run(
                         db=db,
                         user_id=request.user_id,
                         agent_type="USER_MESSAGE",
-                        message=request.message
+                        message=request.message,
+                        buffered=True
                     )
                     
                     await crud.log_agent_run(
                         db=db,
                         user_id=request.user_id,
                         agent_type="AGENT_RESPONSE",
-                        message=response_text
+                        message=response_text,
+                        buffered=True
                     )
                 except Exception as e:
                     # Log error but don't fail the request
@@ -99,15 +122,44 @@ class ChatService(IChatService):
         self,
         db: AsyncSession,
         user_id: int,
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        since_id: Optional[int] = None
     ) -> ChatHistoryResponse:
-        """Get chat history for a user."""
+        """
+        Get a page of chat history for a user, latest message first.
+        
+        Without a cursor this is the latest page. `before` pages back through
+        older messages and `after` returns the ones newer than a cursor; the
+        response carries the cursors of the neighbouring pages. `since_id`
+        returns only the messages written after that ID (the first `limit` of
+        them), for polling; those pages carry no cursors.
+        
+        Args:
+            db: Database session
+            user_id: User ID to get history for
+            limit: Page size (1-100, default: 50)
+            before: next_cursor of a previous response
+            after: prev_cursor of a previous response
+            since_id: ID of the latest message the client has
+            
+        Returns:
+            ChatHistoryResponse with the page and its next/prev cursors
+        """
         if user_id <= 0:
             raise ValueError("user_id must be greater than 0")
         
         if limit <= 0 or limit > 100:
             limit = 50
         
+        if before is not None and after is not None:
+            raise ValidationError("before", "cannot be combined with after")
+        if since_id is not None and (before is not None or after is not None):
+            raise ValidationError("since_id", "cannot be combined with before or after")
+        before_position = decode_cursor(before, "before") if before is not None else None
+        after_position = decode_cursor(after, "after") if after is not None else None
+        
         try:
             # Check if database is available
             if db is None:
@@ -117,21 +169,48 @@ class ChatService(IChatService):
                     messages=[]
                 )
             
-            recent_runs = await crud.get_recent_agent_runs(db, user_id, limit=limit)
+            # One extra row tells whether another page exists past this one
+            recent_runs = await crud.get_recent_agent_runs(
+                db, user_id, limit=limit + 1, before=before_position, after=after_position, since_id=since_id
+            )
+            has_more = len(recent_runs) > limit
+            if has_more:
+                # The extra row is the furthest from the cursor
+                forward = after is not None or since_id is not None
+                recent_runs = recent_runs[1:] if forward else recent_runs[:limit]
             
             messages = [
                 ChatMessageItem(
                     id=run.id,
                     agent_type=run.agent_type,
                     message=run.message,
+                    payload=run.payload,
                     created_at=run.created_at.isoformat()
                 )
                 for run in recent_runs
             ]
             
+            next_cursor = prev_cursor = None
+            if since_id is not None:
+                # Polling: the client continues from the latest ID it has
+                pass
+            elif recent_runs:
+                oldest, newest = recent_runs[-1], recent_runs[0]
+                # Older messages exist past a full page, and always before an `after` cursor
+                if after is not None or has_more:
+                    next_cursor = encode_cursor(oldest.created_at, oldest.id)
+                # Newer messages exist past a full `after` page, and always after a `before` cursor
+                if before is not None or (after is not None and has_more):
+                    prev_cursor = encode_cursor(newest.created_at, newest.id)
+            else:
+                # Nothing newer yet: poll again from the same place
+                prev_cursor = after
+            
             return ChatHistoryResponse(
                 user_id=user_id,
-                messages=messages
+                messages=messages,
+                next_cursor=next_cursor,
+                prev_cursor=prev_cursor
             )
         except ValueError:
             # Re-raise ValueError as-is (validation errors)
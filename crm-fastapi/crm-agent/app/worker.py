@@ -0,0 +1,60 @@
+"""Standalone scheduler/worker process - runs scheduled agent jobs without HTTP serving.
+
+Usage:
+    python -m app.worker
+
+Run API processes with SCHEDULER_ENABLED=false so agent fan-outs never share an
+event loop with request handling. Several workers can run side by side; leader
+election makes sure only one of them fires the cron triggers.
+"""
+import asyncio
+import signal
+
+from app.config.settings import settings
+from app.db.database import init_db
+from app.db.log_buffer import run_log_buffer
+from app.db.replicas import replica_set
+from app.core.pubsub import pubsub
+from app.agent.scheduler import start_scheduler, shutdown_scheduler
+
+
+async def run_worker():
+    """Start the scheduler and run until SIGINT/SIGTERM."""
+    await init_db()
+    await replica_set.start()
+    # Publish only: the API processes hold the sockets
+    await pubsub.start(listen=False)
+    if settings.LOG_BUFFER_ENABLED:
+        run_log_buffer.start()
+    start_scheduler()
+    print("CRM Agent worker started (scheduler only, no HTTP)")
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Signal handlers are not available on this platform (ex: Windows)
+            pass
+    
+    try:
+        await stop_event.wait()
+    finally:
+        await shutdown_scheduler()
+        await run_log_buffer.stop()
+        await pubsub.stop()
+        await replica_set.stop()
+        print("CRM Agent worker stopped")
+
+
+def main():
+    """Entry point for `python -m app.worker`."""
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
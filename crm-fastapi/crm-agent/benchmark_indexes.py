@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+EXPLAIN benchmark for the composite indexes of the index migrations
+(0003_composite_indexes onwards).
+
+Builds the tables in a scratch schema, fills them with generated rows and runs
+each crud query shape with EXPLAIN (ANALYZE, BUFFERS) twice: with the
+single-column indexes of the baseline schema, then with the composite and
+covering indexes the migrations replace them with. Prints the plan, the buffers touched and the median execution
+time of both.
+
+Usage:
+    python benchmark_indexes.py                         # 10k users, 2M agent run logs
+    python benchmark_indexes.py --users 50000 --run-logs 10000000 --plans
+    python benchmark_indexes.py --keep                  # keep the index_bench schema
+
+Needs DATABASE_URL to point at a PostgreSQL database where it may create schemas.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config.settings import settings
+from app.db.database import Base
+from app.db import models  # noqa: F401 - registers the tables on Base.metadata
+from app.db.partitions import month_start, partition_name
+
+
+SCHEMA = "index_bench"
+
+TIMEZONES = ["UTC", "Asia/Beirut", "Europe/Paris", "America/New_York", "Asia/Dubai"]
+
+# (name, query) - the shapes crud runs; :user_id is a user with data, :after a keyset position
+QUERIES = [
+    ("recent agent runs",
+     "SELECT * FROM agent_run_logs WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 5"),
+    ("chat history",
+     "SELECT * FROM agent_run_logs WHERE user_id = :user_id ORDER BY created_at DESC, id DESC LIMIT 50"),
+    ("chat history, deep page",
+     "SELECT * FROM agent_run_logs WHERE user_id = :user_id "
+     "AND (created_at, id) < (now() - interval '60 days', 0) ORDER BY created_at DESC, id DESC LIMIT 50"),
+    ("chat since id",
+     "SELECT * FROM agent_run_logs WHERE user_id = :user_id AND id > :since_id ORDER BY id LIMIT 50"),
+    ("user messages since cursor",
+     "SELECT user_id, max(created_at) FROM agent_run_logs "
+     "WHERE agent_type = 'USER_MESSAGE' AND created_at > now() - interval '15 minutes' GROUP BY user_id"),
+    ("leads of a user",
+     "SELECT * FROM leads WHERE user_id = :user_id ORDER BY updated_at DESC"),
+    ("leads since cursor",
+     "SELECT user_id, max(updated_at) FROM leads WHERE updated_at > now() - interval '15 minutes' GROUP BY user_id"),
+    ("sales of a user",
+     "SELECT * FROM sales WHERE user_id = :user_id ORDER BY id DESC"),
+    ("today's tasks",
+     "SELECT id, user_id, title, status, due_date, updated_at FROM tasks "
+     "WHERE user_id = :user_id AND due_date = current_date"),
+    ("active users in a timezone",
+     "SELECT user_id FROM business_profiles WHERE timezone IN ('Asia/Beirut') AND user_id > :after "
+     "ORDER BY user_id LIMIT 1000"),
+]
+
+
+def load_index_plan():
+    """(baseline indexes that get replaced, indexes at the migration head) from the index migrations."""
+    scripts = ScriptDirectory.from_config(Config(str(project_root / "alembic.ini")))
+    before, after = {}, {}
+    for revision in reversed(list(scripts.walk_revisions())):
+        for name, table, columns, include, replaces in getattr(revision.module, "INDEXES", []):
+            if replaces is not None:
+                if replaces[0] in after:
+                    del after[replaces[0]]
+                else:
+                    before[replaces[0]] = (replaces[0], table, replaces[1], [])
+            after[name] = (name, table, columns, include)
+    return list(before.values()), list(after.values())
+
+
+def index_ddl(name, table, columns, include):
+    ddl = f"CREATE INDEX {name} ON {SCHEMA}.{table} ({', '.join(columns)})"
+    if include:
+        ddl += f" INCLUDE ({', '.join(include)})"
+    return ddl
+
+
+async def build_schema(engine, users: int, run_logs: int, composite):
+    """Create the tables with the model indexes, minus the composite ones, and fill them."""
+    rows = max(run_logs // 10, users)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(
+            lambda sync_conn: Base.metadata.create_all(
+                sync_conn.execution_options(schema_translate_map={None: SCHEMA})
+            )
+        )
+        # Monthly partitions over the 90 days of generated run logs, as in production
+        now = datetime.now(timezone.utc)
+        for offset in range(-3, 1):
+            start = month_start(now, offset)
+            await conn.execute(text(f"""
+                CREATE TABLE {SCHEMA}.{partition_name(start)} PARTITION OF {SCHEMA}.agent_run_logs
+                FOR VALUES FROM ('{start.isoformat()}') TO ('{month_start(start, 1).isoformat()}')
+            """))
+        # Each phase creates the indexes it measures
+        for name, _, _, _ in composite:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {SCHEMA}.{name}"))
+        
+        print(f"Filling {users:,} profiles, {run_logs:,} agent run logs, {rows:,} leads/tasks/sales...")
+        timezones = "ARRAY[" + ", ".join(f"'{tz}'" for tz in TIMEZONES) + "]"
+        await conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.business_profiles (user_id, business_type, timezone, version)
+            SELECT g, 'retail', ({timezones})[1 + g % {len(TIMEZONES)}], 1
+            FROM generate_series(1, :users) g
+        """), {"users": users})
+        await conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.agent_run_logs (user_id, agent_type, message, created_at)
+            SELECT 1 + (random() * (:users - 1))::int,
+                   (ARRAY['USER_MESSAGE', 'AGENT_RESPONSE', 'REMINDER', 'FOLLOW_UP', 'CLOSURE'])[1 + g % 5],
+                   repeat('message ', 10),
+                   now() - random() * interval '90 days'
+            FROM generate_series(1, :rows) g
+        """), {"users": users, "rows": run_logs})
+        await conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.leads (user_id, customer_name, stage, updated_at)
+            SELECT 1 + (random() * (:users - 1))::int, 'Customer ' || g, 'qualified',
+                   now() - random() * interval '90 days'
+            FROM generate_series(1, :rows) g
+        """), {"users": users, "rows": rows})
+        await conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.tasks (user_id, title, status, due_date, updated_at)
+            SELECT 1 + (random() * (:users - 1))::int, 'Task ' || g, 'pending',
+                   current_date - (g % 60), now() - random() * interval '90 days'
+            FROM generate_series(1, :rows) g
+        """), {"users": users, "rows": rows})
+        await conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.sales (user_id, customer, product, status)
+            SELECT 1 + (random() * (:users - 1))::int, 'Customer ' || g, 'cheese', 'pending'
+            FROM generate_series(1, :rows) g
+        """), {"users": users, "rows": rows})
+
+
+async def apply_indexes(engine, drop, create):
+    """Swap index sets, then VACUUM ANALYZE so plans and index-only scans see fresh stats."""
+    async with engine.begin() as conn:
+        for name, _, _, _ in drop:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {SCHEMA}.{name}"))
+        for index in create:
+            await conn.execute(text(index_ddl(*index)))
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        await conn.execute(text("VACUUM ANALYZE"))
+
+
+def scans(plan):
+    """Scan nodes of a JSON plan, ex: "Index Only Scan ix_tasks_user_id_due_date"."""
+    found = []
+    if "Scan" in plan["Node Type"]:
+        found.append(f"{plan['Node Type']} {plan.get('Index Name', plan.get('Relation Name', ''))}".strip())
+    for child in plan.get("Plans", []):
+        found.extend(scans(child))
+    return found
+
+
+async def measure(engine, params, repeat: int, show_plans: bool):
+    """Median execution time, buffers and scans of every query."""
+    results = {}
+    async with engine.connect() as conn:
+        await conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        for name, query in QUERIES:
+            times = []
+            for _ in range(repeat):
+                result = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}"), params)
+                explain = result.scalar()
+                explain = json.loads(explain) if isinstance(explain, str) else explain
+                times.append(explain[0]["Execution Time"])
+            plan = explain[0]["Plan"]
+            results[name] = {
+                "ms": statistics.median(times),
+                "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+                "scans": scans(plan),
+            }
+            if show_plans:
+                result = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), params)
+                print(f"\n-- {name}\n" + "\n".join(row[0] for row in result.all()))
+    return results
+
+
+def print_report(before, after):
+    print()
+    print(f"{'query':<28} {'before ms':>10} {'after ms':>10} {'speedup':>8} {'buffers':>16}")
+    print("-" * 76)
+    for name, _ in QUERIES:
+        b, a = before[name], after[name]
+        speedup = b["ms"] / a["ms"] if a["ms"] else float("inf")
+        print(f"{name:<28} {b['ms']:>10.3f} {a['ms']:>10.3f} {speedup:>7.1f}x {b['buffers']:>7} → {a['buffers']:<7}")
+        print(f"{'':<28} before: {', '.join(b['scans'])}")
+        print(f"{'':<28} after:  {', '.join(a['scans'])}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--run-logs", type=int, default=2000000)
+    parser.add_argument("--repeat", type=int, default=5, help="EXPLAIN ANALYZE runs per query (median is reported)")
+    parser.add_argument("--plans", action="store_true", help="Print the full plans")
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {SCHEMA} schema")
+    args = parser.parse_args()
+    
+    engine = create_async_engine(settings.DATABASE_URL)
+    before_indexes, after_indexes = load_index_plan()
+    params = {"user_id": args.users // 2, "after": args.users // 3, "since_id": args.run_logs // 2}
+    try:
+        await build_schema(engine, args.users, args.run_logs, after_indexes)
+        
+        print("Measuring with single-column indexes...")
+        await apply_indexes(engine, [], before_indexes)
+        before = await measure(engine, params, args.repeat, args.plans)
+        
+        print("Measuring with composite indexes...")
+        await apply_indexes(engine, before_indexes, after_indexes)
+        after = await measure(engine, params, args.repeat, args.plans)
+        
+        print_report(before, after)
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""Baseline schema (tables created by init_db's create_all before migrations)
+
+Databases created by create_all are stamped at this revision by init_db and
+then upgraded from here.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "business_profiles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("business_type", sa.String(255), nullable=False),
+        sa.Column("products", sa.JSON(), nullable=True),
+        sa.Column("tone", sa.String(255), nullable=True),
+        sa.Column("daily_goal", sa.String(500), nullable=True),
+        sa.Column("keywords", sa.JSON(), nullable=True),
+    )
+    op.create_index("ix_business_profiles_id", "business_profiles", ["id"])
+    op.create_index("ix_business_profiles_user_id", "business_profiles", ["user_id"])
+    
+    op.create_table(
+        "leads",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("customer_name", sa.String(255), nullable=False),
+        sa.Column("stage", sa.String(255), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_leads_id", "leads", ["id"])
+    op.create_index("ix_leads_user_id", "leads", ["user_id"])
+    
+    op.create_table(
+        "tasks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(255), nullable=False),
+        sa.Column("status", sa.String(255), nullable=True),
+        sa.Column("due_date", sa.Date(), nullable=False),
+    )
+    op.create_index("ix_tasks_id", "tasks", ["id"])
+    op.create_index("ix_tasks_user_id", "tasks", ["user_id"])
+    
+    op.create_table(
+        "sales",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("customer", sa.String(255), nullable=False),
+        sa.Column("product", sa.String(255), nullable=False),
+        sa.Column("status", sa.String(255), nullable=True),
+        sa.Column("reason_failed", sa.String(500), nullable=True),
+    )
+    op.create_index("ix_sales_id", "sales", ["id"])
+    op.create_index("ix_sales_user_id", "sales", ["user_id"])
+    
+    op.create_table(
+        "targets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("product", sa.String(255), nullable=False),
+        sa.Column("target", sa.Integer(), nullable=False),
+        sa.Column("achieved", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_targets_id", "targets", ["id"])
+    op.create_index("ix_targets_user_id", "targets", ["user_id"])
+    
+    op.create_table(
+        "agent_run_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("agent_type", sa.String(50), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_agent_run_logs_id", "agent_run_logs", ["id"])
+    op.create_index("ix_agent_run_logs_user_id", "agent_run_logs", ["user_id"])
+    op.create_index("ix_agent_run_logs_agent_type", "agent_run_logs", ["agent_type"])
+    op.create_index("ix_agent_run_logs_created_at", "agent_run_logs", ["created_at"])
+
+
+def downgrade() -> None:
+    for table in ("agent_run_logs", "targets", "sales", "tasks", "leads", "business_profiles"):
+        op.drop_table(table)
@@ -0,0 +1,83 @@
+"""Scheduling columns and tables: profile timezone/version, structured payloads,
+scheduler lease, agent job queue and activity index
+
+Revision ID: 0002_scheduling_tables
+Revises: 0001_baseline
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002_scheduling_tables"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("business_profiles", sa.Column("timezone", sa.String(64), nullable=False, server_default="UTC"))
+    op.add_column("business_profiles", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+    op.create_index("ix_business_profiles_timezone", "business_profiles", ["timezone"])
+    op.add_column("tasks", sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()))
+    op.add_column("agent_run_logs", sa.Column("payload", sa.JSON(none_as_null=True), nullable=True))
+    
+    op.create_table(
+        "scheduler_leases",
+        sa.Column("name", sa.String(100), primary_key=True),
+        sa.Column("holder_id", sa.String(255), nullable=False),
+        sa.Column("acquired_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("renewed_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    
+    op.create_table(
+        "agent_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("agent_type", sa.String(50), nullable=False),
+        sa.Column("slot", sa.String(100), nullable=False),
+        sa.Column("idempotency_key", sa.String(255), nullable=False, unique=True),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_after", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("locked_by", sa.String(255), nullable=True),
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_agent_jobs_id", "agent_jobs", ["id"])
+    op.create_index("ix_agent_jobs_user_id", "agent_jobs", ["user_id"])
+    op.create_index("ix_agent_jobs_status_run_after", "agent_jobs", ["status", "run_after"])
+    op.create_index("ix_agent_jobs_status_locked_until", "agent_jobs", ["status", "locked_until"])
+    
+    op.create_table(
+        "user_activity",
+        sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_lead_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_task_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_active_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("tier", sa.String(20), nullable=False, server_default="daily"),
+    )
+    op.create_index("ix_user_activity_tier", "user_activity", ["tier"])
+    
+    op.create_table(
+        "activity_cursors",
+        sa.Column("source", sa.String(50), primary_key=True),
+        sa.Column("high_water_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    for table in ("activity_cursors", "user_activity", "agent_jobs", "scheduler_leases"):
+        op.drop_table(table)
+    op.drop_column("agent_run_logs", "payload")
+    op.drop_column("tasks", "updated_at")
+    op.drop_index("ix_business_profiles_timezone", table_name="business_profiles")
+    op.drop_column("business_profiles", "version")
+    op.drop_column("business_profiles", "timezone")
@@ -0,0 +1,75 @@
+"""Composite and covering indexes matching the crud access paths
+
+Every per-user read filters on user_id and sorts (or matches) a second column,
+and the activity index scans recent rows by time. The single-column user_id
+indexes are replaced by (user_id, <sort column>) indexes, which serve the same
+lookups. Indexes are built with CREATE INDEX CONCURRENTLY so large tables stay
+writable during the migration.
+
+Revision ID: 0003_composite_indexes
+Revises: 0002_scheduling_tables
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0003_composite_indexes"
+down_revision: Union[str, None] = "0002_scheduling_tables"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, table, key columns, covered columns, single-column index it replaces)
+INDEXES = [
+    # get_recent_agent_runs / chat history: WHERE user_id = ? ORDER BY created_at DESC LIMIT n
+    ("ix_agent_run_logs_user_id_created_at", "agent_run_logs", ["user_id", "created_at"], [],
+     ("ix_agent_run_logs_user_id", ["user_id"])),
+    # Activity refresh: WHERE agent_type = 'USER_MESSAGE' AND created_at > ? GROUP BY user_id (index-only)
+    ("ix_agent_run_logs_agent_type_created_at", "agent_run_logs", ["agent_type", "created_at"], ["user_id"],
+     ("ix_agent_run_logs_agent_type", ["agent_type"])),
+    # get_leads: WHERE user_id = ? ORDER BY updated_at DESC
+    ("ix_leads_user_id_updated_at", "leads", ["user_id", "updated_at"], [],
+     ("ix_leads_user_id", ["user_id"])),
+    # Activity refresh: WHERE updated_at > ? GROUP BY user_id (index-only)
+    ("ix_leads_updated_at", "leads", ["updated_at"], ["user_id"], None),
+    # get_sales_updates: WHERE user_id = ? ORDER BY id DESC
+    ("ix_sales_user_id_id", "sales", ["user_id", "id"], [],
+     ("ix_sales_user_id", ["user_id"])),
+    # get_today_tasks: WHERE user_id = ? AND due_date = ?, covering every selected column
+    ("ix_tasks_user_id_due_date", "tasks", ["user_id", "due_date"], ["id", "title", "status", "updated_at"],
+     ("ix_tasks_user_id", ["user_id"])),
+    # Activity refresh: WHERE updated_at > ? GROUP BY user_id (index-only)
+    ("ix_tasks_updated_at", "tasks", ["updated_at"], ["user_id"], None),
+    # get_active_user_ids: WHERE timezone IN (...) AND user_id > ? ORDER BY user_id LIMIT n
+    ("ix_business_profiles_timezone_user_id", "business_profiles", ["timezone", "user_id"], [],
+     ("ix_business_profiles_timezone", ["timezone"])),
+    # get_dead_agent_jobs: WHERE status = 'dead' ORDER BY updated_at DESC LIMIT n
+    ("ix_agent_jobs_status_updated_at", "agent_jobs", ["status", "updated_at"], [], None),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, include, replaces in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_include=include,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+            if replaces is not None:
+                op.drop_index(replaces[0], table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _, replaces in reversed(INDEXES):
+            if replaces is not None:
+                op.create_index(
+                    replaces[0], table, replaces[1],
+                    postgresql_concurrently=True,
+                    if_not_exists=True
+                )
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,52 @@
+"""Keyset index for paging through chat history
+
+History pages are cut on (created_at, id) within a user, so the id tie-breaker
+joins the key: a page is one index range scan at any depth. Replaces
+ix_agent_run_logs_user_id_created_at, whose lookups the new index also serves.
+
+Revision ID: 0004_history_keyset_index
+Revises: 0003_composite_indexes
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0004_history_keyset_index"
+down_revision: Union[str, None] = "0003_composite_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, table, key columns, covered columns, index it replaces)
+INDEXES = [
+    # get_recent_agent_runs: WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+    ("ix_agent_run_logs_user_id_created_at_id", "agent_run_logs", ["user_id", "created_at", "id"], [],
+     ("ix_agent_run_logs_user_id_created_at", ["user_id", "created_at"])),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, include, replaces in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_include=include,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+            if replaces is not None:
+                op.drop_index(replaces[0], table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _, replaces in reversed(INDEXES):
+            if replaces is not None:
+                op.create_index(
+                    replaces[0], table, replaces[1],
+                    postgresql_concurrently=True,
+                    if_not_exists=True
+                )
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,58 @@
+"""Chat heads: latest agent run log ID per user, for history ETags
+
+A statement-level trigger on agent_run_logs upserts the highest new ID of each
+user, so every writer (request path, log buffer, worker) keeps it current and
+a history revalidation reads one chat_heads row instead of the message table.
+Users are upserted in user_id order so concurrent batches lock rows in the
+same order.
+
+Revision ID: 0005_chat_heads
+Revises: 0004_history_keyset_index
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0005_chat_heads"
+down_revision: Union[str, None] = "0004_history_keyset_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "chat_heads",
+        sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("last_log_id", sa.Integer(), nullable=False),
+    )
+    op.execute("""
+        CREATE FUNCTION track_chat_heads() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO chat_heads (user_id, last_log_id)
+            SELECT user_id, max(id) FROM new_rows GROUP BY user_id ORDER BY user_id
+            ON CONFLICT (user_id) DO UPDATE
+                SET last_log_id = greatest(chat_heads.last_log_id, excluded.last_log_id);
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER agent_run_logs_chat_heads
+        AFTER INSERT ON agent_run_logs
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION track_chat_heads()
+    """)
+    # Existing history
+    op.execute("""
+        INSERT INTO chat_heads (user_id, last_log_id)
+        SELECT user_id, max(id) FROM agent_run_logs GROUP BY user_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS agent_run_logs_chat_heads ON agent_run_logs")
+    op.execute("DROP FUNCTION IF EXISTS track_chat_heads()")
+    op.drop_table("chat_heads")
@@ -0,0 +1,90 @@
+"""Progress rollups: per-user sum of target progress, kept by triggers on targets
+
+progress_rollups holds each user's sum of achieved * 100 / target (targets with
+target > 0) and target count. Statement-level triggers on targets add the
+change of every INSERT, UPDATE and DELETE as a delta, so concurrent writers for
+the same user add up instead of overwriting each other's recomputation.
+Postgres allows transition tables on single-event triggers only, hence one
+trigger per event over a shared function.
+
+Revision ID: 0006_progress_rollups
+Revises: 0005_chat_heads
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0006_progress_rollups"
+down_revision: Union[str, None] = "0005_chat_heads"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Progress of one targets row
+CONTRIBUTION = "CASE WHEN target > 0 THEN achieved * 100.0 / target ELSE 0 END"
+
+# Trigger event: (transition tables, rows the statement added (+1) and removed (-1))
+EVENTS = {
+    "INSERT": ("NEW TABLE AS new_rows", "SELECT 1 AS sign, * FROM new_rows"),
+    "DELETE": ("OLD TABLE AS old_rows", "SELECT -1 AS sign, * FROM old_rows"),
+    "UPDATE": (
+        "NEW TABLE AS new_rows OLD TABLE AS old_rows",
+        "SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1 AS sign, * FROM old_rows"
+    ),
+}
+
+APPLY_DELTAS = f"""
+            INSERT INTO progress_rollups (user_id, progress, targets)
+            SELECT user_id, sum(sign * {CONTRIBUTION}), sum(sign)
+            FROM ({{changes}}) AS changes
+            GROUP BY user_id
+            ORDER BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                progress = progress_rollups.progress + excluded.progress,
+                targets = progress_rollups.targets + excluded.targets,
+                updated_at = now();"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "progress_rollups",
+        sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("progress", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("targets", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    branches = "\n".join(
+        f"        {'IF' if i == 0 else 'ELSIF'} TG_OP = '{event}' THEN{APPLY_DELTAS.format(changes=changes)}"
+        for i, (event, (_, changes)) in enumerate(EVENTS.items())
+    )
+    op.execute(f"""
+        CREATE FUNCTION track_progress_rollups() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+{branches}
+        END IF;
+        RETURN NULL;
+        END
+        $$
+    """)
+    for event, (tables, _) in EVENTS.items():
+        op.execute(f"""
+            CREATE TRIGGER targets_progress_rollups_{event.lower()}
+            AFTER {event} ON targets
+            REFERENCING {tables}
+            FOR EACH STATEMENT EXECUTE FUNCTION track_progress_rollups()
+        """)
+    # Existing targets
+    op.execute(f"""
+        INSERT INTO progress_rollups (user_id, progress, targets)
+        SELECT user_id, sum({CONTRIBUTION}), count(*) FROM targets GROUP BY user_id
+    """)
+
+
+def downgrade() -> None:
+    for event in EVENTS:
+        op.execute(f"DROP TRIGGER IF EXISTS targets_progress_rollups_{event.lower()} ON targets")
+    op.execute("DROP FUNCTION IF EXISTS track_progress_rollups()")
+    op.drop_table("progress_rollups")
@@ -0,0 +1,157 @@
+"""Monthly range partitioning of agent_run_logs on created_at
+
+agent_run_logs becomes a table partitioned by month (agent_run_logs_pYYYYMM).
+The existing rows are not copied: the old table is attached as the partition
+agent_run_logs_legacy, covering everything before CUTOVER (the first month that
+starts at least a day after the migration), and later rows go to the monthly
+partitions. A validated CHECK constraint on the old table lets the attach skip
+its scan, and its unique (id, created_at) index is built concurrently
+beforehand and becomes its primary key, so writers are only blocked for the
+renames. The steps run outside the migration's transaction can be run again.
+
+The primary key becomes (id, created_at), as Postgres requires the partition
+key in unique constraints; IDs still come from agent_run_logs_id_seq. Rows
+past the monthly partitions go to agent_run_logs_default rather than failing.
+The chat_heads trigger moves to the partitioned table. Partitions past those
+created here are added, and old ones archived and dropped, by the
+partition_maintenance job (app/db/partitions.py).
+
+Revision ID: 0007_partition_agent_run_logs
+Revises: 0006_progress_rollups
+Create Date: 2026-10-19
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0007_partition_agent_run_logs"
+down_revision: Union[str, None] = "0006_progress_rollups"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    """First instant (UTC) of the month `months` after the one containing moment."""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+# Rows before CUTOVER stay in the old table; a day of margin so the month
+# can't roll over while the migration runs
+CUTOVER = month_start(datetime.now(timezone.utc) + timedelta(days=1), 1)
+# Monthly partitions created here, from CUTOVER on
+MONTHS_AHEAD = 3
+
+# Indexes of the partitioned table (name, definition); the old table's
+# equivalents are renamed with a _legacy infix and attached to them
+PARTITIONED_INDEXES = [
+    ("ix_agent_run_logs_created_at", "(created_at)"),
+    ("ix_agent_run_logs_user_id_created_at_id", "(user_id, created_at, id)"),
+    ("ix_agent_run_logs_agent_type_created_at", "(agent_type, created_at) INCLUDE (user_id)"),
+]
+# Covered by the new (id, created_at) primary key
+DROPPED_INDEX = "ix_agent_run_logs_id"
+
+CHAT_HEADS_TRIGGER = """
+    CREATE TRIGGER agent_run_logs_chat_heads
+    AFTER INSERT ON agent_run_logs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_chat_heads()
+"""
+
+
+def legacy_name(index: str) -> str:
+    return index.replace("ix_agent_run_logs_", "ix_agent_run_logs_legacy_")
+
+
+def upgrade() -> None:
+    cutover = CUTOVER.isoformat()
+    with op.get_context().autocommit_block():
+        # The partition key can't be NULL (the column always had a now() default)
+        op.execute("UPDATE agent_run_logs SET created_at = now() WHERE created_at IS NULL")
+        # Left by an earlier attempt that failed after this block
+        op.execute("ALTER TABLE agent_run_logs DROP CONSTRAINT IF EXISTS agent_run_logs_legacy_range")
+        op.execute(f"""
+            ALTER TABLE agent_run_logs ADD CONSTRAINT agent_run_logs_legacy_range
+            CHECK (created_at IS NOT NULL AND created_at < '{cutover}') NOT VALID
+        """)
+        op.execute("ALTER TABLE agent_run_logs VALIDATE CONSTRAINT agent_run_logs_legacy_range")
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS agent_run_logs_legacy_id_created_at
+            ON agent_run_logs (id, created_at)
+        """)
+    
+    op.execute("DROP TRIGGER IF EXISTS agent_run_logs_chat_heads ON agent_run_logs")
+    op.execute("ALTER TABLE agent_run_logs RENAME TO agent_run_logs_legacy")
+    for name, _ in PARTITIONED_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {legacy_name(name)}")
+    op.execute(f"DROP INDEX IF EXISTS {DROPPED_INDEX}")
+    # Proven by the validated CHECK constraint, without a scan
+    op.execute("ALTER TABLE agent_run_logs_legacy ALTER COLUMN created_at SET NOT NULL")
+    # A partition's primary key must match the parent's (id, created_at)
+    op.execute("ALTER TABLE agent_run_logs_legacy DROP CONSTRAINT agent_run_logs_pkey")
+    op.execute("""
+        ALTER TABLE agent_run_logs_legacy ADD CONSTRAINT agent_run_logs_legacy_pkey
+        PRIMARY KEY USING INDEX agent_run_logs_legacy_id_created_at
+    """)
+    
+    op.execute("""
+        CREATE TABLE agent_run_logs (
+            id integer NOT NULL DEFAULT nextval('agent_run_logs_id_seq'::regclass),
+            user_id integer NOT NULL,
+            agent_type varchar(50) NOT NULL,
+            message text NOT NULL,
+            payload json,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT agent_run_logs_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    for name, definition in PARTITIONED_INDEXES:
+        op.execute(f"CREATE INDEX {name} ON agent_run_logs {definition}")
+    op.execute("ALTER SEQUENCE agent_run_logs_id_seq OWNED BY agent_run_logs.id")
+    
+    op.execute(f"""
+        ALTER TABLE agent_run_logs ATTACH PARTITION agent_run_logs_legacy
+        FOR VALUES FROM (MINVALUE) TO ('{cutover}')
+    """)
+    op.execute("ALTER TABLE agent_run_logs_legacy DROP CONSTRAINT agent_run_logs_legacy_range")
+    for months in range(MONTHS_AHEAD):
+        start, end = month_start(CUTOVER, months), month_start(CUTOVER, months + 1)
+        op.execute(f"""
+            CREATE TABLE agent_run_logs_p{start:%Y%m} PARTITION OF agent_run_logs
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """)
+    op.execute("CREATE TABLE agent_run_logs_default PARTITION OF agent_run_logs DEFAULT")
+    op.execute(CHAT_HEADS_TRIGGER)
+
+
+def downgrade() -> None:
+    # Partitions already archived and dropped by retention are not restored
+    op.execute("DROP TRIGGER IF EXISTS agent_run_logs_chat_heads ON agent_run_logs")
+    op.execute("ALTER TABLE agent_run_logs RENAME TO agent_run_logs_partitioned")
+    op.execute("ALTER TABLE agent_run_logs_partitioned RENAME CONSTRAINT agent_run_logs_pkey TO agent_run_logs_partitioned_pkey")
+    for name, _ in PARTITIONED_INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name.replace('ix_agent_run_logs_', 'ix_agent_run_logs_partitioned_')}")
+    op.execute("""
+        CREATE TABLE agent_run_logs (
+            id integer NOT NULL DEFAULT nextval('agent_run_logs_id_seq'::regclass),
+            user_id integer NOT NULL,
+            agent_type varchar(50) NOT NULL,
+            message text NOT NULL,
+            payload json,
+            created_at timestamptz DEFAULT now(),
+            CONSTRAINT agent_run_logs_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO agent_run_logs (id, user_id, agent_type, message, payload, created_at)
+        SELECT id, user_id, agent_type, message, payload, created_at FROM agent_run_logs_partitioned
+    """)
+    op.execute("ALTER SEQUENCE agent_run_logs_id_seq OWNED BY agent_run_logs.id")
+    op.execute("DROP TABLE agent_run_logs_partitioned")
+    for name, definition in PARTITIONED_INDEXES:
+        op.execute(f"CREATE INDEX {name} ON agent_run_logs {definition}")
+    op.execute(f"CREATE INDEX {DROPPED_INDEX} ON agent_run_logs (id)")
+    op.execute(CHAT_HEADS_TRIGGER)
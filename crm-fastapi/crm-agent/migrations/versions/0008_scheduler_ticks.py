@@ -0,0 +1,33 @@
+"""Scheduler tick cursors: last tick each scheduled job evaluated
+
+A firing of a scheduled job evaluates every tick after its cursor, so the
+timezone buckets of a tick that fired late, was coalesced or was skipped are
+still run. Slots (and the job queue's idempotency keys) come from these ticks
+rather than from the wall clock.
+
+Revision ID: 0008_scheduler_ticks
+Revises: 0007_partition_agent_run_logs
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0008_scheduler_ticks"
+down_revision: Union[str, None] = "0007_partition_agent_run_logs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scheduler_ticks",
+        sa.Column("job_id", sa.String(100), primary_key=True),
+        sa.Column("last_tick", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduler_ticks")
@@ -0,0 +1,58 @@
+"""Index for replaying chat messages after an ID
+
+A reconnecting chat client asks for a user's messages after the last ID it
+saw (WHERE user_id = ? AND id > ? ORDER BY id). No index has user_id then id
+since the primary key became (id, created_at), so the query filtered every
+row of the user.
+
+agent_run_logs is partitioned (0007), which rules out CREATE INDEX
+CONCURRENTLY on it: the index is created on the parent only, built
+concurrently on each partition, and the partition indexes are attached to it.
+Partitions created later get it from the parent. A --sql script, which can't
+list the partitions, builds it on the parent in one locking statement.
+
+Revision ID: 0009_run_log_since_id_index
+Revises: 0008_scheduler_ticks
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision: str = "0009_run_log_since_id_index"
+down_revision: Union[str, None] = "0008_scheduler_ticks"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, table, key columns, covered columns, index it replaces)
+INDEXES = [
+    # get_recent_agent_runs(since_id=...): WHERE user_id = ? AND id > ? ORDER BY id
+    ("ix_agent_run_logs_user_id_id", "agent_run_logs", ["user_id", "id"], [], None),
+]
+
+PARTITIONS_SQL = "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:table AS regclass) ORDER BY 1"
+
+
+def upgrade() -> None:
+    for name, table, columns, include, _ in INDEXES:
+        definition = f"({', '.join(columns)})" + (f" INCLUDE ({', '.join(include)})" if include else "")
+        if context.is_offline_mode():
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}")
+            continue
+        partitions = op.get_bind().execute(sa.text(PARTITIONS_SQL), {"table": table}).scalars().all()
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}")
+            for partition in partitions:
+                partition_index = f"{partition}_{'_'.join(columns)}_idx"
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} {definition}")
+                # Valid once every partition's index is attached
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+
+
+def downgrade() -> None:
+    for name, table, _, _, _ in reversed(INDEXES):
+        # Drops the partitions' indexes with it
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,35 @@
+"""Scheduler reports: latest report of each scheduled job, shared by every process
+
+The scheduler runs in the worker processes (python -m app.worker) while the
+API processes serve /scheduler/*. Reports kept in the worker's memory (ex: the
+last run outcome of each job) were never visible to the API, so the worker
+stores them here and the API reads them back.
+
+Revision ID: 0010_scheduler_reports
+Revises: 0009_run_log_since_id_index
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0010_scheduler_reports"
+down_revision: Union[str, None] = "0009_run_log_since_id_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scheduler_reports",
+        sa.Column("kind", sa.String(50), primary_key=True),
+        sa.Column("job_id", sa.String(100), primary_key=True),
+        sa.Column("report", sa.JSON(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduler_reports")
@@ -0,0 +1,34 @@
+"""Scheduler load curve: runs started and peak concurrency per minute and process
+
+Runs happen in the worker processes, which have no HTTP server, so the load
+curve they record in memory was never visible to GET /scheduler/load. Each
+process now writes its per-minute buckets here.
+
+Revision ID: 0011_scheduler_load
+Revises: 0010_scheduler_reports
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0011_scheduler_load"
+down_revision: Union[str, None] = "0010_scheduler_reports"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scheduler_load",
+        sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("worker_id", sa.String(100), primary_key=True),
+        sa.Column("started", sa.Integer(), nullable=False),
+        sa.Column("peak_in_flight", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduler_load")
@@ -4,10 +4,30 @@ class ChatInterface {
         this.apiBase = window.location.origin;
         this.userId = 1;
         this.isLoading = false;
+        // Incremental refresh: the latest message ID shown and the ETag it came with
+        this.lastMessageId = 0;
+        this.historyEtag = null;
+        this.historyLoaded = false;
+        this.historyGeneration = 0;  // Bumped by every full load; stale refreshes drop their results
+        this.isRefreshing = false;
+        this.lastRefreshAt = 0;
+        this.refreshIntervalMs = 5000;
+        // New messages are pushed over a WebSocket; polling only runs as a fallback
+        this.socket = null;
+        this.pushConnected = false;
+        this.pushRefreshIntervalMs = 60000;
+        this.reconnectDelayMs = 1000;
         
         this.initializeElements();
         this.attachEventListeners();
         this.loadChatHistory();
+        setInterval(() => {
+            // While pushed to, refresh rarely to cover anything the socket missed
+            const interval = this.pushConnected ? this.pushRefreshIntervalMs : this.refreshIntervalMs;
+            if (Date.now() - this.lastRefreshAt >= interval) {
+                this.refreshHistory();
+            }
+        }, this.refreshIntervalMs);
     }
 
     initializeElements() {
@@ -64,6 +84,13 @@ class ChatInterface {
             }
         });
 
+        // Catch up as soon as the tab is visible again
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) {
+                this.refreshHistory();
+            }
+        });
+
         // Keyboard shortcuts
         this.messageInput.addEventListener('keydown', (e) => {
             if (e.key === 'Enter' && !e.shiftKey) {
@@ -122,6 +149,9 @@ class ChatInterface {
             // Add agent response
             this.addMessage('agent', data.message, data.agent_type || 'AGENT_RESPONSE');
             this.hideError();
+            if (!this.pushConnected) {
+                this.refreshHistory();
+            }
         } catch (error) {
             this.removeMessage(loadingId);
             this.showError(`Failed to send message: ${error.message}`);
@@ -163,6 +193,9 @@ class ChatInterface {
             // Add agent message
             this.addMessage('agent', data.message, data.agent_type);
             this.hideError();
+            if (!this.pushConnected) {
+                this.refreshHistory();
+            }
         } catch (error) {
             this.removeMessage(loadingId);
             this.showError(`Failed to trigger agent: ${error.message}`);
@@ -174,8 +207,12 @@ class ChatInterface {
     }
 
     async loadChatHistory() {
+        const generation = ++this.historyGeneration;
+        this.lastMessageId = 0;
+        this.historyEtag = null;
+        this.historyLoaded = false;
         try {
-            const response = await fetch(`${this.apiBase}/chat/history/${this.userId}?limit=50`);
+            const response = await fetch(`${this.apiBase}/chat/history/${this.userId}?limit=50`, { cache: 'no-store' });
             
             if (!response.ok) {
                 // If error, just show empty history instead of throwing
@@ -185,6 +222,8 @@ class ChatInterface {
             }
 
             const data = await response.json();
+            if (generation !== this.historyGeneration) return;
+            this.historyEtag = response.headers.get('ETag');
             
             // Clear existing messages (except welcome)
             const welcomeMsg = this.chatMessages.querySelector('.welcome-message');
@@ -195,11 +234,10 @@ class ChatInterface {
 
             // Add messages from history
             if (data.messages && data.messages.length > 0) {
-                data.messages.reverse().forEach(msg => {
-                    const role = msg.agent_type === 'USER_MESSAGE' ? 'user' : 'agent';
-                    this.addMessage(role, msg.message, msg.agent_type, msg.created_at);
-                });
+                data.messages.reverse().forEach(msg => this.addHistoryMessage(msg));
             }
+            this.historyLoaded = true;
+            this.connectPush();
             
             this.hideError();
         } catch (error) {
@@ -208,7 +246,95 @@ class ChatInterface {
         }
     }
 
-    addMessage(role, content, agentType, timestamp = null) {
+    async refreshHistory() {
+        // Fetch only the messages after the latest one shown; a 304 means nothing changed
+        if (!this.historyLoaded || this.isRefreshing || document.hidden) return;
+        this.isRefreshing = true;
+        this.lastRefreshAt = Date.now();
+        const generation = this.historyGeneration;
+        const limit = 50;
+
+        try {
+            let etag = this.historyEtag;
+            while (true) {
+                const response = await fetch(
+                    `${this.apiBase}/chat/history/${this.userId}?since_id=${this.lastMessageId}&limit=${limit}`,
+                    { headers: etag ? { 'If-None-Match': etag } : {}, cache: 'no-store' }
+                );
+                // History was reloaded (or the user switched) while this was in flight
+                if (generation !== this.historyGeneration || response.status === 304 || !response.ok) return;
+
+                const data = await response.json();
+                (data.messages || []).reverse().forEach(msg => this.addHistoryMessage(msg));
+
+                // A full page means more are waiting; the ETag only holds once caught up
+                if ((data.messages || []).length < limit) {
+                    this.historyEtag = response.headers.get('ETag');
+                    return;
+                }
+                etag = null;
+            }
+        } catch (error) {
+            console.warn('Warning: Could not refresh chat history:', error);
+        } finally {
+            this.isRefreshing = false;
+        }
+    }
+
+    connectPush() {
+        // Replace any socket of a previous user; it must not reconnect
+        if (this.socket) {
+            this.socket.onclose = null;
+            this.socket.close();
+            this.pushConnected = false;
+        }
+
+        const generation = this.historyGeneration;
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(
+            `${protocol}//${window.location.host}/ws/chat/${this.userId}?since_id=${this.lastMessageId}`
+        );
+        this.socket = socket;
+
+        socket.onopen = () => {
+            this.pushConnected = true;
+            this.reconnectDelayMs = 1000;
+        };
+        socket.onmessage = (event) => {
+            if (generation === this.historyGeneration) {
+                this.addHistoryMessage(JSON.parse(event.data));
+            }
+        };
+        socket.onclose = () => {
+            this.pushConnected = false;
+            this.socket = null;
+            // Reconnect with backoff; since_id replays what was missed, polling covers the wait
+            setTimeout(() => {
+                if (!this.socket && generation === this.historyGeneration) {
+                    this.connectPush();
+                }
+            }, this.reconnectDelayMs);
+            this.reconnectDelayMs = Math.min(this.reconnectDelayMs * 2, 30000);
+        };
+    }
+
+    addHistoryMessage(msg) {
+        this.lastMessageId = Math.max(this.lastMessageId, msg.id);
+        if (this.chatMessages.querySelector(`[data-message-id="${msg.id}"]`)) return;
+
+        const role = msg.agent_type === 'USER_MESSAGE' ? 'user' : 'agent';
+        // A message shown before it was saved: adopt it instead of showing it twice
+        const pending = Array.from(this.chatMessages.querySelectorAll(`.message.pending[data-role="${role}"]`))
+            .find(el => el.querySelector('.message-content').textContent === msg.message);
+        if (pending) {
+            pending.classList.remove('pending');
+            pending.dataset.messageId = msg.id;
+            return;
+        }
+        this.addMessage(role, msg.message, msg.agent_type, msg.created_at, msg.id);
+    }
+
+    addMessage(role, content, agentType, timestamp = null, savedId = null) {
         // Remove welcome message if it exists
         const welcomeMsg = this.chatMessages.querySelector('.welcome-message');
         if (welcomeMsg) {
@@ -218,6 +344,12 @@ class ChatInterface {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}`;
         messageDiv.setAttribute('data-role', role);
+        if (savedId !== null) {
+            messageDiv.dataset.messageId = savedId;
+        } else {
+            // Not saved yet: refreshHistory adopts it when the saved copy arrives
+            messageDiv.classList.add('pending');
+        }
         
         const messageId = `msg-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`;
         messageDiv.id = messageId;
@@ -0,0 +1,55 @@
+"""Unit tests for the prefetched agent context cache."""
+import pytest
+from unittest.mock import AsyncMock
+
+from app.agent import context as context_module
+from app.agent.context import AgentContext, ContextCache
+
+
+@pytest.fixture
+def load_context(monkeypatch):
+    """Replace context loading with a mock returning a fresh context per call."""
+    loader = AsyncMock(side_effect=lambda db, user_id: AgentContext(f"profile-{user_id}", [], [], []))
+    monkeypatch.setattr(context_module, "load_context", loader)
+    monkeypatch.setattr(context_module, "AsyncSessionLocal", lambda: AsyncMock())
+    return loader
+
+
+@pytest.mark.asyncio
+async def test_prefetched_context_is_used_once(load_context):
+    """Test a run consumes its prefetched context and the next run loads again."""
+    cache = ContextCache(ttl_seconds=60)
+    await cache.prefetch(1)
+    
+    first = await cache.get_or_load(None, 1)
+    second = await cache.get_or_load(None, 1)
+    
+    assert first.profile == "profile-1"
+    assert load_context.await_count == 2  # prefetch + second run
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["prefetched"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["prefetch_used_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_expired_context_is_reloaded(load_context):
+    """Test contexts older than the TTL are not served."""
+    cache = ContextCache(ttl_seconds=60)
+    await cache.prefetch(1)
+    cache._entries[1].loaded_at -= 61
+    
+    await cache.get_or_load(None, 1)
+    
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_evicts_least_recently_used():
+    """Test the cache stays bounded."""
+    cache = ContextCache(ttl_seconds=60, max_size=2)
+    for user_id in (1, 2, 3):
+        cache.put(user_id, AgentContext(None, [], [], []))
+    
+    assert cache.get(1) is None
+    assert cache.get(3) is not None
@@ -0,0 +1,53 @@
+"""Unit tests for the scheduler fan-out worker pool."""
+import asyncio
+import pytest
+
+from app.agent.fanout import fan_out
+
+
+async def stream(user_ids):
+    """Async iterator over user IDs."""
+    for user_id in user_ids:
+        yield user_id
+
+
+@pytest.mark.asyncio
+async def test_fan_out_bounds_concurrency():
+    """Test no more than `concurrency` handlers run at once."""
+    active = 0
+    peak = 0
+    seen = []
+    
+    async def handler(user_id):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        seen.append(user_id)
+        active -= 1
+    
+    summary = await fan_out("job", stream(range(1, 201)), handler, concurrency=8, user_timeout=1.0)
+    
+    assert summary.users_processed == 200
+    assert summary.failures == 0
+    assert sorted(seen) == list(range(1, 201))
+    assert peak <= 8
+
+
+@pytest.mark.asyncio
+async def test_fan_out_counts_failures_and_timeouts():
+    """Test failing and slow users are counted without stopping the others."""
+    async def handler(user_id):
+        if user_id == 2:
+            raise RuntimeError("boom")
+        if user_id == 3:
+            await asyncio.sleep(1)
+    
+    summary = await fan_out("job", stream([1, 2, 3, 4]), handler, concurrency=2, user_timeout=0.05)
+    
+    data = summary.to_dict()
+    assert data["users_processed"] == 4
+    assert data["failures"] == 2
+    assert data["timeouts"] == 1
+    assert sorted(data["failed_user_ids"]) == [2, 3]
+    assert data["wall_time_seconds"] >= 0
@@ -0,0 +1,125 @@
+"""Unit tests for the durable agent job queue."""
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from app.agent.job_queue import JobQueueWorker, backoff_seconds, make_slot, make_idempotency_key
+
+
+def make_job(attempts=1, max_attempts=3, agent_type="REMINDER"):
+    """Build a claimed job stand-in."""
+    return MagicMock(id=7, user_id=42, agent_type=agent_type, attempts=attempts, max_attempts=max_attempts, last_error=None)
+
+
+def make_worker(handler):
+    """Build a worker whose database calls are mocked."""
+    worker = JobQueueWorker(handlers={"REMINDER": handler}, worker_id="test-worker")
+    worker.complete = AsyncMock(return_value=True)
+    worker.fail = AsyncMock(return_value=True)
+    return worker
+
+
+def test_slot_and_idempotency_key():
+    """Test firings within the same minute share a slot and key."""
+    first = make_slot("morning_reminder", datetime(2026, 10, 19, 9, 0, 1, tzinfo=timezone.utc))
+    second = make_slot("morning_reminder", datetime(2026, 10, 19, 9, 0, 59, tzinfo=timezone.utc))
+    
+    assert first == second == "morning_reminder@2026-10-19T09:00"
+    assert make_idempotency_key(42, "REMINDER", first) == "42:REMINDER:morning_reminder@2026-10-19T09:00"
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    """Test backoff doubles per attempt, with jitter, up to the cap."""
+    monkeypatch.setattr("app.agent.job_queue.settings.JOB_RETRY_BASE_SECONDS", 10)
+    monkeypatch.setattr("app.agent.job_queue.settings.JOB_RETRY_MAX_SECONDS", 60)
+    
+    assert 5 <= backoff_seconds(1) <= 10
+    assert 20 <= backoff_seconds(3) <= 40
+    assert 30 <= backoff_seconds(10) <= 60
+
+
+@pytest.mark.asyncio
+async def test_execute_success_completes_job():
+    """Test a successful run marks the job succeeded."""
+    handler = AsyncMock()
+    worker = make_worker(handler)
+    
+    await worker.execute(make_job())
+    
+    handler.assert_awaited_once_with(42)
+    worker.complete.assert_awaited_once()
+    assert worker.stats()["succeeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_failure_retries_with_backoff():
+    """Test a failed attempt below max_attempts is rescheduled."""
+    worker = make_worker(AsyncMock(side_effect=RuntimeError("llm down")))
+    
+    await worker.execute(make_job(attempts=1, max_attempts=3))
+    
+    job, error, retry_in = worker.fail.await_args.args
+    assert error == "llm down"
+    assert retry_in is not None and retry_in > 0
+    assert worker.retried == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_last_attempt_dead_letters():
+    """Test the last failed attempt dead-letters the job."""
+    worker = make_worker(AsyncMock(side_effect=RuntimeError("llm down")))
+    
+    await worker.execute(make_job(attempts=3, max_attempts=3))
+    
+    assert worker.fail.await_args.args[2] is None
+    assert worker.dead_lettered == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_unknown_agent_type_dead_letters():
+    """Test jobs without a handler are dead-lettered without running."""
+    worker = make_worker(AsyncMock())
+    
+    await worker.execute(make_job(agent_type="UNKNOWN"))
+    
+    assert worker.fail.await_args.args[2] is None
+    worker.complete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_jobs_claimed_ahead_are_prefetched_and_held_until_due(monkeypatch):
+    """Test the prefetch stage warms the claimed jobs, consumers take them once due and stop releases the rest."""
+    class FakeSession:
+        async def __aenter__(self):
+            return None
+        
+        async def __aexit__(self, *exc):
+            return False
+    
+    now = datetime.now(timezone.utc)
+    due = MagicMock(id=1, user_id=10, agent_type="REMINDER", run_after=now - timedelta(seconds=1))
+    later = MagicMock(id=2, user_id=20, agent_type="REMINDER", run_after=now + timedelta(minutes=4))
+    claim = AsyncMock(side_effect=[[later, due], []])
+    release = AsyncMock(return_value=1)
+    monkeypatch.setattr("app.agent.job_queue.AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr("app.agent.job_queue.crud.claim_agent_jobs", claim)
+    monkeypatch.setattr("app.agent.job_queue.crud.release_agent_jobs", release)
+    prefetch = AsyncMock()
+    worker = JobQueueWorker(
+        handlers={"REMINDER": AsyncMock()},
+        worker_id="test-worker",
+        prefetch=prefetch,
+        prefetch_lead_seconds=300
+    )
+    
+    assert await worker.claim_ahead() == 2
+    assert claim.await_args.kwargs["ahead_seconds"] == 300
+    prefetch.assert_awaited_once_with([later, due])
+    
+    assert await worker.claim() is due
+    assert await worker.claim() is None  # The held job is not due yet and the queue is empty
+    assert worker.stats()["held"] == 1
+    
+    await worker.stop()
+    assert release.await_args.args[1:] == ([2], "test-worker")
+    assert worker.stats()["held"] == 0
@@ -0,0 +1,53 @@
+"""Unit tests for scheduler leader election."""
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.agent.leader import LeaderElector
+
+
+def make_elector(*lease_results):
+    """Build an elector whose successive acquire attempts return the given results."""
+    on_elected = MagicMock()
+    on_demoted = AsyncMock()
+    elector = LeaderElector(holder_id="test-holder", on_elected=on_elected, on_demoted=on_demoted)
+    elector.try_acquire = AsyncMock(side_effect=list(lease_results))
+    elector.release = AsyncMock()
+    return elector, on_elected, on_demoted
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_transitions():
+    """Test callbacks fire only on leadership changes."""
+    elector, on_elected, on_demoted = make_elector(False, True, True, False)
+    
+    assert await elector.heartbeat() is False
+    assert await elector.heartbeat() is True
+    assert await elector.heartbeat() is True
+    assert on_elected.call_count == 1
+    
+    assert await elector.heartbeat() is False
+    on_demoted.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_error_steps_down():
+    """Test a leader that cannot renew its lease steps down."""
+    elector, _, on_demoted = make_elector(True, RuntimeError("db down"))
+    
+    await elector.heartbeat()
+    assert await elector.heartbeat() is False
+    on_demoted.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_stop_releases_lease():
+    """Test stopping a leader demotes it and releases the lease."""
+    elector, _, on_demoted = make_elector(True)
+    await elector.heartbeat()
+    
+    await elector.stop()
+    
+    assert elector.is_leader is False
+    elector.release.assert_awaited_once()
+    on_demoted.assert_awaited_once()
+    assert elector.status()["holder_id"] == "test-holder"
@@ -0,0 +1,64 @@
+"""Unit tests for deadline-bounded and hedged LLM calls."""
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+
+from app.agent.llm_calls import race_attempts, create_chat_completion, deadline_scope, remaining_seconds
+from app.core.exceptions import LLMTimeoutError
+
+
+def make_client(*delays):
+    """Build a client whose successive calls complete after the given delays."""
+    calls = []
+    
+    async def create(**kwargs):
+        index = len(calls)
+        calls.append(kwargs)
+        await asyncio.sleep(delays[index])
+        return f"response-{index}"
+    
+    client = MagicMock()
+    client.chat.completions.create = create
+    return client, calls
+
+
+@pytest.mark.asyncio
+async def test_race_attempts_hedge_wins():
+    """Test a hedged attempt wins when the primary is slow."""
+    client, calls = make_client(1.0, 0.01)
+    
+    result, winner, hedged = await race_attempts(
+        lambda: client.chat.completions.create(), timeout=2.0, hedge_delay=0.05
+    )
+    
+    assert result == "response-1"
+    assert winner == 1
+    assert hedged is True
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_race_attempts_no_hedge_when_fast():
+    """Test no hedge is sent when the primary finishes before the hedge delay."""
+    client, calls = make_client(0.01)
+    
+    result, winner, hedged = await race_attempts(
+        lambda: client.chat.completions.create(), timeout=2.0, hedge_delay=0.5
+    )
+    
+    assert (result, winner, hedged) == ("response-0", 0, False)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_respects_request_deadline():
+    """Test the request deadline bounds the call and is passed as the client timeout."""
+    client, calls = make_client(1.0)
+    
+    with deadline_scope(0.05):
+        assert 0 < remaining_seconds() <= 0.05
+        with pytest.raises(LLMTimeoutError):
+            await create_chat_completion(client, model="test-model", messages=[])
+    
+    assert remaining_seconds() is None
+    assert calls[0]["timeout"] <= 0.05
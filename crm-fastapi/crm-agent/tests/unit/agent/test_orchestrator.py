@@ -0,0 +1,127 @@
+"""Unit tests for AgentOrchestrator."""
+import json
+import pytest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.agent.orchestrator import AgentOrchestrator, BATCH_ANALYSIS_MAX_TOKENS, json_mode
+
+
+def make_completion(content):
+    """Build a chat completion stand-in with a single choice."""
+    completion = MagicMock()
+    completion.choices = [MagicMock(message=MagicMock(content=content))]
+    return completion
+
+
+def make_tasks(count):
+    """Build task stand-ins."""
+    return [
+        MagicMock(id=i, title=f"Task {i}", status="pending", due_date=date(2024, 1, 15))
+        for i in range(1, count + 1)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_analyze_tasks_batch_splits_by_token_budget(mock_db):
+    """Test tasks are analyzed in as few LLM calls as fit the batch token budget."""
+    orchestrator = AgentOrchestrator()
+    tasks = make_tasks(30)
+    content = json.dumps({
+        "recommendations": [
+            {"task_id": task.id, "recommendation": f"Do {task.title}", "priority": "High", "next_action": "Call"}
+            for task in tasks
+        ]
+    })
+    orchestrator.client = MagicMock()
+    orchestrator.client.chat.completions.create = AsyncMock(return_value=make_completion(content))
+
+    with patch('app.db.crud.get_business_profile', AsyncMock(return_value=None)):
+        analyses = await orchestrator.analyze_tasks_batch(mock_db, 1, tasks)
+
+    calls = orchestrator.client.chat.completions.create.call_args_list
+    assert len(calls) == 2
+    assert all(call.kwargs["max_tokens"] <= BATCH_ANALYSIS_MAX_TOKENS for call in calls)
+    assert "[id=30]" in calls[1].kwargs["messages"][1]["content"]
+    assert len(analyses) == 30
+    assert analyses["7"].recommendation == "Do Task 7"
+    assert analyses["7"].priority == "high"
+
+
+@pytest.mark.asyncio
+async def test_analyze_tasks_batch_missing_and_invalid(mock_db):
+    """Test tasks missing from the response, invalid entries or unparsable output map to None."""
+    orchestrator = AgentOrchestrator()
+    tasks = make_tasks(3)
+    content = json.dumps({"recommendations": [
+        {"task_id": "1", "recommendation": "Call"},
+        {"task_id": "2", "recommendation": "Visit", "priority": "urgent"}
+    ]})
+    orchestrator.client = MagicMock()
+    orchestrator.client.chat.completions.create = AsyncMock(return_value=make_completion(content))
+
+    with patch('app.db.crud.get_business_profile', AsyncMock(return_value=None)):
+        analyses = await orchestrator.analyze_tasks_batch(mock_db, 1, tasks)
+        assert analyses["1"].recommendation == "Call"
+        assert analyses["1"].priority == "medium"
+        assert analyses["2"] is None
+        assert analyses["3"] is None
+
+        orchestrator.client.chat.completions.create.return_value = make_completion("not json")
+        analyses = await orchestrator.analyze_tasks_batch(mock_db, 1, tasks)
+        assert analyses == {"1": None, "2": None, "3": None}
+
+
+@pytest.mark.asyncio
+async def test_analyze_tasks_batch_empty(mock_db):
+    """Test no LLM call is made without tasks."""
+    orchestrator = AgentOrchestrator()
+    orchestrator.client = MagicMock()
+    orchestrator.client.chat.completions.create = AsyncMock()
+
+    assert await orchestrator.analyze_tasks_batch(mock_db, 1, []) == {}
+    orchestrator.client.chat.completions.create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_analyze_task_structured_mode(mock_db):
+    """Test structured task analysis is validated and uses JSON mode."""
+    orchestrator = AgentOrchestrator()
+    content = json.dumps({"recommendation": "Send the quote", "priority": "low", "next_action": "Email Sara"})
+    orchestrator.client = MagicMock()
+    orchestrator.client.chat.completions.create = AsyncMock(return_value=make_completion(content))
+
+    with patch('app.db.crud.get_business_profile', AsyncMock(return_value=None)):
+        result = await orchestrator.analyze_task(mock_db, 1, "Send quote", structured=True)
+
+        assert result.next_action == "Email Sara"
+        kwargs = orchestrator.client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"] == {"type": "json_object"}
+
+        orchestrator.client.chat.completions.create.return_value = make_completion('{"priority": "low"}')
+        assert await orchestrator.generate_sales_followup(mock_db, 1, "Sara", "Milk", "lost", structured=True) is None
+
+
+def test_json_mode_only_for_models_that_support_it():
+    """Test response_format is left out for gpt-4, whose API rejects JSON mode."""
+    assert json_mode("gpt-4") == {}
+    assert json_mode("gpt-4-0613") == {}
+    assert json_mode("gpt-4o-mini") == {"response_format": {"type": "json_object"}}
+    assert json_mode("gpt-4-turbo") == {"response_format": {"type": "json_object"}}
+
+
+@pytest.mark.asyncio
+async def test_analyze_tasks_batch_without_json_mode(mock_db):
+    """Test a fenced JSON answer of a model without JSON mode is still parsed."""
+    orchestrator = AgentOrchestrator()
+    orchestrator.model = "gpt-4"
+    content = '```json\n{"recommendations": [{"task_id": 1, "recommendation": "Call"}]}\n```'
+    orchestrator.client = MagicMock()
+    orchestrator.client.chat.completions.create = AsyncMock(return_value=make_completion(content))
+
+    with patch('app.db.crud.get_business_profile', AsyncMock(return_value=None)):
+        analyses = await orchestrator.analyze_tasks_batch(mock_db, 1, make_tasks(1))
+
+    assert analyses["1"].recommendation == "Call"
+    assert "response_format" not in orchestrator.client.chat.completions.create.call_args.kwargs
+
@@ -0,0 +1,75 @@
+"""Unit tests for compiled prompt fragments."""
+import pytest
+from unittest.mock import MagicMock
+
+from app.agent import prompts
+from app.agent.prompts import (
+    get_system_prompt,
+    get_agent_prompt,
+    invalidate_profile_fragments,
+    clear_fragment_cache
+)
+
+
+def make_profile(user_id=1, version=1, tone="friendly"):
+    """Build a business profile stand-in."""
+    return MagicMock(
+        user_id=user_id,
+        version=version,
+        business_type="cheese",
+        products=["cheese", "milk"],
+        tone=tone,
+        daily_goal="sell 20 cheese blocks",
+        keywords=["target"]
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start every test with an empty fragment cache."""
+    clear_fragment_cache()
+    yield
+    clear_fragment_cache()
+
+
+def test_system_prompt_is_cached_per_profile_version():
+    """Test the system prompt is rendered once per profile version."""
+    profile = make_profile()
+
+    first = get_system_prompt(profile)
+    profile.tone = "strict"  # In-place change without a version bump is not seen
+    second = get_system_prompt(profile)
+
+    assert first == second
+    assert "Tone: friendly" in first
+
+    profile.version = 2
+    third = get_system_prompt(profile)
+    assert "Tone: strict" in third
+
+
+def test_invalidate_profile_fragments_drops_user_entries():
+    """Test invalidation only drops the written user's fragments."""
+    get_system_prompt(make_profile(user_id=1))
+    get_agent_prompt("NURTURE", make_profile(user_id=1), [], [])
+    get_system_prompt(make_profile(user_id=2))
+
+    removed = invalidate_profile_fragments(1)
+
+    assert removed == 2
+    assert all(key[0] == 2 for key in prompts._fragment_cache)
+
+
+def test_agent_prompts_without_profile_are_not_cached():
+    """Test prompts without a profile render without touching the cache."""
+    prompt = get_agent_prompt("REMINDER", None, [], [])
+
+    assert "Business Type: Not specified" in prompt
+    assert len(prompts._fragment_cache) == 0
+
+
+def test_closure_prompt_renders_placeholders():
+    """Test CLOSURE prompt keeps the customer placeholders literal."""
+    prompt = get_agent_prompt("CLOSURE", make_profile(), [], [])
+
+    assert '"Call customer {customer_name}"' in prompt
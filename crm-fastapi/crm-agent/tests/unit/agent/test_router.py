@@ -0,0 +1,64 @@
+"""Unit tests for ModelRouter."""
+from app.agent.router import ModelRouter, ModelRoute, percentile
+
+
+def make_router(**kwargs):
+    """Build a router with distinct models per tier."""
+    routes = {
+        "fast": ModelRoute("fast", "fast-model", 300, 1000),
+        "standard": ModelRoute("standard", "standard-model", 500, 2000),
+        "complex": ModelRoute("complex", "complex-model", 800, 4000),
+    }
+    return ModelRouter(routes=routes, min_samples=5, **kwargs)
+
+
+def test_classify_by_heuristics():
+    """Test tier classification from length, data questions and agent type."""
+    router = make_router()
+    
+    assert router.classify(message="hi there") == "fast"
+    assert router.classify(message="How many leads do I have?") == "standard"
+    assert router.classify(message="Compare my sales this week " + "with last week " * 10) == "complex"
+    assert router.classify(message="x" * 700) == "complex"
+    assert router.classify(agent_type="REMINDER") == "fast"
+    assert router.classify(agent_type="CLOSURE") == "standard"
+
+
+def test_route_fails_over_on_slo_breach():
+    """Test a tier breaching its p95 SLO routes to the next faster tier."""
+    router = make_router(probe_every=1000)
+    
+    assert router.route(message="x" * 700).model == "complex-model"
+    
+    for _ in range(5):
+        router.record("complex", 9000)
+    assert router.route(message="x" * 700).model == "standard-model"
+    
+    for _ in range(5):
+        router.record("standard", 9000)
+    assert router.route(message="x" * 700).model == "fast-model"
+    assert router.stats()["complex"]["failovers"] == 2
+
+
+def test_route_probes_breaching_tier():
+    """Test every Nth request still goes to a breaching tier so it can recover."""
+    router = make_router(probe_every=3)
+    for _ in range(5):
+        router.record("complex", 9000)
+    
+    models = [router.route(message="x" * 700).model for _ in range(3)]
+    
+    assert models == ["standard-model", "standard-model", "complex-model"]
+
+
+def test_stats_percentiles():
+    """Test p50/p95 reporting."""
+    router = make_router()
+    for latency in range(1, 101):
+        router.record("fast", latency)
+    
+    stats = router.stats()["fast"]
+    
+    assert stats["p50_ms"] == 50
+    assert stats["p95_ms"] == 95
+    assert percentile([], 50) is None
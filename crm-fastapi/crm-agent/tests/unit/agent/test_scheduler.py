@@ -0,0 +1,238 @@
+"""Unit tests for scheduled job registration."""
+import pickle
+import pytest
+from datetime import datetime, timedelta, timezone
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from unittest.mock import AsyncMock, MagicMock
+
+from app.agent import context as context_module
+from app.agent import scheduler as scheduler_module
+from app.modules.agent.dto.agent_dto import AgentRecommendation
+
+
+@pytest.fixture
+async def paused_scheduler(monkeypatch):
+    """Replace the module scheduler with a fresh, paused in-memory one."""
+    fresh = AsyncIOScheduler(timezone="UTC")
+    fresh.start(paused=True)
+    monkeypatch.setattr(scheduler_module, "scheduler", fresh)
+    yield fresh
+    fresh.shutdown(wait=False)
+
+
+async def test_register_jobs_keeps_stored_next_run_time(paused_scheduler):
+    """Test re-registering keeps the stored next run so a missed run is caught up."""
+    scheduler_module.register_jobs()
+    overdue = datetime.now(timezone.utc) - timedelta(minutes=5)
+    paused_scheduler.modify_job("morning_reminder", next_run_time=overdue)
+    
+    scheduler_module.register_jobs()
+    
+    job = paused_scheduler.get_job("morning_reminder")
+    assert job.next_run_time == overdue
+    assert job.coalesce == scheduler_module.settings.SCHEDULER_COALESCE
+    assert job.misfire_grace_time == scheduler_module.settings.SCHEDULER_MISFIRE_GRACE_SECONDS
+
+
+async def test_register_jobs_reschedules_changed_trigger_and_drops_stale(paused_scheduler):
+    """Test a changed trigger is rescheduled and undefined jobs are removed."""
+    paused_scheduler.add_job(scheduler_module.run_agent_job, CronTrigger(hour=8), args=["follow_up", "FOLLOW_UP"], id="follow_up")
+    paused_scheduler.add_job(scheduler_module.run_agent_job, CronTrigger(hour=7), args=["old", "REMINDER"], id="old_job")
+    
+    scheduler_module.register_jobs()
+    
+    assert paused_scheduler.get_job("old_job") is None
+    assert str(paused_scheduler.get_job("follow_up").trigger) == str(scheduler_module.tick_trigger())
+    assert {job.id for job in paused_scheduler.get_jobs()} == {job[0] for job in scheduler_module.job_definitions()}
+
+
+async def test_scheduled_jobs_are_read_from_the_job_store(paused_scheduler, monkeypatch):
+    """Test the jobs come from the stored job states, tick cursors and stored last runs, not this process."""
+    scheduler_module.register_jobs()
+    job = paused_scheduler.get_job("morning_reminder")
+    tick = datetime(2026, 10, 19, 9, tzinfo=timezone.utc)
+    last_run = {"scheduled_run_time": tick.isoformat(), "status": "executed", "error": None}
+    monkeypatch.setattr(scheduler_module.crud, "get_stored_jobs", AsyncMock(return_value=[
+        (job.id, pickle.dumps(job.__getstate__()))
+    ]))
+    monkeypatch.setattr(scheduler_module.crud, "get_scheduler_ticks", AsyncMock(return_value={job.id: tick}))
+    monkeypatch.setattr(scheduler_module.crud, "get_scheduler_reports", AsyncMock(return_value={job.id: last_run}))
+    paused_scheduler.remove_all_jobs()
+    
+    jobs = await scheduler_module.get_scheduled_jobs(None)
+    
+    assert jobs == [{
+        "id": "morning_reminder",
+        "name": job.name,
+        "trigger": str(scheduler_module.tick_trigger()),
+        "next_run_time": job.next_run_time.isoformat(),
+        "coalesce": scheduler_module.settings.SCHEDULER_COALESCE,
+        "misfire_grace_time": scheduler_module.settings.SCHEDULER_MISFIRE_GRACE_SECONDS,
+        "last_tick": tick.isoformat(),
+        "last_run": last_run,
+    }]
+
+
+async def test_run_agent_job_serves_tiers_and_reports_saved_runs(monkeypatch):
+    """Test daily jobs only run the daily tier and count skipped weekly/paused users as saved."""
+    fanned_out = []
+    reports = {}
+    
+    async def fake_tier_counts(db, timezones=None):
+        return {"daily": 70, "weekly": 20, "paused": 10}
+    
+    async def fake_get_report(db, kind, job_id):
+        return reports.get((kind, job_id))
+    
+    async def fake_save_report(kind, job_id, report):
+        reports[(kind, job_id)] = report
+    
+    async def fake_fan_out_job(job_id, handler, timezones=None, tiers=None):
+        fanned_out.append((job_id, tiers))
+    
+    monkeypatch.setattr(scheduler_module.crud, "count_users_by_tier", fake_tier_counts)
+    monkeypatch.setattr(scheduler_module, "fan_out_job", fake_fan_out_job)
+    monkeypatch.setattr(scheduler_module, "LOCAL_SCHEDULES", {})
+    monkeypatch.setattr(scheduler_module.crud, "get_scheduler_report", fake_get_report)
+    monkeypatch.setattr(scheduler_module, "save_report", fake_save_report)
+    monkeypatch.setattr(scheduler_module.settings, "JOB_QUEUE_ENABLED", False)
+    monkeypatch.setattr(scheduler_module.settings, "ACTIVITY_TIERS_ENABLED", True)
+    tick = datetime(2026, 10, 19, 9, tzinfo=timezone.utc)
+    
+    await scheduler_module.run_agent_tick("morning_reminder", "REMINDER", tick)
+    await scheduler_module.run_agent_tick("morning_reminder", "REMINDER", tick)
+    await scheduler_module.run_agent_tick("weekly_checkin", "REMINDER", tick)
+    
+    assert fanned_out[0] == ("morning_reminder", ["daily"])
+    assert fanned_out[2] == ("weekly_checkin", ["weekly"])
+    cycle = reports[("activity", "morning_reminder")]
+    assert (cycle["served"], cycle["saved_runs"], cycle["saved_runs_total"]) == (70, 30, 60)
+    assert reports[("activity", "weekly_checkin")]["saved_runs"] == 0
+    
+    # With tiers disabled, daily jobs run everyone and the weekly check-in does not run
+    monkeypatch.setattr(scheduler_module.settings, "ACTIVITY_TIERS_ENABLED", False)
+    fanned_out.clear()
+    await scheduler_module.run_agent_tick("morning_reminder", "REMINDER", tick)
+    await scheduler_module.run_agent_tick("weekly_checkin", "REMINDER", tick)
+    assert fanned_out == [("morning_reminder", None)]
+
+
+async def test_run_agent_job_catches_up_on_missed_ticks(monkeypatch):
+    """Test a late firing runs every tick since the job's cursor, and records each one."""
+    now = datetime.now(timezone.utc)
+    current = scheduler_module.current_tick(15, now)
+    cursor = {"morning_reminder": current - timedelta(minutes=45)}
+    ran = []
+    
+    class FakeSession:
+        async def __aenter__(self):
+            return None
+        
+        async def __aexit__(self, *exc):
+            return False
+    
+    async def fake_get_tick(db, job_id):
+        return cursor.get(job_id)
+    
+    async def fake_advance_tick(db, job_id, tick):
+        cursor[job_id] = tick
+    
+    async def fake_run_tick(job_id, agent_type, tick):
+        ran.append(tick)
+    
+    monkeypatch.setattr(scheduler_module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(scheduler_module.crud, "get_scheduler_tick", fake_get_tick)
+    monkeypatch.setattr(scheduler_module.crud, "advance_scheduler_tick", fake_advance_tick)
+    monkeypatch.setattr(scheduler_module, "run_agent_tick", fake_run_tick)
+    monkeypatch.setattr(scheduler_module.settings, "SCHEDULER_TICK_MINUTES", 15)
+    
+    await scheduler_module.run_agent_job("morning_reminder", "REMINDER")
+    await scheduler_module.run_agent_job("morning_reminder", "REMINDER")
+    
+    assert ran == [current - timedelta(minutes=30), current - timedelta(minutes=15), current]
+    assert cursor["morning_reminder"] == current
+    
+    # A job without a cursor only runs the current tick
+    await scheduler_module.run_agent_job("follow_up", "FOLLOW_UP")
+    assert ran[-1] == current and len(ran) == 4
+
+
+def test_the_leader_prefetches_slots_only_without_the_job_queue(monkeypatch):
+    """Test the scheduled prefetch only runs when the leader runs the slot; queue consumers prefetch otherwise."""
+    monkeypatch.setattr(scheduler_module.settings, "SCHEDULER_PREFETCH_ENABLED", True)
+    monkeypatch.setattr(scheduler_module, "use_job_queue", lambda: True)
+    assert "prefetch_contexts" not in {job[0] for job in scheduler_module.job_definitions()}
+    assert scheduler_module.use_prefetch()
+    
+    monkeypatch.setattr(scheduler_module, "use_job_queue", lambda: False)
+    assert "prefetch_contexts" in {job[0] for job in scheduler_module.job_definitions()}
+
+
+async def test_queued_runs_use_the_contexts_their_consumer_prefetched(monkeypatch):
+    """Test with the job queue on, contexts prefetched for claimed jobs serve the runs of the same process."""
+    class FakeSession:
+        async def __aenter__(self):
+            return None
+        
+        async def __aexit__(self, *exc):
+            return False
+    
+    monkeypatch.setattr(scheduler_module.settings, "JOB_QUEUE_ENABLED", True)
+    monkeypatch.setattr(scheduler_module.settings, "SCHEDULER_PREFETCH_ENABLED", True)
+    monkeypatch.setattr(scheduler_module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(scheduler_module, "save_report", AsyncMock())
+    monkeypatch.setattr(context_module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(context_module, "load_context", AsyncMock(return_value=context_module.AgentContext(None, [], [], [])))
+    cache = context_module.ContextCache()
+    monkeypatch.setattr(context_module, "context_cache", cache)
+    monkeypatch.setattr(scheduler_module, "context_cache", cache)
+    run = MagicMock()
+    
+    async def fake_execute_agent_run(db, user_id, agent_type, prefetched=False):
+        run(user_id, agent_type, prefetched)
+        if prefetched:
+            await cache.get_or_load(db, user_id)
+    
+    monkeypatch.setattr(scheduler_module, "execute_agent_run", fake_execute_agent_run)
+    run_after = datetime.now(timezone.utc) + timedelta(minutes=3)
+    jobs = [
+        MagicMock(id=1, user_id=10, agent_type="REMINDER", run_after=run_after),
+        MagicMock(id=2, user_id=20, agent_type="TASK_REMINDER", run_after=run_after),
+    ]
+    
+    await scheduler_module.prefetch_claimed_contexts(jobs)
+    await scheduler_module.JOB_HANDLERS["REMINDER"](10)
+    
+    assert cache.prefetched == 1  # Task reminders do not read the agent context
+    run.assert_called_once_with(10, "REMINDER", True)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+async def test_sales_followups_run_per_user_for_open_sales(monkeypatch):
+    """Test each open sale of the user gets a structured follow-up and closed ones are skipped."""
+    class FakeSession:
+        async def __aenter__(self):
+            return None
+        
+        async def __aexit__(self, *exc):
+            return False
+    
+    sales = [
+        MagicMock(customer="Dana", product="Milk", status="negotiation"),
+        MagicMock(customer="Omar", product="Cheese", status="Won"),
+    ]
+    followup = AsyncMock(return_value=AgentRecommendation(recommendation="Call Dana", priority="high"))
+    log_runs = AsyncMock()
+    monkeypatch.setattr(scheduler_module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(scheduler_module.crud, "get_sales_updates", AsyncMock(return_value=sales))
+    monkeypatch.setattr(scheduler_module.crud, "log_agent_runs", log_runs)
+    monkeypatch.setattr(scheduler_module.orchestrator, "generate_sales_followup", followup)
+    
+    await scheduler_module.JOB_HANDLERS["SALES_FOLLOWUP"](7)
+    
+    assert followup.await_count == 1
+    assert followup.call_args.kwargs["structured"] is True
+    entries = log_runs.call_args.args[1]
+    assert [entry["user_id"] for entry in entries] == [7]
+    assert entries[0]["payload"]["recommendation"] == "Call Dana"
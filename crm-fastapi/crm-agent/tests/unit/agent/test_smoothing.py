@@ -0,0 +1,84 @@
+"""Unit tests for scheduled run load smoothing."""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+from app.agent import smoothing
+from app.agent.smoothing import LoadCurve, read_load_curve, run_after_for, user_offset_seconds
+
+
+SLOT = datetime(2026, 10, 19, 9, 0, tzinfo=timezone.utc)
+
+
+def test_user_offsets_are_deterministic_and_spread():
+    """Test offsets are stable per user and cover the window evenly."""
+    offsets = [user_offset_seconds(user_id, "morning_reminder", 900) for user_id in range(1, 10001)]
+    
+    assert offsets[0] == user_offset_seconds(1, "morning_reminder", 900)
+    assert all(0 <= offset < 900 for offset in offsets)
+    # Each minute of the window gets roughly 1/15 of the users
+    per_minute = [0] * 15
+    for offset in offsets:
+        per_minute[int(offset // 60)] += 1
+    assert max(per_minute) < 10000 / 15 * 1.2
+
+
+def test_run_after_modes(monkeypatch):
+    """Test rate mode spaces runs by enqueue order and off mode runs at the slot."""
+    monkeypatch.setattr("app.agent.smoothing.settings.SCHEDULER_TARGET_RUNS_PER_SECOND", 10)
+    
+    assert run_after_for(1, 25, "follow_up", SLOT, mode="rate") == SLOT + timedelta(seconds=2.5)
+    assert run_after_for(1, 25, "follow_up", SLOT, mode="off") == SLOT
+
+
+def test_load_curve_buckets_starts_and_peak_concurrency():
+    """Test the curve counts starts per bucket and the peak number of runs in flight."""
+    curve = LoadCurve(bucket_seconds=60)
+    now = datetime.now(timezone.utc).timestamp()
+    
+    curve.record_start(now)
+    curve.record_start(now)
+    curve.record_end()
+    curve.record_start(now)
+    
+    rows = curve.changed_buckets()
+    assert [(row["started"], row["peak_in_flight"]) for row in rows] == [(3, 2)]
+    assert rows[0]["bucket_start"].timestamp() == now // 60 * 60
+    assert curve.in_flight == 2
+    assert curve.changed_buckets() == []
+
+
+async def test_load_curve_flush_keeps_buckets_that_failed_to_write(monkeypatch):
+    """Test buckets are written under the process's ID and written again after a failed flush."""
+    class FakeSession:
+        async def __aenter__(self):
+            return None
+        
+        async def __aexit__(self, *exc):
+            return False
+    
+    save = AsyncMock(side_effect=[RuntimeError("db down"), None])
+    monkeypatch.setattr(smoothing, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(smoothing.crud, "save_load_buckets", save)
+    curve = LoadCurve(bucket_seconds=60, worker_id="worker-1")
+    curve.record_start()
+    
+    assert await curve.flush() == 0
+    assert await curve.flush() == 1
+    assert save.call_args.args[1] == "worker-1"
+    assert save.call_args.args[2][0]["started"] == 1
+    assert await curve.flush() == 0
+
+
+async def test_read_load_curve_sums_the_workers(monkeypatch):
+    """Test the endpoint curve comes from the stored buckets of every worker."""
+    minute = datetime(2026, 10, 19, 9, tzinfo=timezone.utc)
+    monkeypatch.setattr(smoothing.crud, "get_load_buckets", AsyncMock(return_value=[
+        (minute, 40, 12, 2),
+        (minute + timedelta(minutes=1), 55, 18, 3),
+    ]))
+    
+    curve = await read_load_curve(None, minutes=5)
+    
+    assert curve["peak_started_per_bucket"] == 55
+    assert curve["peak_in_flight"] == 18
+    assert curve["buckets"][0] == {"start": minute.isoformat(), "started": 40, "peak_in_flight": 12, "workers": 2}
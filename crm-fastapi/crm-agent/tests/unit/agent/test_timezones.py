@@ -0,0 +1,56 @@
+"""Unit tests for timezone-bucketed scheduling."""
+from datetime import datetime, timedelta, timezone
+
+from app.agent.timezones import current_tick, due_timezones, is_valid_timezone, ticks_between
+
+
+TIMEZONES = ["UTC", "Europe/Berlin", "Asia/Beirut", "Asia/Kolkata", "America/New_York", "Not/AZone"]
+
+
+def test_current_tick_truncates_to_tick_start():
+    """Test a late run resolves to the tick it belongs to."""
+    now = datetime(2026, 10, 19, 9, 7, 42, tzinfo=timezone.utc)
+    
+    assert current_tick(15, now) == datetime(2026, 10, 19, 9, 0, tzinfo=timezone.utc)
+    assert current_tick(15, datetime(2026, 10, 19, 3, 44, tzinfo=timezone.utc)).minute == 30
+
+
+def test_ticks_between_lists_missed_ticks_within_grace():
+    """Test every tick after the cursor is due, oldest first, and ticks past the grace time are dropped."""
+    until = datetime(2026, 10, 19, 9, 30, tzinfo=timezone.utc)
+    
+    assert ticks_between(until - timedelta(minutes=45), until, 15) == [
+        until - timedelta(minutes=30), until - timedelta(minutes=15), until
+    ]
+    assert ticks_between(until, until, 15) == []
+    assert ticks_between(None, until, 15) == [until]
+    assert ticks_between(until - timedelta(hours=5), until, 15, oldest=until - timedelta(minutes=20)) == [
+        until - timedelta(minutes=15), until
+    ]
+
+
+def test_due_timezones_matches_local_time():
+    """Test only the buckets at 09:00 local are due, including half-hour offsets."""
+    morning = {"hour": 9, "minute": 0}
+    
+    # 07:00 UTC is 09:00 in Berlin (CEST) and 10:00 in Beirut
+    assert due_timezones(morning, TIMEZONES, datetime(2026, 10, 19, 7, 0, tzinfo=timezone.utc)) == ["Europe/Berlin"]
+    # 03:30 UTC is 09:00 in Kolkata (+05:30)
+    assert due_timezones(morning, TIMEZONES, datetime(2026, 10, 19, 3, 30, tzinfo=timezone.utc)) == ["Asia/Kolkata"]
+    # Unknown timezones are scheduled as UTC
+    assert due_timezones(morning, TIMEZONES, datetime(2026, 10, 19, 9, 0, tzinfo=timezone.utc)) == ["UTC", "Not/AZone"]
+
+
+def test_due_timezones_respects_local_weekday():
+    """Test weekly schedules use the local day of week."""
+    upsell = {"day_of_week": "mon", "hour": 10, "minute": 0}
+    
+    # Monday 10:00 in Kolkata is Monday 04:30 UTC; Sunday 22:00 UTC is Monday in no bucket at 10:00
+    assert due_timezones(upsell, TIMEZONES, datetime(2026, 10, 19, 4, 30, tzinfo=timezone.utc)) == ["Asia/Kolkata"]
+    assert due_timezones(upsell, TIMEZONES, datetime(2026, 10, 18, 22, 0, tzinfo=timezone.utc)) == []
+
+
+def test_is_valid_timezone():
+    """Test profile timezones are validated against the IANA database."""
+    assert is_valid_timezone("Asia/Beirut")
+    assert not is_valid_timezone("Mars/Olympus")
@@ -0,0 +1,72 @@
+"""Unit tests for event-driven agent triggers."""
+import hashlib
+import hmac
+
+from app.agent import triggers
+from app.agent.triggers import ChangeEvent, agent_type_for, handle_events, verify_signature
+
+
+def task_event(user_id, old, new):
+    return ChangeEvent(type="task.status_changed", user_id=user_id, old_value=old, new_value=new)
+
+
+def test_agent_type_only_for_events_worth_reacting_to():
+    """Test done tasks trigger FOLLOW_UP, stage moves CLOSURE, and no-op changes nothing."""
+    assert agent_type_for(task_event(1, "Open", "Completed")) == "FOLLOW_UP"
+    assert agent_type_for(task_event(1, "Open", "In Progress")) is None
+    assert agent_type_for(task_event(1, "Done", "Completed")) is None
+    
+    stage = dict(type="opportunity.stage_changed", user_id=1, old_value="Qualified", status="Open")
+    assert agent_type_for(ChangeEvent(new_value="Negotiation", **stage)) == "CLOSURE"
+    assert agent_type_for(ChangeEvent(new_value="Qualified", **stage)) is None
+    assert agent_type_for(ChangeEvent(**{**stage, "new_value": "Closed", "status": "Won"})) == "FOLLOW_UP"
+    assert agent_type_for(ChangeEvent(type="customer.updated", user_id=1)) is None
+
+
+def test_verify_signature():
+    """Test the HMAC signature is checked, and nothing is accepted without a secret."""
+    body = b'{"events": []}'
+    signature = "sha256=" + hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+    
+    assert verify_signature(body, signature, secret="secret")
+    assert not verify_signature(body + b" ", signature, secret="secret")
+    assert not verify_signature(body, None, secret="secret")
+    assert not verify_signature(body, signature, secret="")
+
+
+async def test_handle_events_debounces_per_user_and_agent(monkeypatch):
+    """Test a burst of events yields one run per user and agent type."""
+    calls = []
+
+    async def fake_debounce_agent_job(db, job):
+        calls.append(job)
+        return len(calls) == 1
+
+    monkeypatch.setattr(triggers.crud, "debounce_agent_job", fake_debounce_agent_job)
+    events = [
+        task_event(1, "Open", "Done"),
+        task_event(1, "Open", "Done"),
+        task_event(1, "Open", "In Progress"),
+        task_event(2, "Open", "Done"),
+    ]
+
+    counts = await handle_events(None, events)
+
+    assert counts == {"received": 4, "ignored": 1, "enqueued": 1, "debounced": 2}
+    assert [(job["user_id"], job["agent_type"]) for job in calls] == [(1, "FOLLOW_UP"), (2, "FOLLOW_UP")]
+
+
+async def test_handle_events_moves_to_next_bucket_once_run_started(monkeypatch):
+    """Test an event arriving after its bucket's run started is enqueued in the next bucket."""
+    calls = []
+
+    async def fake_debounce_agent_job(db, job):
+        calls.append(job)
+        return None if len(calls) == 1 else True
+
+    monkeypatch.setattr(triggers.crud, "debounce_agent_job", fake_debounce_agent_job)
+
+    counts = await handle_events(None, [task_event(3, "Open", "Done")])
+
+    assert counts["enqueued"] == 1
+    assert calls[1]["slot"] > calls[0]["slot"]
@@ -0,0 +1,68 @@
+"""Unit tests for the agent run log push pub/sub."""
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from app.core.pubsub import MemoryPubSub, PostgresPubSub, MAX_NOTIFY_BYTES, run_log_message
+
+
+def message(user_id, run_id, text="Time to follow up"):
+    return run_log_message(user_id, run_id, "REMINDER", text, datetime(2024, 1, 15, 9, 0, tzinfo=timezone.utc))
+
+
+async def test_messages_reach_only_the_users_subscribers():
+    """Test each subscriber of a user gets the user's messages and nobody else's."""
+    pubsub = MemoryPubSub(queue_size=10)
+    first, second = pubsub.subscribe(1), pubsub.subscribe(1)
+    other = pubsub.subscribe(2)
+    
+    await pubsub.publish([message(1, 10), message(3, 11)])
+    
+    assert first.queue.get_nowait()["id"] == 10
+    assert second.queue.get_nowait()["id"] == 10
+    assert other.queue.empty()
+    
+    pubsub.unsubscribe(first)
+    pubsub.unsubscribe(second)
+    pubsub.unsubscribe(second)
+    assert pubsub.stats()["users"] == 1
+
+
+async def test_subscriber_that_stops_reading_is_dropped():
+    """Test a full queue marks the subscription dropped instead of growing."""
+    pubsub = MemoryPubSub(queue_size=2)
+    subscription = pubsub.subscribe(1)
+    
+    await pubsub.publish([message(1, 1), message(1, 2), message(1, 3)])
+    
+    assert subscription.dropped
+    assert subscription.queue.qsize() == 2
+    assert pubsub.stats()["dropped"] == 1
+    assert pubsub.stats()["subscriptions"] == 0
+
+
+async def test_postgres_notify_payloads_fit_the_limit():
+    """Test long messages are announced by ID and short ones in full."""
+    pubsub = PostgresPubSub(dsn="postgresql://localhost/crm", channel="agent_run_logs")
+    # Stands in for the NOTIFY sender so publish() queues the payloads
+    pubsub._send_task = asyncio.create_task(asyncio.sleep(3600))
+    
+    await pubsub.publish([message(1, 1), message(1, 2, "x" * MAX_NOTIFY_BYTES)])
+    
+    short, long = json.loads(pubsub._outbox.get_nowait()), json.loads(pubsub._outbox.get_nowait())
+    assert short["message"] == "Time to follow up"
+    assert long == {"user_id": 1, "id": 2}
+    pubsub._send_task.cancel()
+
+
+async def test_postgres_notifications_fan_out_locally():
+    """Test a NOTIFY heard by the listener is delivered to this process's subscribers."""
+    pubsub = PostgresPubSub(dsn="postgresql://localhost/crm", channel="agent_run_logs")
+    subscription = pubsub.subscribe(1)
+    
+    pubsub._on_notify(None, 0, "agent_run_logs", json.dumps(message(1, 5)))
+    pubsub._on_notify(None, 0, "agent_run_logs", json.dumps(message(2, 6)))
+    pubsub._on_notify(None, 0, "agent_run_logs", "not json")
+    
+    assert subscription.queue.get_nowait()["id"] == 5
+    assert subscription.queue.empty()
@@ -0,0 +1,128 @@
+"""Unit tests for the COPY-based bulk import."""
+from contextlib import asynccontextmanager
+from datetime import date
+
+import pytest
+
+from app.core.exceptions import ValidationError
+from app.db.bulk_import import (
+    ImportRejected,
+    import_columns,
+    import_records,
+    iter_csv,
+    iter_lines,
+    iter_ndjson,
+)
+
+
+class FakeConnection:
+    """Stands in for an asyncpg connection: records COPY chunks and statements."""
+    
+    def __init__(self, conflicts=()):
+        self.conflicts = list(conflicts)
+        self.copies = []
+        self.statements = []
+        self.committed = False
+    
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+        self.committed = True
+    
+    async def execute(self, sql):
+        self.statements.append(sql)
+        return "INSERT 0 1"
+    
+    async def fetchrow(self, sql):
+        self.statements.append(sql)
+        return 2, 1, self.conflicts
+    
+    async def copy_records_to_table(self, table, records, columns):
+        self.copies.append((table, list(records), columns))
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+async def test_csv_records_are_split_across_chunks():
+    """Test BOM, CRLF, quoted line breaks and chunk boundaries inside a UTF-8 character."""
+    body = '\ufeffuser_id,customer_name,notes\r\n1,Zeïna,"line one\nline two"\r\n2,Omar\n'.encode()
+    cut = body.index("ï".encode()) + 1
+    
+    records = await collect(iter_csv(iter_lines(chunks(body[:cut], body[cut:])), ["user_id", "customer_name", "notes"]))
+    
+    assert records == [
+        (2, {"user_id": "1", "customer_name": "Zeïna", "notes": "line one\nline two"}),
+        (4, "expected 3 fields, got 2"),
+    ]
+
+
+async def test_unknown_csv_columns_reject_the_header():
+    """Test a header naming a column the table doesn't have fails before any row."""
+    with pytest.raises(ValidationError):
+        await collect(iter_csv(iter_lines(chunks(b"user_id,phone\n1,555\n")), ["user_id", "customer_name"]))
+
+
+async def test_rows_are_validated_and_copied_in_chunks():
+    """Test valid rows reach COPY in chunk_rows batches and invalid ones are reported."""
+    lines = [
+        '{"user_id": 1, "title": "Call Zeina", "due_date": "2026-10-20"}',
+        '{"user_id": 1, "title": "Visit Omar", "due_date": "tomorrow"}',
+        '{"id": 7, "user_id": 2, "title": "Send quote", "due_date": "2026-10-21", "status": "open"}',
+        'not json',
+        '{"user_id": 3, "title": "Follow up", "due_date": "2026-10-22"}',
+    ]
+    conn = FakeConnection()
+    
+    result = await import_records(
+        conn, "tasks", iter_ndjson(iter_lines(chunks("\n".join(lines).encode()))), max_errors=2, chunk_rows=2
+    )
+    
+    assert [len(rows) for _, rows, _ in conn.copies] == [2, 1]
+    table, rows, columns = conn.copies[0]
+    assert columns == ["line"] + [column.name for column in import_columns("tasks")]
+    assert rows[1] == (3, 7, 2, "Send quote", "open", date(2026, 10, 21))
+    assert result["errors"] == [
+        {"line": 2, "error": "due_date must be a date (YYYY-MM-DD)"},
+        {"line": 4, "error": "invalid JSON"},
+    ]
+    assert (result["rows"], result["skipped"], result["inserted"], result["updated"]) == (5, 2, 3, 1)
+    assert conn.committed
+
+
+async def test_too_many_invalid_rows_reject_the_import():
+    """Test the import stops and rolls back past max_errors invalid rows."""
+    conn = FakeConnection()
+    records = chunks((1, {"user_id": 1, "product": "cheese", "target": 10}), (2, {"user_id": 0, "product": "milk", "target": 5}))
+    
+    with pytest.raises(ImportRejected) as rejected:
+        await import_records(conn, "targets", records)
+    
+    assert rejected.value.result["errors"] == [{"line": 2, "error": "user_id must be a positive integer"}]
+    assert not conn.copies
+    assert not conn.committed
+
+
+async def test_rows_of_another_user_are_skipped():
+    """Test an ID owned by another user is reported, and rejects the import past max_errors."""
+    record = {"id": 7, "user_id": 2, "title": "Send quote", "due_date": "2026-10-21"}
+    conn = FakeConnection(conflicts=[1])
+    
+    result = await import_records(conn, "tasks", chunks((1, record)), max_errors=1)
+    
+    assert "WHERE tasks.user_id = EXCLUDED.user_id" in conn.statements[-3]
+    assert "user_id = EXCLUDED.user_id," not in conn.statements[-3]
+    assert result["errors"] == [{"line": 1, "error": "id belongs to another user"}]
+    assert result["skipped"] == 1
+    
+    conn = FakeConnection(conflicts=[1])
+    with pytest.raises(ImportRejected):
+        await import_records(conn, "tasks", chunks((1, record)))
+    assert not conn.committed
+
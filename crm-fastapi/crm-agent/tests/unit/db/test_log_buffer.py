@@ -0,0 +1,117 @@
+"""Unit tests for the agent run log write-behind buffer."""
+import asyncio
+
+import pytest
+
+from app.db.log_buffer import RunLogBuffer
+
+
+class FakeWriter:
+    """Stands in for the INSERT: records batches and hands out row IDs."""
+    
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.next_id = 1
+    
+    async def __call__(self, rows):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("database unavailable")
+        self.batches.append(rows)
+        ids = list(range(self.next_id, self.next_id + len(rows)))
+        self.next_id += len(rows)
+        return ids
+
+
+def entry(user_id, message="hi"):
+    return {"user_id": user_id, "agent_type": "USER_MESSAGE", "message": message}
+
+
+async def test_rows_are_batched_by_size_and_interval():
+    """Test a full batch flushes at once and the rest flushes on the interval."""
+    buffer = RunLogBuffer(max_rows=3, flush_interval_seconds=0.05, max_pending=100)
+    writer = buffer._write = FakeWriter()
+    buffer.start()
+    
+    for user_id in range(1, 5):
+        assert await buffer.add(entry(user_id)) is None
+    await asyncio.sleep(0.1)
+    
+    assert [len(batch) for batch in writer.batches] == [3, 1]
+    assert all(row["created_at"] is not None and row["payload"] is None for row in writer.batches[0])
+    await buffer.stop()
+
+
+async def test_wait_returns_row_id_once_committed():
+    """Test a caller awaiting durability gets the row ID of its batch."""
+    buffer = RunLogBuffer(max_rows=10, flush_interval_seconds=0.01, max_pending=100)
+    buffer._write = FakeWriter()
+    buffer.start()
+    
+    await buffer.add(entry(1))
+    row_id = await buffer.add(entry(2), wait=True)
+    
+    assert row_id == 2
+    await buffer.stop()
+
+
+async def test_failed_flush_keeps_rows_and_stop_writes_them():
+    """Test rows survive a failed flush and are written at least once on stop."""
+    buffer = RunLogBuffer(max_rows=10, flush_interval_seconds=60, max_pending=100)
+    writer = buffer._write = FakeWriter(fail_times=1)
+    buffer.start()
+    
+    await buffer.add(entry(1))
+    await buffer.add(entry(2))
+    assert await buffer.flush() == 0
+    assert buffer.stats()["pending"] == 2
+    
+    await buffer.stop()
+    
+    assert [row["user_id"] for row in writer.batches[0]] == [1, 2]
+    assert buffer.stats() == {"running": False, "pending": 0, "written": 2, "flushes": 1, "failures": 1}
+
+
+async def test_waiting_caller_gets_the_flush_error():
+    """Test a caller awaiting durability sees the write failure instead of hanging."""
+    buffer = RunLogBuffer(max_rows=10, flush_interval_seconds=0.01, max_pending=100)
+    buffer._write = FakeWriter(fail_times=1)
+    buffer.start()
+    
+    with pytest.raises(ConnectionError):
+        await buffer.add(entry(1), wait=True)
+    assert buffer.stats()["pending"] == 0
+    await buffer.stop()
+
+
+async def test_full_buffer_writes_through_when_the_flush_fails():
+    """Test the buffer stops growing at max_pending and the caller sees the write error."""
+    buffer = RunLogBuffer(max_rows=10, flush_interval_seconds=60, max_pending=2)
+    writer = buffer._write = FakeWriter(fail_times=2)
+    buffer.start()
+    
+    await buffer.add(entry(1))
+    await buffer.add(entry(2))
+    with pytest.raises(ConnectionError):
+        await buffer.add(entry(3))
+    assert buffer.stats()["pending"] == 2
+    
+    # Once the database is back, the inline flush makes room again
+    assert await buffer.add(entry(4)) is None
+    assert [row["user_id"] for row in writer.batches[0]] == [1, 2]
+    await buffer.stop()
+
+
+async def test_has_pending_is_per_user():
+    """Test only users with buffered rows are reported pending, until the flush."""
+    buffer = RunLogBuffer(max_rows=10, flush_interval_seconds=60, max_pending=100)
+    buffer._write = FakeWriter()
+    buffer.start()
+    
+    await buffer.add(entry(1))
+    assert buffer.has_pending(1) and not buffer.has_pending(2)
+    await buffer.flush()
+    assert not buffer.has_pending(1)
+    await buffer.stop()
+
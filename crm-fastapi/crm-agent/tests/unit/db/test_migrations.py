@@ -0,0 +1,38 @@
+"""Unit tests for the Alembic migrations."""
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from app.db.database import ALEMBIC_INI, Base, BASELINE_REVISION
+from app.db import models  # noqa: F401
+
+
+def script_directory():
+    return ScriptDirectory.from_config(Config(ALEMBIC_INI))
+
+
+def test_revisions_form_a_single_chain_from_the_baseline():
+    """Test there is one head and the history starts at the baseline init_db stamps."""
+    scripts = script_directory()
+    
+    assert len(scripts.get_heads()) == 1
+    assert scripts.get_base() == BASELINE_REVISION
+
+
+def test_models_declare_the_migrated_indexes():
+    """Test the model indexes match the index migrations, so create_all and migrations agree."""
+    scripts = script_directory()
+    expected, dropped = {}, set()
+    for revision in reversed(list(scripts.walk_revisions())):
+        for name, table, columns, include, replaces in getattr(revision.module, "INDEXES", []):
+            if replaces is not None:
+                expected.pop(replaces[0], None)
+                dropped.add(replaces[0])
+            expected[name] = (table, columns, include)
+    
+    assert expected
+    for name, (table, columns, include) in expected.items():
+        indexes = {index.name: index for index in Base.metadata.tables[table].indexes}
+        assert [column.name for column in indexes[name].columns] == columns
+        assert (indexes[name].dialect_options["postgresql"]["include"] or []) == include
+    model_indexes = {index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    assert not model_indexes & (dropped - expected.keys())
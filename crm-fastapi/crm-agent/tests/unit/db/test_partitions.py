@@ -0,0 +1,168 @@
+"""Unit tests for agent_run_logs partition maintenance."""
+import gzip
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from app.db.partitions import (
+    DETACHED_SQL,
+    create_partitions,
+    months_to_create,
+    parse_bound,
+    partitions_to_retire,
+    retire_partitions,
+)
+
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+
+
+def utc(year, month):
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+    
+    async def fetch(self, count):
+        batch, self.rows = self.rows[:count], self.rows[count:]
+        return batch
+
+
+class FakeConnection:
+    """Stands in for an asyncpg connection over a partitioned agent_run_logs."""
+    
+    def __init__(self, bounds, detached=(), rows=(), count=None):
+        self.bounds = bounds
+        self.detached = list(detached)
+        self.rows = list(rows)
+        self.count = len(self.rows) if count is None else count
+        self.statements = []
+    
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+    
+    async def execute(self, sql):
+        self.statements.append(" ".join(sql.split()))
+    
+    async def fetch(self, sql, *args):
+        if sql == DETACHED_SQL:
+            return [(name,) for name in self.detached]
+        return list(self.bounds.items())
+    
+    async def fetchval(self, sql):
+        return self.count
+    
+    async def cursor(self, sql):
+        return FakeCursor(self.rows)
+
+
+def test_parse_bound_reads_dates_and_open_ends():
+    """Test partition bounds are parsed from pg_get_expr, MINVALUE being open."""
+    assert parse_bound("FOR VALUES FROM (MINVALUE) TO ('2026-11-01 02:00:00+02')") == (
+        None, utc(2026, 11)
+    )
+    assert parse_bound("FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00')") == (
+        utc(2026, 11), utc(2026, 12)
+    )
+
+
+def test_months_to_create_skips_months_already_covered():
+    """Test the current month is skipped while the legacy partition covers it, and existing months are kept."""
+    partitions = [("agent_run_logs_legacy", None, utc(2026, 11)), ("agent_run_logs_p202611", utc(2026, 11), utc(2026, 12))]
+    
+    assert months_to_create(partitions, NOW, 3) == [utc(2026, 12), utc(2027, 1)]
+    assert months_to_create([], datetime(2026, 12, 31, 23, tzinfo=timezone.utc), 1) == [utc(2026, 12), utc(2027, 1)]
+
+
+def test_partitions_to_retire_keeps_the_retention_window():
+    """Test only partitions ending before the last retention_months full months are retired."""
+    partitions = [
+        ("agent_run_logs_legacy", None, utc(2025, 9)),
+        ("agent_run_logs_p202509", utc(2025, 9), utc(2025, 10)),
+        ("agent_run_logs_p202510", utc(2025, 10), utc(2025, 11)),
+        ("agent_run_logs_manual", utc(2020, 1), utc(2020, 2)),
+    ]
+    
+    assert partitions_to_retire(partitions, NOW, 12) == ["agent_run_logs_legacy", "agent_run_logs_p202509"]
+    assert partitions_to_retire(partitions, NOW, 0) == []
+
+
+async def test_create_partitions_issues_monthly_ranges():
+    """Test missing months get [month start, next month start) partitions, taking their rows from the default partition."""
+    conn = FakeConnection({
+        "agent_run_logs_default": "DEFAULT",
+        "agent_run_logs_legacy": "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')",
+    })
+    
+    created = await create_partitions(conn, 1, now=NOW)
+    
+    assert created == ["agent_run_logs_p202611"]
+    assert conn.statements[1:] == [
+        "CREATE TABLE agent_run_logs_p202611 (LIKE agent_run_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        "WITH moved AS ( DELETE FROM agent_run_logs_default "
+        "WHERE created_at >= '2026-11-01T00:00:00+00:00' AND created_at < '2026-12-01T00:00:00+00:00' "
+        "RETURNING * ) INSERT INTO agent_run_logs_p202611 SELECT * FROM moved",
+        "ALTER TABLE agent_run_logs ATTACH PARTITION agent_run_logs_p202611 "
+        "FOR VALUES FROM ('2026-11-01T00:00:00+00:00') TO ('2026-12-01T00:00:00+00:00')",
+    ]
+
+
+async def test_retire_partitions_archives_before_dropping(tmp_path):
+    """Test an expired partition is detached, written to a gzipped JSONL file, then dropped."""
+    rows = [
+        (1, 7, "REMINDER", "Call Dana", '{"priority": "high"}', datetime(2025, 8, 3, 9, tzinfo=timezone.utc)),
+        (2, 7, "USER", "done ✓", None, datetime(2025, 8, 3, 10, tzinfo=timezone.utc)),
+    ]
+    conn = FakeConnection(
+        {
+            "agent_run_logs_p202508": "FOR VALUES FROM ('2025-08-01 00:00:00+00') TO ('2025-09-01 00:00:00+00')",
+            "agent_run_logs_p202611": "FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00')",
+        },
+        rows=rows
+    )
+    
+    retired = await retire_partitions(conn, 12, str(tmp_path), now=NOW)
+    
+    assert [result["partition"] for result in retired] == ["agent_run_logs_p202508"]
+    assert retired[0]["rows"] == 2
+    ddl = [statement for statement in conn.statements if not statement.startswith("SET LOCAL")]
+    assert ddl == [
+        "ALTER TABLE agent_run_logs DETACH PARTITION agent_run_logs_p202508",
+        "DROP TABLE agent_run_logs_p202508",
+    ]
+    with gzip.open(tmp_path / "agent_run_logs_p202508.jsonl.gz", "rt", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert records[0]["payload"] == {"priority": "high"}
+    assert records[1] == {
+        "id": 2, "user_id": 7, "agent_type": "USER", "message": "done ✓",
+        "payload": None, "created_at": "2025-08-03T10:00:00+00:00",
+    }
+    assert [path.name for path in tmp_path.iterdir()] == ["agent_run_logs_p202508.jsonl.gz"]
+
+
+async def test_retire_partitions_keeps_a_partition_whose_archive_is_incomplete(tmp_path):
+    """Test a partition is not dropped when its archive holds fewer rows than the table."""
+    rows = [(1, 7, "REMINDER", "Call Dana", None, datetime(2025, 8, 3, 9, tzinfo=timezone.utc))]
+    conn = FakeConnection({}, detached=["agent_run_logs_p202508"], rows=rows, count=2)
+    
+    with pytest.raises(RuntimeError):
+        await retire_partitions(conn, 12, str(tmp_path), now=NOW)
+    
+    assert not any(statement.startswith("DROP TABLE") for statement in conn.statements)
+
+
+async def test_retire_partitions_requires_an_absolute_archive_dir():
+    """Test nothing is detached when the archive directory is relative (inside the app tree)."""
+    conn = FakeConnection({"agent_run_logs_p202508": "FOR VALUES FROM ('2025-08-01 00:00:00+00') TO ('2025-09-01 00:00:00+00')"})
+    
+    with pytest.raises(ValueError):
+        await retire_partitions(conn, 12, os.path.join("archive", "agent_run_logs"), now=NOW)
+    
+    assert conn.statements == []
+
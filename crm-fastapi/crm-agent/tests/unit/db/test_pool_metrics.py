@@ -0,0 +1,56 @@
+"""Unit tests for the connection pool metrics."""
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+from app.db.pool_metrics import InstrumentedPool, instrument, pool_stats
+
+
+def sqlite_pool(**kwargs):
+    return InstrumentedPool(lambda: sqlite3.connect(":memory:", check_same_thread=False), **kwargs)
+
+
+async def test_checkouts_holds_and_lifetimes_are_recorded():
+    """Test a checkout/checkin cycle shows up in the counters and histograms."""
+    pool = sqlite_pool(pool_size=1, max_overflow=1)
+    metrics = instrument(pool, "primary")
+    
+    first = await greenlet_spawn(pool.connect)
+    second = await greenlet_spawn(pool.connect)
+    stats = pool_stats(metrics)
+    assert (stats["checked_out"], stats["overflow"], stats["peak_checked_out"]) == (2, 1, 2)
+    
+    first.close()
+    second.close()
+    stats = pool_stats(metrics)
+    assert (stats["checked_out"], stats["idle"], stats["overflow"]) == (0, 1, 0)
+    assert stats["checkouts"] == 2
+    assert stats["checkout_wait_ms"]["count"] == 2
+    assert stats["hold_ms"]["le"]["+Inf"] == 2
+    # The overflow connection is closed on checkin
+    assert (stats["connects"], stats["closes"]) == (2, 1)
+    assert stats["connection_lifetime_seconds"]["le"]["1"] == 1
+
+
+async def test_pool_timeouts_are_counted_and_survive_dispose():
+    """Test a saturated pool's timeouts are counted, also by the pool that replaces it."""
+    pool = sqlite_pool(pool_size=1, max_overflow=0, timeout=0.01)
+    metrics = instrument(pool, "primary")
+    held = await greenlet_spawn(pool.connect)
+    
+    with pytest.raises(exc.TimeoutError):
+        await greenlet_spawn(pool.connect)
+    held.close()
+    
+    recreated = pool.recreate()
+    with pytest.raises(exc.TimeoutError):
+        held = await greenlet_spawn(recreated.connect)
+        await greenlet_spawn(recreated.connect)
+    held.close()
+    
+    stats = pool_stats(metrics)
+    assert stats["timeouts"] == 2
+    assert stats["checkouts"] == 2
+    assert stats["checkout_wait_ms"]["max"] >= 10
@@ -0,0 +1,54 @@
+"""Unit tests for the progress queries."""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.config.settings import settings
+from app.db import crud
+
+
+def session(rows):
+    db = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = rows
+    db.execute.return_value = result
+    return db
+
+
+def executed_sql(db):
+    return str(db.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+
+
+async def test_progress_is_read_from_the_rollup(monkeypatch):
+    """Test batch progress is one primary key read of progress_rollups, 0.0 for users without targets."""
+    monkeypatch.setattr(settings, "PROGRESS_ROLLUP_ENABLED", True)
+    db = session([(1, 150.0)])
+    
+    assert await crud.get_progress_many(db, [1, 2]) == {1: 150.0, 2: 0.0}
+    
+    db.execute.assert_awaited_once()
+    sql = executed_sql(db)
+    assert "FROM progress_rollups" in sql
+    assert "targets.user_id" not in sql
+
+
+async def test_progress_is_summed_in_sql_without_the_rollup(monkeypatch):
+    """Test the fallback aggregates targets in a single grouped query."""
+    monkeypatch.setattr(settings, "PROGRESS_ROLLUP_ENABLED", False)
+    db = session([(3, 75)])
+    
+    assert await crud.get_progress(db, 3) == 75.0
+    
+    sql = executed_sql(db)
+    assert "sum(CASE WHEN (targets.target >" in sql
+    assert "GROUP BY targets.user_id" in sql
+
+
+async def test_progress_rejects_invalid_user_ids():
+    """Test non-positive user IDs are rejected before querying."""
+    db = session([])
+    
+    with pytest.raises(ValueError):
+        await crud.get_progress_many(db, [1, 0])
+    db.execute.assert_not_called()
@@ -0,0 +1,79 @@
+"""Unit tests for read-replica routing."""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import replicas
+from app.db.models import AgentRunLog
+from app.db.replicas import ReplicaSet, RoutingSession, replica_read
+
+
+def engine(host):
+    return create_async_engine(f"postgresql+asyncpg://crm@{host}/crm")
+
+
+def replica_set_with(*lags):
+    """ReplicaSet whose replicas report the given lags (None: unreachable)."""
+    replica_set = ReplicaSet(max_lag_seconds=5, check_seconds=5, sticky_seconds=15)
+    for number, lag in enumerate(lags):
+        replica_set.add(f"replica-{number}", engine(f"replica-{number}"))
+    
+    async def measured_lag(replica):
+        lag = lags[replica_set.replicas.index(replica)]
+        if lag is None:
+            raise ConnectionError("connection refused")
+        return lag
+    
+    replica_set._lag = measured_lag
+    return replica_set
+
+
+async def test_reads_go_to_a_healthy_replica_and_writes_to_the_primary(monkeypatch):
+    """Test tagged SELECTs leave the primary, untagged statements and lagging replicas don't."""
+    replica_set = replica_set_with(1.0, 60.0, None)
+    monkeypatch.setattr(replicas, "replica_set", replica_set)
+    await replica_set.check()
+    primary = engine("primary")
+    session = RoutingSession(bind=primary.sync_engine)
+    
+    read = select(AgentRunLog).execution_options(**replica_read(7))
+    assert session.get_bind(clause=read) is replica_set.replicas[0].engine.sync_engine
+    assert session.get_bind(clause=select(AgentRunLog)) is primary.sync_engine
+    assert [replica.healthy for replica in replica_set.replicas] == [True, False, False]
+    assert replica_set.stats()["replicas"][2]["error"] == "connection refused"
+
+
+async def test_a_users_reads_stay_on_the_primary_after_their_write(monkeypatch):
+    """Test read-your-writes pinning is per user and expires."""
+    replica_set = replica_set_with(0.0)
+    monkeypatch.setattr(replicas, "replica_set", replica_set)
+    await replica_set.check()
+    primary = engine("primary")
+    
+    replica_set.note_write(7)
+    
+    assert replica_set.engine_for(7, {}) is None
+    assert replica_set.engine_for(8, {}) is replica_set.replicas[0].engine
+    replica_set._pinned[7] = 0
+    assert replica_set.engine_for(7, {}) is replica_set.replicas[0].engine
+    assert RoutingSession(bind=primary.sync_engine).get_bind(
+        clause=select(AgentRunLog).execution_options(**replica_read(8))
+    ) is replica_set.replicas[0].engine.sync_engine
+
+
+async def test_without_healthy_replicas_reads_fall_back_to_the_primary():
+    """Test nothing is routed before the first passing check or after a replica falls behind."""
+    replica_set = replica_set_with(0.0)
+    session_info = {}
+    assert replica_set.engine_for(None, session_info) is None
+    
+    await replica_set.check()
+    assert replica_set.engine_for(None, session_info) is replica_set.replicas[0].engine
+    
+    replica_set._lag = lambda replica: _lagging()
+    await replica_set.check()
+    assert replica_set.engine_for(None, session_info) is None
+    assert replica_set.stats()["primary_reads"] == 2
+
+
+async def _lagging():
+    return 30.0
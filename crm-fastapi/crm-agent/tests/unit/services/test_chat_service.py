@@ -3,9 +3,9 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.modules.chat.services.chat_service import ChatService
+from app.modules.chat.services.chat_service import ChatService, decode_cursor, encode_cursor
 from app.modules.chat.dto.chat_dto import ChatMessageRequest, ChatMessageResponse, ChatHistoryResponse
-from app.core.exceptions import DatabaseError
+from app.core.exceptions import DatabaseError, ValidationError
 
 
 @pytest.mark.asyncio
@@ -77,12 +77,14 @@ async def test_get_history_success(mock_db):
             id=1,
             agent_type="USER_MESSAGE",
             message="Hello",
+            payload=None,
             created_at=datetime.now()
         ),
         MagicMock(
             id=2,
             agent_type="AGENT_RESPONSE",
             message="Hi there!",
+            payload={"recommendation": "Call", "priority": "high", "next_action": None},
             created_at=datetime.now()
         )
     ]
@@ -96,6 +98,7 @@ async def test_get_history_success(mock_db):
         assert len(response.messages) == 2
         assert response.messages[0].agent_type == "USER_MESSAGE"
         assert response.messages[1].agent_type == "AGENT_RESPONSE"
+        assert response.messages[1].payload["priority"] == "high"
 
 
 @pytest.mark.asyncio
@@ -117,11 +120,97 @@ async def test_get_history_limit_adjustment(mock_db):
     with patch('app.db.crud.get_recent_agent_runs') as mock_get:
         mock_get.return_value = []
         
-        # Test limit too high
+        # Test limit too high (one extra row is fetched to detect another page)
         await service.get_history(mock_db, 1, limit=200)
-        mock_get.assert_called_with(mock_db, 1, limit=50)
+        mock_get.assert_called_with(mock_db, 1, limit=51, before=None, after=None, since_id=None)
         
         # Test limit too low
         await service.get_history(mock_db, 1, limit=-5)
-        mock_get.assert_called_with(mock_db, 1, limit=50)
+        mock_get.assert_called_with(mock_db, 1, limit=51, before=None, after=None, since_id=None)
+
+
+def history_rows(*ids):
+    """Runs with increasing (created_at, id), returned latest first like crud does."""
+    from datetime import datetime, timedelta
+    
+    start = datetime(2024, 1, 15, 9, 0)
+    return [
+        MagicMock(id=i, agent_type="USER_MESSAGE", message=f"m{i}", payload=None, created_at=start + timedelta(minutes=i))
+        for i in sorted(ids, reverse=True)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_history_pages_back_with_before_cursor(mock_db):
+    """Test a full page returns the cursor of its oldest message and pages back from it."""
+    service = ChatService()
+    
+    with patch('app.db.crud.get_recent_agent_runs') as mock_get:
+        mock_get.return_value = history_rows(10, 9, 8)
+        first = await service.get_history(mock_db, 1, limit=2)
+        
+        assert [m.id for m in first.messages] == [10, 9]
+        assert first.prev_cursor is None
+        assert decode_cursor(first.next_cursor, "before")[1] == 9
+        
+        mock_get.return_value = history_rows(8)
+        second = await service.get_history(mock_db, 1, limit=2, before=first.next_cursor)
+        
+        _, kwargs = mock_get.call_args
+        assert kwargs["before"] == decode_cursor(first.next_cursor, "before")
+        assert [m.id for m in second.messages] == [8]
+        assert second.next_cursor is None
+        assert decode_cursor(second.prev_cursor, "after")[1] == 8
+
+
+@pytest.mark.asyncio
+async def test_get_history_after_cursor_returns_newer_messages(mock_db):
+    """Test `after` keeps the messages nearest the cursor and drops the extra row."""
+    service = ChatService()
+    cursor = encode_cursor(history_rows(5)[0].created_at, 5)
+    
+    with patch('app.db.crud.get_recent_agent_runs') as mock_get:
+        mock_get.return_value = history_rows(8, 7, 6)
+        page = await service.get_history(mock_db, 1, limit=2, after=cursor)
+        
+        assert [m.id for m in page.messages] == [7, 6]
+        assert decode_cursor(page.prev_cursor, "after")[1] == 7
+        assert decode_cursor(page.next_cursor, "before")[1] == 6
+        
+        # Nothing newer: the same cursor is handed back for the next poll
+        mock_get.return_value = []
+        empty = await service.get_history(mock_db, 1, limit=2, after=cursor)
+        assert empty.messages == []
+        assert empty.prev_cursor == cursor
+
+
+@pytest.mark.asyncio
+async def test_get_history_since_id_returns_only_new_messages(mock_db):
+    """Test since_id pages hold the messages right after the ID, without cursors."""
+    service = ChatService()
+    
+    with patch('app.db.crud.get_recent_agent_runs') as mock_get:
+        mock_get.return_value = history_rows(13, 12, 11)
+        page = await service.get_history(mock_db, 1, limit=2, since_id=10)
+        
+        mock_get.assert_called_with(mock_db, 1, limit=3, before=None, after=None, since_id=10)
+        assert [m.id for m in page.messages] == [12, 11]
+        assert page.next_cursor is None
+        assert page.prev_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_history_rejects_bad_cursors(mock_db):
+    """Test malformed or combined cursors are validation errors."""
+    service = ChatService()
+    cursor = encode_cursor(history_rows(1)[0].created_at, 1)
+    
+    with pytest.raises(ValidationError):
+        await service.get_history(mock_db, 1, before="not-a-cursor")
+    
+    with pytest.raises(ValidationError):
+        await service.get_history(mock_db, 1, before=cursor, after=cursor)
+    
+    with pytest.raises(ValidationError):
+        await service.get_history(mock_db, 1, after=cursor, since_id=5)
 